@@ -11,14 +11,14 @@ export async function GET(request: NextRequest) {
     const limit = searchParams.get('limit') || '20';
     const skip = searchParams.get('skip') || '0';
 
-    let endpoint = '';
+    // Sidebar previews carry the last message, so no per-session message fetch is needed
+    const params = new URLSearchParams({ limit, skip });
     if (userId) {
-      endpoint = `/api/conversations/users/${userId}/sessions?limit=${limit}&skip=${skip}`;
+      params.set('user_id', userId);
     } else if (userEmail) {
-      endpoint = `/api/conversations/users/email/${userEmail}/sessions?limit=${limit}&skip=${skip}`;
-    } else {
-      endpoint = `/api/conversations/recent?limit=${limit}`;
+      params.set('user_email', userEmail);
     }
+    const endpoint = `/api/conversations/sidebar?${params.toString()}`;
 
     const response = await fetch(`${BACKEND_URL}${endpoint}`, {
       method: 'GET',
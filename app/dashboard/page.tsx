@@ -1,6 +1,6 @@
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/components/ui/card"
 import { PropertyAnalyticsDashboard } from "@/components/property-analytics-dashboard"
-import { MessageSquare, Users, FileText, TrendingUp } from "lucide-react"
+import { MessageSquare, Users, Activity, TrendingUp } from "lucide-react"
 import { getStats } from "@/lib/stats"
 
 export default async function DashboardPage() {
@@ -22,30 +22,30 @@ export default async function DashboardPage() {
               <MessageSquare className="h-4 w-4 text-muted-foreground" />
             </CardHeader>
             <CardContent>
-              <div className="text-2xl font-bold">{stats.conversations}</div>
-              <p className="text-xs text-muted-foreground">+12% from last month</p>
+              <div className="text-2xl font-bold">{stats.conversations.toLocaleString()}</div>
+              <p className="text-xs text-muted-foreground">{stats.messages.toLocaleString()} messages</p>
             </CardContent>
           </Card>
 
           <Card>
             <CardHeader className="flex flex-row items-center justify-between space-y-0 pb-2">
-              <CardTitle className="text-sm font-medium">Active Users</CardTitle>
+              <CardTitle className="text-sm font-medium">Total Users</CardTitle>
               <Users className="h-4 w-4 text-muted-foreground" />
             </CardHeader>
             <CardContent>
-              <div className="text-2xl font-bold">{stats.users}</div>
-              <p className="text-xs text-muted-foreground">+8% from last month</p>
+              <div className="text-2xl font-bold">{stats.users.toLocaleString()}</div>
+              <p className="text-xs text-muted-foreground">+{stats.newUsersToday} new today</p>
             </CardContent>
           </Card>
 
           <Card>
             <CardHeader className="flex flex-row items-center justify-between space-y-0 pb-2">
-              <CardTitle className="text-sm font-medium">Documents Processed</CardTitle>
-              <FileText className="h-4 w-4 text-muted-foreground" />
+              <CardTitle className="text-sm font-medium">Active Today</CardTitle>
+              <Activity className="h-4 w-4 text-muted-foreground" />
             </CardHeader>
             <CardContent>
-              <div className="text-2xl font-bold">{stats.documents}</div>
-              <p className="text-xs text-muted-foreground">+23% from last month</p>
+              <div className="text-2xl font-bold">{stats.activeUsersToday.toLocaleString()}</div>
+              <p className="text-xs text-muted-foreground">Users with a conversation today</p>
             </CardContent>
           </Card>
 
@@ -0,0 +1 @@
+# Agent module: intent routing and context retrieval for chat turns
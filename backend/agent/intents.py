@@ -0,0 +1,197 @@
+import re
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from .models import RetrievalPlan
+
+Range = Tuple[Optional[float], Optional[float]]
+
+# Keywords, each mapped to the kind of match it is
+_KEYWORD_KINDS = {
+    "property": [
+        "property", "properties", "rent", "rents", "rental", "rentals", "lease", "leases", "leasing",
+        "building", "buildings", "address", "addresses", "square feet", "sq ft", "sqft", "annual", "monthly",
+        "price", "prices", "pricing", "cost", "costs", "floor", "floors", "suite", "suites", "office", "offices",
+        "listing", "listings", "expensive", "luxury", "premium", "affordable", "cheap", "budget",
+        "broadway", "avenue", "avenues", "street", "streets", "manhattan"
+    ],
+    "market": ["market", "markets", "trend", "trends", "summary", "overview", "comps", "comparables"],
+    "associate": [
+        "associate", "associates", "broker", "brokers", "agent", "agents",
+        "handled by", "managed by", "listed by", "represented by"
+    ],
+    "crm": [
+        "my account", "my profile", "my details", "my info", "my information", "my history",
+        "my conversations", "my preferences", "client record", "client profile", "customer record",
+        "customer profile", "contact details", "lead record", "crm"
+    ],
+    # Words that bound the amount right after them
+    "lower": ["over", "above", "more than", "greater than", "at least", "minimum", "min", "from"],
+    "upper": ["under", "below", "less than", "at most", "up to", "no more than", "maximum", "max"],
+    "between": ["between", "around", "about", "approximately", "roughly"],
+    # Prepositions that may be followed by a place
+    "place": ["in", "on", "around", "near", "along", "for"],
+}
+_KEYWORDS: Dict[str, str] = {}
+for _kind, _words in _KEYWORD_KINDS.items():
+    for _word in _words:
+        _KEYWORDS.setdefault(_word, _kind)
+# "around" bounds an amount, or introduces a place when no amount follows
+_PLACE_WORDS = set(_KEYWORD_KINDS["place"])
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """Build an alternation that shares common prefixes, so matching walks a trie"""
+    trie: Dict[str, dict] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def emit(node: Dict[str, dict]) -> str:
+        branches = [
+            (r"\s+" if char == " " else re.escape(char)) + emit(child)
+            for char, child in sorted(node.items()) if char
+        ]
+        if not branches:
+            return ""
+        if len(branches) == 1 and "" not in node:
+            return branches[0]
+        return "(?:" + "|".join(branches) + ")" + ("?" if "" in node else "")
+
+    return emit(trie)
+
+# Building blocks of the amount patterns
+_NUMBER = r"\d[\d,]*(?:\.\d+)?"
+_MAGNITUDE = r"(?:\s*(?i:million|thousand|mm|k|m)\b)?"
+_SQUARE_FEET = r"(?i:sq\.?\s*ft\.?|sqft|sf|rsf|square\s+f(?:ee|oo)t)(?![a-z])"
+_TO = r"\s*(?:-|–|(?i:to|and))\s*"
+
+# Amounts and addresses, all starting with a digit or "$"; groups are read positionally
+_AMOUNT_PATTERNS = [
+    ("rent_per_sf", rf"\$\s*({_NUMBER})(?:{_TO}\$?\s*({_NUMBER}))?"
+                    rf"(?:\s*(?:/\s*|(?i:per|a)\s+){_SQUARE_FEET}|\s*(?i:psf)\b)"),
+    ("size", rf"({_NUMBER}{_MAGNITUDE})(?:{_TO}({_NUMBER}{_MAGNITUDE}))?\s*{_SQUARE_FEET}"),
+    ("rent", rf"(\$\s*{_NUMBER}{_MAGNITUDE}|{_NUMBER}\s*(?i:million|thousand|mm|k)\b)"
+             rf"(?:{_TO}(\$?\s*{_NUMBER}{_MAGNITUDE}))?"
+             r"(?:\s*(?:/\s*|(?i:per|a)\s+)((?i:month|mo|year|yr|annum))\b|\s+((?i:monthly|annually))\b)?"),
+    ("address", r"(?<![\d,.])(\d{1,5}(?:-\d{1,5})?\s+(?:(?:[NSEWnsew]|North|South|East|West)\.?\s+)?"
+                r"(?:(?:(?:\d{1,3}(?:st|nd|rd|th)|[A-Z][a-z]+)\s+){1,3}?"
+                r"(?i:street|st|avenue|ave|boulevard|blvd|road|rd|place|pl|plaza|lane|ln|drive|dr|way|square|sq)\b\.?"
+                r"|(?i:broadway)\b))"),
+]
+
+# Compiled once: a single alternation scanned left to right over the message.
+# Matches only start at a word boundary, and amounts only at a digit or "$".
+_ROUTER = re.compile(
+    r"(?<![\w$.%+-])(?:(?=[\d$])(?:"
+    + "|".join(f"(?P<{kind}>{pattern})" for kind, pattern in _AMOUNT_PATTERNS)
+    + r")|(?P<email>[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,})"
+    + r"|(?P<keyword>(?i:" + _trie_pattern(_KEYWORDS) + r"))\b)"
+)
+_GROUPS = {kind: (_ROUTER.groupindex[kind], re.compile(pattern).groups) for kind, pattern in _AMOUNT_PATTERNS}
+
+# Anchored right after an associate keyword or a place preposition
+_NAME = re.compile(r"\s+(?:(?i:named|called)\s+)?([A-Z][a-z'-]+(?:\s+[A-Z][a-z'-]+)?)\b")
+_PLACE = re.compile(r"\s+((?:\d{1,3}(?:st|nd|rd|th)\s+)?[A-Z][a-z]+(?:\s+[A-Z][a-z]+){0,2})\b")
+
+_AMOUNT = re.compile(rf"\$?\s*({_NUMBER})\s*(million|thousand|mm|k|m)?", re.IGNORECASE)
+_MAGNITUDES = {"k": 1e3, "thousand": 1e3, "m": 1e6, "mm": 1e6, "million": 1e6}
+# Keyword kinds that only switch a retrieval on
+_FLAGS = {"property": "property_search", "market": "market_summary", "crm": "crm_lookup"}
+# A single amount without a bound ("around $1.2M") matches this far either side
+APPROXIMATE_MARGIN = 0.2
+
+def _amount(text: str) -> Tuple[float, Optional[float]]:
+    """Parse "$1,200", "1.5M" or "10k" into its value and magnitude (None when absent)"""
+    match = _AMOUNT.match(text.strip())
+    magnitude = _MAGNITUDES.get((match.group(2) or "").lower())
+    return float(match.group(1).replace(",", "")) * (magnitude or 1), magnitude
+
+def _range(bound: Optional[str], first: str, second: Optional[str], scale: float = 1) -> Range:
+    """Turn a bound kind ("lower", "upper" or None) and one or two amounts into a (min, max) range"""
+    low, low_magnitude = _amount(first)
+    if second:
+        high, high_magnitude = _amount(second)
+        if high_magnitude and not low_magnitude:
+            # "$1-2M" means one to two million
+            low *= high_magnitude
+        low, high = sorted((low, high))
+        return low * scale, high * scale
+    value = low * scale
+    if bound == "lower":
+        return value, None
+    if bound == "upper":
+        return None, value
+    return value * (1 - APPROXIMATE_MARGIN), value * (1 + APPROXIMATE_MARGIN)
+
+def _merge(fields: Dict[str, Any], field: str, new: Range) -> None:
+    """Combine "over $1M ... under $2M" into one range; the first value of each end wins"""
+    current = fields.get(field)
+    if current is None:
+        fields[field] = new
+    else:
+        fields[field] = (new[0] if current[0] is None else current[0], new[1] if current[1] is None else current[1])
+
+def _add(fields: Dict[str, Any], field: str, value: str) -> None:
+    items = fields.setdefault(field, [])
+    value = " ".join(value.split())
+    if value not in items:
+        items.append(value)
+
+def _apply_amount(fields: Dict[str, Any], kind: str, groups: tuple, bound: Optional[str]) -> None:
+    fields["property_search"] = True
+    if kind == "rent_per_sf":
+        _merge(fields, "rent_per_sf_range", _range(bound, *groups))
+    elif kind == "size":
+        _merge(fields, "size_range", _range(bound, *groups))
+    elif kind == "rent":
+        first, second, period, period_word = groups
+        scale = 12 if (period or period_word or "").lower().startswith("mo") else 1
+        _merge(fields, "rent_range", _range(bound, first, second, scale))
+    else:
+        _add(fields, "addresses", groups[0].rstrip("."))
+
+def _apply_keyword(fields: Dict[str, Any], word: str, text: str, end: int) -> None:
+    kind = _KEYWORDS[word]
+    if kind in _FLAGS:
+        fields[_FLAGS[kind]] = True
+    elif kind == "associate":
+        name = _NAME.match(text, end)
+        if name:
+            fields["associate_lookup"] = True
+            _add(fields, "associates", name.group(1))
+        else:
+            # Without a name, associates are found by the property search
+            fields["property_search"] = True
+    if word in _PLACE_WORDS:
+        place = _PLACE.match(text, end)
+        if place:
+            _add(fields, "locations", place.group(1))
+
+def route_message(text: str) -> RetrievalPlan:
+    """Classify a chat message into the retrievals it needs, in a single scan.
+
+    Rent and size ranges, addresses, associate names, places and emails are
+    extracted in the same pass. A message that matches nothing needs no
+    retrieval at all.
+    """
+    fields: Dict[str, Any] = {}
+    bound: Optional[Tuple[str, int]] = None  # Bound word awaiting its amount, and where it ended
+    for match in _ROUTER.finditer(text):
+        kind = match.lastgroup
+        if kind == "keyword":
+            word = " ".join(match.group().lower().split())
+            bound = (_KEYWORDS[word], match.end())
+            _apply_keyword(fields, word, text, match.end())
+        elif kind == "email":
+            fields["crm_lookup"] = True
+            _add(fields, "emails", match.group())
+        else:
+            index, count = _GROUPS[kind]
+            adjacent = bound and not text[bound[1]:match.start()].strip()
+            _apply_amount(fields, kind, match.groups()[index:index + count], bound[0] if adjacent else None)
+    for field in ("rent_range", "rent_per_sf_range", "size_range"):
+        if field in fields:
+            low, high = fields[field]
+            fields[field] = {"min": low, "max": high}
+    return RetrievalPlan(**fields)
@@ -0,0 +1,50 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List, Dict, Any
+
+class NumberRange(BaseModel):
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+    def bounds(self) -> tuple:
+        return self.min, self.max
+
+class RetrievalPlan(BaseModel):
+    """The retrievals a chat message needs, and the parameters found in it"""
+    property_search: bool = False
+    market_summary: bool = False
+    associate_lookup: bool = False
+    crm_lookup: bool = False
+    rent_range: Optional[NumberRange] = None  # Annual rent
+    rent_per_sf_range: Optional[NumberRange] = None  # Rent per square foot per year
+    size_range: Optional[NumberRange] = None  # Square feet
+    addresses: List[str] = Field(default_factory=list)
+    associates: List[str] = Field(default_factory=list)
+    locations: List[str] = Field(default_factory=list)
+    emails: List[str] = Field(default_factory=list)
+
+    @property
+    def needs_retrieval(self) -> bool:
+        return self.property_search or self.market_summary or self.associate_lookup or self.crm_lookup
+
+class AgentTurnRequest(BaseModel):
+    message: str = Field(..., min_length=1)
+    session_id: Optional[str] = None  # A new session is created when omitted
+    user_id: Optional[str] = None
+    user_email: Optional[str] = None
+    turn_id: Optional[str] = None  # Makes retried turns idempotent
+    history_messages: int = Field(10, ge=0, le=50)
+
+class ToolReport(BaseModel):
+    status: str  # ok, skipped, timeout or error
+    duration_ms: Optional[float] = None
+
+class AgentTurnResponse(BaseModel):
+    session_id: str
+    message: str
+    model: str
+    usage: Optional[Dict[str, Any]] = None
+    cached: bool = False
+    persisted: bool = True
+    plan: RetrievalPlan
+    tools: Dict[str, ToolReport]
+    timings: Dict[str, float]
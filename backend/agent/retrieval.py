@@ -0,0 +1,104 @@
+from typing import Optional
+
+from .models import NumberRange, RetrievalPlan
+
+# Import property search service
+try:
+    from analytics.property_search import PropertySearchService
+    property_search = PropertySearchService()
+except ImportError:
+    property_search = None
+    print("Warning: Property search service not available")
+
+# Limits on how much of each retrieval goes into the prompt
+MAX_ADDRESSES = 3
+MAX_ASSOCIATES = 2
+MAX_PROPERTIES = 3
+MAX_ASSOCIATE_PROPERTIES = 5
+
+def _bounds(number_range: Optional[NumberRange]) -> Optional[tuple]:
+    return number_range.bounds() if number_range else None
+
+def property_context(text: str, plan: RetrievalPlan) -> str:
+    """Prompt context for a property search: requested addresses, then the best matches"""
+    if not (property_search and plan.property_search):
+        return ""
+    property_context = ""
+    requested = [
+        prop for prop in (property_search.get_property_by_address(address) for address in plan.addresses[:MAX_ADDRESSES])
+        if prop
+    ]
+    if requested:
+        property_context += "\n\nREQUESTED PROPERTIES:\n"
+        for i, prop in enumerate(requested, 1):
+            property_context += f"\n{i}. {prop['formatted_info']}\n"
+
+    search_results = property_search.search_properties(
+        text, limit=5,
+        rent_range=_bounds(plan.rent_range),
+        rent_per_sf_range=_bounds(plan.rent_per_sf_range),
+        size_range=_bounds(plan.size_range)
+    )
+    if search_results:
+        property_context += "\n\nRELEVANT PROPERTY DATA:\n"
+        for i, result in enumerate(search_results[:MAX_PROPERTIES], 1):
+            prop = result['property']
+            property_context += f"\n{i}. {prop['formatted_info']}\n"
+            if result['match_reasons']:
+                property_context += f"   Match reasons: {', '.join(result['match_reasons'])}\n"
+
+        property_context += "\nUse this property data to provide specific, accurate answers about our real estate portfolio."
+    return property_context
+
+def associate_context(plan: RetrievalPlan) -> str:
+    """Prompt context listing the properties of each associate named in the message"""
+    if not (property_search and plan.associate_lookup):
+        return ""
+    associate_context = ""
+    for name in plan.associates[:MAX_ASSOCIATES]:
+        properties = property_search.get_properties_by_associate(name)
+        if properties:
+            associate_context += f"\n\nPROPERTIES HANDLED BY {name.upper()} ({len(properties)} total):\n"
+            for i, prop in enumerate(properties[:MAX_ASSOCIATE_PROPERTIES], 1):
+                associate_context += f"\n{i}. {prop['formatted_info']}\n"
+    return associate_context
+
+def market_context(plan: RetrievalPlan) -> str:
+    """Prompt context summarizing the market, for the place in the message when it has data"""
+    if not (property_search and plan.market_summary):
+        return ""
+    area = plan.locations[0] if plan.locations else None
+    market_summary = property_search.get_market_summary(area) if area else {}
+    if not market_summary:
+        area = None
+        market_summary = property_search.get_market_summary()
+    if not market_summary:
+        return ""
+    market_context = f"\n\nMARKET SUMMARY ({area}):\n" if area else "\n\nMARKET SUMMARY:\n"
+    market_context += f"Total Properties: {market_summary.get('total_properties', 0)}\n"
+    market_context += f"Average Annual Rent: ${market_summary.get('average_rent', 0):,.0f}\n"
+    market_context += f"Average Size: {market_summary.get('average_size', 0):,.0f} sq ft\n"
+    market_context += f"Average Rent per Sq Ft: ${market_summary.get('rent_per_sqft', 0):.2f}/year\n"
+    return market_context
+
+def crm_context(user) -> str:
+    """Prompt context from the CRM record of the user taking part in the conversation"""
+    if user is None:
+        return ""
+    details = [
+        ("Name", user.name),
+        ("Company", user.company),
+        ("Job Title", user.job_title),
+        ("Tags", ", ".join(user.tags) if user.tags else None),
+        ("Previous Conversations", user.total_conversations or None)
+    ]
+    if user.preferences:
+        details += [
+            ("Budget", user.preferences.budget_range),
+            ("Interests", ", ".join(user.preferences.product_interests) if user.preferences.product_interests else None),
+            ("Preferred Language", user.preferences.language)
+        ]
+    lines = [f"{label}: {value}" for label, value in details if value]
+    if not lines:
+        return ""
+    return "\n\nCUSTOMER PROFILE:\n" + "\n".join(lines) + "\n"
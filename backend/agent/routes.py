@@ -0,0 +1,201 @@
+from fastapi import APIRouter, HTTPException, Depends
+from starlette.concurrency import run_in_threadpool
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import logging
+import os
+import time
+import uuid
+
+from .models import AgentTurnRequest, AgentTurnResponse, ToolReport, RetrievalPlan
+from .intents import route_message
+from .retrieval import property_context, associate_context, market_context, crm_context
+from conversations.crud import ConversationCRUD as SessionCRUD
+from conversations.models import ConversationSessionCreate, MessageCreate, MessageSender
+from conversations.routes import get_conversation_crud as get_session_crud
+from crm.crud import UserCRUD, get_user_crud
+from llm.gateway import llm_gateway
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/agent", tags=["Agent"])
+
+# Agent settings - you can set these in environment variables
+AGENT_TOOL_TIMEOUT_SECONDS = float(os.getenv("AGENT_TOOL_TIMEOUT_SECONDS", "2"))
+TOOL_TIMEOUTS = {
+    tool: float(os.getenv(f"AGENT_{tool.upper()}_TIMEOUT_SECONDS", AGENT_TOOL_TIMEOUT_SECONDS))
+    for tool in ("property_search", "associate_lookup", "market_summary", "history", "crm_user")
+}
+AGENT_HISTORY_MAX_CHARS = int(os.getenv("AGENT_HISTORY_MAX_CHARS", "8000"))
+AGENT_MAX_TOKENS = int(os.getenv("AGENT_MAX_TOKENS", "1500"))
+
+# Company background, as given to the assistant by the enhanced chat route
+KNOWLEDGE_BASE = [
+    "OkADA & CO is a leading business consulting firm specializing in digital transformation and AI integration. We help companies modernize their operations and leverage cutting-edge technology.",
+    "Our services include strategic planning, process optimization, technology implementation, and change management. We work with Fortune 500 companies across various industries.",
+    "The company was founded in 2015 and has offices in New York, London, and Tokyo. We have a team of over 200 consultants and technology experts.",
+    "OkADA & CO manages a comprehensive commercial real estate portfolio with 225 properties across Manhattan. Our dataset includes detailed information about property addresses, floor plans, suite numbers, square footage (ranging from 9,000 to 20,000+ sq ft), and rental rates. Annual rents range from $750,000 to over $2 million. Our experienced associates include Jack Sparrow, Davy Jones, Elizabeth Swann, Will Turner, and many others who manage properties on locations like Broadway, Fifth Avenue, West 36th Street, and other prime Manhattan locations. We track monthly rent, annual rent, GCI over 3 years, and work with various building classes from Executive to Premium properties."
+]
+KNOWLEDGE_CONTEXT = "\n\n".join(KNOWLEDGE_BASE)
+
+def build_system_prompt(context: str) -> str:
+    return f"""You are an AI assistant for OkADA & CO, a business consulting firm with expertise in commercial real estate. Use the following context to answer questions about the company, provide business advice, and analyze property data. If you don't know something, say so honestly.
+
+Context:
+{KNOWLEDGE_CONTEXT}{context}
+
+When discussing properties, you can reference specific data points from the dataset. Always be professional, helpful, and provide actionable insights for commercial real estate decisions."""
+
+async def run_tool(name: str, enabled: bool, work: Callable[[], Awaitable[Any]],
+                   reports: Dict[str, ToolReport], default: Any = None) -> Any:
+    """Run one retrieval under its timeout; a failed or slow tool only loses its context"""
+    if not enabled:
+        reports[name] = ToolReport(status="skipped")
+        return default
+    started = time.monotonic()
+    try:
+        result = await asyncio.wait_for(work(), TOOL_TIMEOUTS[name])
+        status = "ok"
+    except asyncio.TimeoutError:
+        logger.warning(f"Agent tool {name} timed out")
+        result, status = default, "timeout"
+    except Exception as e:
+        logger.error(f"Agent tool {name} failed: {e}")
+        result, status = default, "error"
+    reports[name] = ToolReport(status=status, duration_ms=round((time.monotonic() - started) * 1000, 1))
+    return result
+
+async def find_crm_user(user_crud: UserCRUD, user_id: Optional[str], user_email: Optional[str]):
+    user = await user_crud.get_user_by_id(user_id) if user_id else None
+    if user is None and user_email:
+        user = await user_crud.get_user_by_email(user_email)
+    return user
+
+@router.post("/turn", response_model=AgentTurnResponse)
+async def agent_turn(
+    turn: AgentTurnRequest,
+    session_crud: SessionCRUD = Depends(get_session_crud),
+    user_crud: UserCRUD = Depends(get_user_crud)
+):
+    """Run one chat turn server-side.
+
+    The retrievals the message needs (property search, associate lookup,
+    market summary), the conversation history tail and the user's CRM record
+    are fetched concurrently, each under its own timeout. The prompt is built
+    from whatever came back, the LLM is called through the gateway, and both
+    messages of the turn are stored with a single write. Retrying with the
+    same turn_id returns the stored reply without calling the LLM again.
+    """
+    started = time.monotonic()
+    plan: RetrievalPlan = route_message(turn.message)
+    reports: Dict[str, ToolReport] = {}
+    turn_id = turn.turn_id or str(uuid.uuid4())
+
+    async def open_session():
+        """The turn's session and, for a retried turn, the reply stored the first time"""
+        if turn.session_id:
+            session = await session_crud.get_session(turn.session_id)
+            if not session:
+                raise HTTPException(status_code=404, detail="Conversation session not found")
+        else:
+            # Keyed on the turn, so a retry without a session_id reuses the session
+            title = turn.message[:50] + "..." if len(turn.message) > 50 else turn.message
+            session = await session_crud.create_session(ConversationSessionCreate(
+                user_id=turn.user_id, user_email=turn.user_email, title=title
+            ), idempotency_key=f"agent-turn:{turn_id}")
+        stored = (
+            await session_crud.get_message_by_key(session.session_id, f"{turn_id}:assistant")
+            if turn.turn_id else None
+        )
+        return session, stored
+
+    async def history():
+        messages, _, _ = await session_crud.get_recent_messages(
+            turn.session_id, turn.history_messages, AGENT_HISTORY_MAX_CHARS
+        )
+        return messages
+
+    (session, stored), properties, associates, market, recent_messages, user = await asyncio.gather(
+        open_session(),
+        run_tool("property_search", plan.property_search,
+                 lambda: run_in_threadpool(property_context, turn.message, plan), reports, ""),
+        run_tool("associate_lookup", plan.associate_lookup,
+                 lambda: run_in_threadpool(associate_context, plan), reports, ""),
+        run_tool("market_summary", plan.market_summary,
+                 lambda: run_in_threadpool(market_context, plan), reports, ""),
+        run_tool("history", bool(turn.session_id and turn.history_messages), history, reports, []),
+        run_tool("crm_user", plan.crm_lookup and bool(turn.user_id or turn.user_email),
+                 lambda: find_crm_user(user_crud, turn.user_id, turn.user_email), reports)
+    )
+    retrieved_at = time.monotonic()
+
+    if stored is not None:
+        # A retried turn gets the reply it already has instead of a new completion
+        finished_at = time.monotonic()
+        return AgentTurnResponse(
+            session_id=session.session_id,
+            message=stored.content,
+            model=stored.metadata.get("model") or "",
+            usage=stored.metadata.get("usage"),
+            cached=True,
+            persisted=True,
+            plan=plan,
+            tools=reports,
+            timings={
+                "retrieval_ms": round((retrieved_at - started) * 1000, 1),
+                "llm_ms": 0.0,
+                "persist_ms": 0.0,
+                "total_ms": round((finished_at - started) * 1000, 1)
+            }
+        )
+
+    context = crm_context(user) + properties + associates + market
+    messages: List[Dict[str, str]] = [{"role": "system", "content": build_system_prompt(context)}]
+    messages += [
+        {"role": "user" if message.sender == MessageSender.USER else "assistant", "content": message.content}
+        for message in recent_messages
+    ]
+    messages.append({"role": "user", "content": turn.message})
+
+    try:
+        # The system prompt carries the CRM profile, which must not reach the persistent cache
+        completion = await llm_gateway.complete(
+            messages=messages, max_tokens=AGENT_MAX_TOKENS, temperature=0.7, persist=user is None
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Agent error: the model did not respond in time")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Agent error: {str(e)}")
+    completed_at = time.monotonic()
+
+    persisted = True
+    try:
+        await session_crud.add_turn(session.session_id, [
+            MessageCreate(content=turn.message, sender=MessageSender.USER, idempotency_key=f"{turn_id}:user"),
+            MessageCreate(
+                content=completion.content, sender=MessageSender.ASSISTANT, idempotency_key=f"{turn_id}:assistant",
+                metadata={"model": completion.model, "usage": completion.usage, "cached": completion.cached}
+            )
+        ])
+    except Exception as e:
+        # The reply is still returned; the client may retry the turn with the same turn_id
+        logger.error(f"Failed to store agent turn in session {session.session_id}: {e}")
+        persisted = False
+    finished_at = time.monotonic()
+
+    return AgentTurnResponse(
+        session_id=session.session_id,
+        message=completion.content,
+        model=completion.model,
+        usage=completion.usage,
+        cached=completion.cached,
+        persisted=persisted,
+        plan=plan,
+        tools=reports,
+        timings={
+            "retrieval_ms": round((retrieved_at - started) * 1000, 1),
+            "llm_ms": round((completed_at - retrieved_at) * 1000, 1),
+            "persist_ms": round((finished_at - completed_at) * 1000, 1),
+            "total_ms": round((finished_at - started) * 1000, 1)
+        }
+    )
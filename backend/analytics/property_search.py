@@ -1,23 +1,43 @@
 import pandas as pd
 import os
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from analytics.service import PropertyAnalytics
 
 class PropertySearchService:
     def __init__(self):
         self.analytics = PropertyAnalytics()
         
-    def search_properties(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
-        """Search properties based on natural language query"""
+    def search_properties(self, query: str, limit: int = 10,
+                          rent_range: Optional[Tuple[Optional[float], Optional[float]]] = None,
+                          rent_per_sf_range: Optional[Tuple[Optional[float], Optional[float]]] = None,
+                          size_range: Optional[Tuple[Optional[float], Optional[float]]] = None) -> List[Dict[str, Any]]:
+        """Search properties based on natural language query.
+
+        Optional (min, max) ranges, e.g. from the chat intent router, add
+        matches on annual rent, rent per square foot and size.
+        """
         if self.analytics.df.empty:
             return []
         
+        # Everything derived from the query is worked out once, not per row
         query_lower = query.lower()
+        terms = query_lower.split()
+        wants_high_end = any(term in query_lower for term in ['expensive', 'high rent', 'luxury', 'premium'])
+        wants_budget = any(term in query_lower for term in ['affordable', 'cheap', 'low rent', 'budget'])
+        wants_large = any(term in query_lower for term in ['large', 'big', 'spacious'])
+        wants_compact = any(term in query_lower for term in ['small', 'compact', 'cozy'])
+        wants_floor = 'floor' in query_lower or 'level' in query_lower
+        ranges = [
+            (column, bounds, reason, score)
+            for column, bounds, reason, score in [
+                ('Annual Rent', rent_range, "Annual rent in requested range", 3),
+                ('Rent/SF/Year', rent_per_sf_range, "Rent per sq ft in requested range", 3),
+                ('Size (SF)', size_range, "Size in requested range", 2)
+            ]
+            if bounds and (bounds[0] is not None or bounds[1] is not None)
+        ]
         results = []
         
-        # Search in multiple fields - using correct column names from CSV
-        search_fields = ['Address', 'Associate']
-        
         for _, row in self.analytics.df.iterrows():
             match_score = 0
             match_reasons = []
@@ -25,41 +45,48 @@ class PropertySearchService:
             # Address matching
             if 'Address' in row and pd.notna(row['Address']):
                 address = str(row['Address']).lower()
-                if any(term in address for term in query_lower.split()):
+                if any(term in address for term in terms):
                     match_score += 3
                     match_reasons.append(f"Address match: {row['Address']}")
             
             # Associate matching
             if 'Associate' in row and pd.notna(row['Associate']):
                 associate = str(row['Associate']).lower()
-                if any(term in associate for term in query_lower.split()):
+                if any(term in associate for term in terms):
                     match_score += 2
                     match_reasons.append(f"Associate match: {row['Associate']}")
             
+            # Requested ranges
+            for column, (low, high), reason, score in ranges:
+                value = row.get(column, 0)
+                if (low is None or value >= low) and (high is None or value <= high):
+                    match_score += score
+                    match_reasons.append(reason)
+            
             # Rent range matching
-            if any(term in query_lower for term in ['expensive', 'high rent', 'luxury', 'premium']):
+            if wants_high_end:
                 if row['Annual Rent'] > 1500000:  # High-end properties
                     match_score += 2
                     match_reasons.append("High-end property")
             
-            if any(term in query_lower for term in ['affordable', 'cheap', 'low rent', 'budget']):
+            if wants_budget:
                 if row['Annual Rent'] < 1000000:  # Budget properties
                     match_score += 2
                     match_reasons.append("Budget-friendly property")
             
             # Size matching
-            if any(term in query_lower for term in ['large', 'big', 'spacious']):
+            if wants_large:
                 if row['Size (SF)'] > 15000:
                     match_score += 1
                     match_reasons.append("Large property")
             
-            if any(term in query_lower for term in ['small', 'compact', 'cozy']):
+            if wants_compact:
                 if row['Size (SF)'] < 12000:
                     match_score += 1
                     match_reasons.append("Compact property")
             
             # Floor/Building type matching
-            if 'floor' in query_lower or 'level' in query_lower:
+            if wants_floor:
                 if pd.notna(row['Floor']):
                     match_score += 1
                     match_reasons.append(f"Floor information: {row['Floor']}")
@@ -1,17 +1,25 @@
 from fastapi import APIRouter, HTTPException, Query
+from starlette.concurrency import run_in_threadpool
 from .service import PropertyAnalytics
 from .property_search import PropertySearchService
 from .models import DashboardAnalytics, PropertyStats, PropertyData
-from typing import List
+from singleflight import SingleFlight
+from typing import Any, Callable, Hashable, List
 
 router = APIRouter()
 
+# Identical analytics requests in flight at the same time share one computation
+analytics_flights = SingleFlight()
+
+async def shared_computation(key: Hashable, compute: Callable[[], Any]) -> Any:
+    """Run a pandas computation in a worker thread, once for all concurrent identical requests"""
+    return await analytics_flights.do(key, lambda: run_in_threadpool(compute))
+
 @router.get("/dashboard", response_model=DashboardAnalytics)
 async def get_dashboard_analytics():
     """Get comprehensive dashboard analytics"""
     try:
-        analytics_service = PropertyAnalytics()
-        return analytics_service.get_dashboard_analytics()
+        return await shared_computation("dashboard", lambda: PropertyAnalytics().get_dashboard_analytics())
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch dashboard analytics: {str(e)}")
 
@@ -19,8 +27,7 @@ async def get_dashboard_analytics():
 async def get_property_stats():
     """Get overall property statistics"""
     try:
-        analytics_service = PropertyAnalytics()
-        return analytics_service.get_property_stats()
+        return await shared_computation("property_stats", lambda: PropertyAnalytics().get_property_stats())
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch property stats: {str(e)}")
 
@@ -28,10 +35,12 @@ async def get_property_stats():
 async def get_properties(limit: int = 25, offset: int = 0):
     """Get properties data with pagination"""
     try:
-        analytics_service = PropertyAnalytics()
-        properties = analytics_service.get_recent_properties(limit, offset)
-        total_count = analytics_service.get_total_properties_count()
-        
+        def compute():
+            analytics_service = PropertyAnalytics()
+            return analytics_service.get_recent_properties(limit, offset), analytics_service.get_total_properties_count()
+
+        properties, total_count = await shared_computation(("properties", limit, offset), compute)
+
         return {
             "properties": properties,
             "total": total_count,
@@ -46,8 +55,7 @@ async def get_properties(limit: int = 25, offset: int = 0):
 async def get_market_trends():
     """Get market trends and insights"""
     try:
-        analytics_service = PropertyAnalytics()
-        return analytics_service.get_market_trends()
+        return await shared_computation("market_trends", lambda: PropertyAnalytics().get_market_trends())
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch market trends: {str(e)}")
 
@@ -55,8 +63,7 @@ async def get_market_trends():
 async def get_building_class_distribution():
     """Get distribution of properties by building class"""
     try:
-        analytics_service = PropertyAnalytics()
-        return analytics_service.get_building_class_distribution()
+        return await shared_computation("building_class_distribution", lambda: PropertyAnalytics().get_building_class_distribution())
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch building class distribution: {str(e)}")
 
@@ -64,8 +71,7 @@ async def get_building_class_distribution():
 async def get_sub_market_performance():
     """Get performance metrics by sub-market"""
     try:
-        analytics_service = PropertyAnalytics()
-        return analytics_service.get_sub_market_performance()
+        return await shared_computation("sub_market_performance", lambda: PropertyAnalytics().get_sub_market_performance())
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch sub-market performance: {str(e)}")
 
@@ -86,8 +92,10 @@ async def refresh_analytics():
 async def search_properties(q: str = Query(..., description="Search query for properties"), limit: int = 10):
     """Search properties based on natural language query"""
     try:
-        search_service = PropertySearchService()
-        results = search_service.search_properties(q, limit)
+        results = await shared_computation(
+            ("search", q.lower(), limit),
+            lambda: PropertySearchService().search_properties(q, limit)
+        )
         return {
             "query": q,
             "results": results,
@@ -145,8 +153,10 @@ async def get_properties_in_price_range(
 async def get_market_summary(area: str = Query(None, description="Market area to analyze")):
     """Get market summary for a specific area or overall"""
     try:
-        search_service = PropertySearchService()
-        summary = search_service.get_market_summary(area)
+        summary = await shared_computation(
+            ("market_summary", (area or "").lower()),
+            lambda: PropertySearchService().get_market_summary(area)
+        )
         return {
             "market_area": area or "Overall Market",
             "summary": summary
@@ -0,0 +1,179 @@
+import asyncio
+import gzip
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional, Dict, Any
+
+from bson import Binary, decode as bson_decode, encode as bson_encode
+from pymongo import ASCENDING
+from pymongo.errors import BulkWriteError
+
+from .cache import session_cache
+from .models import ConversationStatus
+
+logger = logging.getLogger(__name__)
+
+# Archiver settings - you can set these in environment variables
+ARCHIVE_IDLE_DAYS = int(os.getenv("ARCHIVE_IDLE_DAYS", "30"))
+ARCHIVE_INTERVAL_SECONDS = int(os.getenv("ARCHIVE_INTERVAL_SECONDS", "0"))  # 0 disables the loop
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "100"))
+ARCHIVE_CODEC = "gzip"
+
+class ConversationArchiver:
+    """Packs the messages of closed or idle sessions into one compressed document.
+
+    Archived sessions keep their session document (flagged ``archived``) while
+    their messages move from ``conversations_messages`` into a single blob in
+    ``conversations_archives``, so they no longer occupy message index entries.
+    """
+
+    def __init__(self, database):
+        self.sessions_collection = database["conversations_sessions"]
+        self.messages_collection = database["conversations_messages"]
+        self.archives_collection = database["conversations_archives"]
+
+    @staticmethod
+    def _pack(messages: List[Dict[str, Any]]) -> Binary:
+        """Compress a list of message documents"""
+        return Binary(gzip.compress(bson_encode({"messages": messages})))
+
+    @staticmethod
+    def _unpack(archive_doc: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Decompress the message documents of an archive"""
+        return bson_decode(gzip.decompress(archive_doc["data"]))["messages"]
+
+    async def load_messages(self, session_id: str) -> List[Dict[str, Any]]:
+        """Get the archived message documents of a session in chronological order.
+
+        Messages still in ``conversations_messages`` (written while the session
+        was being archived) are merged in, so they are never hidden by the archive.
+        """
+        archive_doc = await self.archives_collection.find_one({"_id": session_id})
+        messages = self._unpack(archive_doc) if archive_doc else []
+        archived_ids = {message_doc["_id"] for message_doc in messages}
+        stray = [
+            message_doc async for message_doc in self.messages_collection.find({"session_id": session_id})
+            if message_doc["_id"] not in archived_ids
+        ]
+        if stray:
+            messages = sorted(messages + stray, key=lambda message_doc: message_doc["timestamp"])
+        return messages
+
+    async def archive_session(self, session_id: str) -> Optional[int]:
+        """Pack a session's messages into an archive and delete the originals.
+
+        Returns the number of messages archived, or None if the session was not
+        archived (missing, already archived, or written to meanwhile).
+        """
+        session_doc = await self.sessions_collection.find_one(
+            {"_id": session_id}, {"updated_at": 1, "archived": 1, "message_count": 1}
+        )
+        if not session_doc or session_doc.get("archived"):
+            return None
+
+        cursor = self.messages_collection.find({"session_id": session_id}).sort("timestamp", ASCENDING)
+        messages = [message_doc async for message_doc in cursor]
+
+        await self.archives_collection.replace_one(
+            {"_id": session_id},
+            {
+                "_id": session_id,
+                "codec": ARCHIVE_CODEC,
+                "data": self._pack(messages),
+                "message_count": len(messages),
+                "first_timestamp": messages[0]["timestamp"] if messages else None,
+                "last_timestamp": messages[-1]["timestamp"] if messages else None,
+                "archived_at": datetime.utcnow()
+            },
+            upsert=True
+        )
+
+        # Only flip the flag if nothing was written to the session meanwhile
+        result = await self.sessions_collection.update_one(
+            {
+                "_id": session_id,
+                "updated_at": session_doc["updated_at"],
+                "message_count": session_doc.get("message_count"),
+                "archived": {"$ne": True}
+            },
+            {"$set": {"archived": True}}
+        )
+        session_cache.invalidate(session_id)
+        if result.modified_count == 0:
+            await self.archives_collection.delete_one({"_id": session_id})
+            return None
+
+        # A message inserted before its session update lands after the read above
+        # without changing the session yet; back out rather than hide it
+        archived_ids = [message_doc["_id"] for message_doc in messages]
+        if await self.messages_collection.find_one({"session_id": session_id, "_id": {"$nin": archived_ids}}, {"_id": 1}):
+            await self.sessions_collection.update_one({"_id": session_id}, {"$set": {"archived": False}})
+            await self.archives_collection.delete_one({"_id": session_id})
+            session_cache.invalidate(session_id)
+            return None
+
+        if messages:
+            await self.messages_collection.delete_many({"_id": {"$in": archived_ids}})
+        return len(messages)
+
+    async def restore_session(self, session_id: str) -> int:
+        """Unpack an archived session back into individual message documents.
+
+        Returns the number of messages restored.
+        """
+        archive_doc = await self.archives_collection.find_one({"_id": session_id})
+        messages = self._unpack(archive_doc) if archive_doc else []
+
+        if messages:
+            try:
+                await self.messages_collection.insert_many(messages, ordered=False)
+            except BulkWriteError as e:
+                # Messages left behind by an interrupted restore are already in place
+                if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                    raise
+
+        await self.sessions_collection.update_one({"_id": session_id}, {"$set": {"archived": False}})
+        await self.archives_collection.delete_one({"_id": session_id})
+        session_cache.invalidate(session_id)
+        return len(messages)
+
+    async def delete_archive(self, session_id: str) -> None:
+        """Delete the archive of a session"""
+        await self.archives_collection.delete_one({"_id": session_id})
+
+    async def run_once(self, idle_days: int = ARCHIVE_IDLE_DAYS, limit: int = ARCHIVE_BATCH_SIZE) -> Dict[str, int]:
+        """Archive up to ``limit`` sessions that are closed or idle for ``idle_days``"""
+        cutoff = datetime.utcnow() - timedelta(days=idle_days)
+        query = {
+            "archived": {"$ne": True},
+            "$or": [
+                {"status": ConversationStatus.CLOSED},
+                {"updated_at": {"$lt": cutoff}}
+            ]
+        }
+
+        sessions = 0
+        messages = 0
+        async for session_doc in self.sessions_collection.find(query, {"_id": 1}).limit(limit):
+            try:
+                archived = await self.archive_session(session_doc["_id"])
+            except Exception as e:
+                logger.error(f"Failed to archive session {session_doc['_id']}: {e}")
+                continue
+            if archived is None:
+                continue
+            sessions += 1
+            messages += archived
+        return {"sessions_archived": sessions, "messages_archived": messages}
+
+    async def run_periodically(self, interval: int = ARCHIVE_INTERVAL_SECONDS, idle_days: int = ARCHIVE_IDLE_DAYS) -> None:
+        """Archive sessions in the background every ``interval`` seconds"""
+        while True:
+            try:
+                result = await self.run_once(idle_days)
+                if result["sessions_archived"]:
+                    logger.info(f"Archived conversations: {result}")
+            except Exception as e:
+                logger.error(f"Conversation archiver failed: {e}")
+            await asyncio.sleep(interval)
@@ -0,0 +1,84 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+from .models import ConversationSession
+
+# Cache settings - you can set these in environment variables
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "2048"))
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "30"))
+
+class SessionCache:
+    """Bounded LRU + TTL cache of ConversationSession documents.
+
+    The cache is process-local, so with several workers a session can be
+    stale for at most ``ttl`` seconds after another worker writes it.
+    """
+
+    def __init__(self, maxsize: int = SESSION_CACHE_SIZE, ttl: float = SESSION_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.request_hits = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, session_id: str) -> Optional[ConversationSession]:
+        """Get a cached session, or None if missing or expired"""
+        entry = self._entries.get(session_id)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, session = entry
+        if expires_at < time.monotonic():
+            del self._entries[session_id]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(session_id)
+        self.hits += 1
+        return session
+
+    def set(self, session: ConversationSession) -> None:
+        """Store a session, evicting the least recently used entries"""
+        if self.maxsize <= 0 or not session.session_id:
+            return
+
+        self._entries[session.session_id] = (time.monotonic() + self.ttl, session)
+        self._entries.move_to_end(session.session_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, session_id: str) -> None:
+        """Drop a session after it has been written"""
+        if self._entries.pop(session_id, None) is not None:
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        """Drop every cached session"""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache size and hit ratios"""
+        lookups = self.hits + self.misses
+        reads = lookups + self.request_hits
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "request_hits": self.request_hits,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "overall_hit_ratio": (self.hits + self.request_hits) / reads if reads else 0.0
+        }
+
+# Shared cache instance
+session_cache = SessionCache()
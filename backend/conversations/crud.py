@@ -1,21 +1,82 @@
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from pymongo import ASCENDING, DESCENDING
-from typing import List, Optional
-from datetime import datetime
+from pymongo import ASCENDING, DESCENDING, TEXT, ReturnDocument, UpdateMany, UpdateOne, DeleteMany
+from pymongo.errors import DuplicateKeyError, BulkWriteError
+from typing import List, Optional, AsyncIterator
+from datetime import datetime, timedelta
 import uuid
+import os
+import re
 
 from .models import (
     ConversationSession, ChatMessage, ConversationSessionCreate,
     ConversationSessionUpdate, MessageCreate, ConversationStatus,
-    ConversationCategory
+    ConversationCategory, ContextMessage, SessionFilter, BulkSessionSelection,
+    BulkSessionUpdate
 )
+from .cache import session_cache
+from .archiver import ConversationArchiver
+from .rollups import ConversationRollups
+from .serialization import (
+    SESSION_RESPONSE_PROJECTION, MESSAGE_RESPONSE_PROJECTION, message_response_dict,
+    session_response_dict
+)
+from .events import event_broker
+from .retention import RetentionManager
+
+# Namespace for deterministic message and session IDs derived from idempotency keys
+MESSAGE_ID_NAMESPACE = uuid.UUID("5f1d7c8e-3b7a-4d2e-9a61-0c4b8f2e7d13")
+
+# Rough characters-per-token ratio used to turn token budgets into character budgets
+CHARS_PER_TOKEN = 4
+# Rolling summary settings - you can set these in environment variables
+CONTEXT_SUMMARY_MAX_CHARS = int(os.getenv("CONTEXT_SUMMARY_MAX_CHARS", "2000"))
+CONTEXT_SUMMARY_LINE_CHARS = 160
+CONTEXT_SUMMARY_BATCH = 200
+# Full-text search settings
+SEARCH_SNIPPET_CHARS = 160
+SEARCH_SNIPPETS_PER_SESSION = 3
+SEARCH_CANDIDATE_SESSIONS = 500
+# Sidebar preview settings
+PREVIEW_CHARS = 100
+# Bulk operation settings
+BULK_ID_CHUNK = 1000
+CASCADE_DELETE_CHUNK = 1000
+SESSION_PREVIEW_PROJECTION = {
+    "title": 1, "status": 1, "category": 1, "created_at": 1, "updated_at": 1,
+    "message_count": 1, "tags": 1, "last_message_preview": 1,
+    "last_message_sender": 1, "last_message_at": 1, "sender_counts": 1
+}
+
+def message_preview(content: str) -> str:
+    """Collapse a message into its sidebar preview"""
+    preview = " ".join(content.split())
+    if len(preview) > PREVIEW_CHARS:
+        preview = preview[:PREVIEW_CHARS].rstrip() + "..."
+    return preview
 
 class ConversationCRUD:
     def __init__(self, database):
         self.db = database
         self.sessions_collection = database["conversations_sessions"]
         self.messages_collection = database["conversations_messages"]
-        
+        self.cache = session_cache
+        self.archiver = ConversationArchiver(database)
+        self.rollups = ConversationRollups(database)
+        self.events = event_broker
+        # Per-request memo - a new CRUD instance is created for every request
+        self._request_sessions = {}
+
+    def _remember_session(self, session: ConversationSession) -> ConversationSession:
+        """Store a fresh session in the request memo and the shared cache"""
+        self._request_sessions[session.session_id] = session
+        self.cache.set(session)
+        return session
+
+    def _invalidate_session(self, session_id: str):
+        """Forget a session after it has been written"""
+        self._request_sessions.pop(session_id, None)
+        self.cache.invalidate(session_id)
+
     async def create_indexes(self):
         """Create database indexes for better performance"""
         # Session indexes
@@ -23,15 +84,87 @@ class ConversationCRUD:
         await self.sessions_collection.create_index([("user_email", ASCENDING)])
         await self.sessions_collection.create_index([("created_at", DESCENDING)])
         await self.sessions_collection.create_index([("status", ASCENDING)])
+        await self.sessions_collection.create_index([("title", TEXT)], name="title_text")
+        # Sidebar listings: filter by owner, newest activity first
+        await self.sessions_collection.create_index([("updated_at", DESCENDING)])
+        await self.sessions_collection.create_index([("user_id", ASCENDING), ("updated_at", DESCENDING)])
+        await self.sessions_collection.create_index([("user_email", ASCENDING), ("updated_at", DESCENDING)])
         
         # Message indexes
         await self.messages_collection.create_index([("session_id", ASCENDING)])
         await self.messages_collection.create_index([("timestamp", ASCENDING)])
         await self.messages_collection.create_index([("sender", ASCENDING)])
+        # Tail-window reads walk this index backwards from the newest message
+        await self.messages_collection.create_index([("session_id", ASCENDING), ("timestamp", DESCENDING)])
+        await self.messages_collection.create_index([("content", TEXT)], name="content_text")
+        
+        # Retention backstop for closed guest sessions
+        await RetentionManager(self).create_ttl_index()
+
+        await self._backfill_message_fields()
+        # Needs the sender counts filled in above
+        await self.rollups.seed(self.sessions_collection, self.messages_collection)
+
+    async def _backfill_message_fields(self, batch_size: int = 500):
+        """Add sender counts and the last-message preview to sessions created before they existed"""
+        while True:
+            cursor = self.sessions_collection.find(
+                {"sender_counts": {"$exists": False}}, {"archived": 1}
+            ).limit(batch_size)
+            session_docs = [session_doc async for session_doc in cursor]
+            if not session_docs:
+                return
+            fields = {session_doc["_id"]: {"sender_counts": {}} for session_doc in session_docs}
+
+            live_ids = [session_doc["_id"] for session_doc in session_docs if not session_doc.get("archived")]
+            if live_ids:
+                async for group in self.messages_collection.aggregate([
+                    {"$match": {"session_id": {"$in": live_ids}}},
+                    {"$group": {"_id": {"session_id": "$session_id", "sender": "$sender"}, "count": {"$sum": 1}}}
+                ]):
+                    fields[group["_id"]["session_id"]]["sender_counts"][group["_id"]["sender"]] = group["count"]
+                async for last in self.messages_collection.aggregate([
+                    {"$match": {"session_id": {"$in": live_ids}}},
+                    {"$sort": {"session_id": ASCENDING, "timestamp": ASCENDING}},
+                    {"$group": {
+                        "_id": "$session_id",
+                        "content": {"$last": "$content"},
+                        "sender": {"$last": "$sender"},
+                        "timestamp": {"$last": "$timestamp"}
+                    }}
+                ]):
+                    fields[last["_id"]].update(self._last_message_fields(last))
+
+            for session_doc in session_docs:
+                if session_doc.get("archived"):
+                    archived = await self.archiver.load_messages(session_doc["_id"])
+                    for message_doc in archived:
+                        counts = fields[session_doc["_id"]]["sender_counts"]
+                        counts[message_doc["sender"]] = counts.get(message_doc["sender"], 0) + 1
+                    if archived:
+                        fields[session_doc["_id"]].update(self._last_message_fields(archived[-1]))
+
+            await self.sessions_collection.bulk_write([
+                UpdateOne({"_id": session_id, "sender_counts": {"$exists": False}}, {"$set": session_fields})
+                for session_id, session_fields in fields.items()
+            ], ordered=False)
+
+    @staticmethod
+    def _last_message_fields(message_doc: dict) -> dict:
+        return {
+            "last_message_preview": message_preview(message_doc.get("content") or ""),
+            "last_message_sender": message_doc.get("sender"),
+            "last_message_at": message_doc.get("timestamp")
+        }
 
-    async def create_session(self, session_data: ConversationSessionCreate) -> ConversationSession:
-        """Create a new conversation session"""
-        session_id = str(uuid.uuid4())
+    async def create_session(self, session_data: ConversationSessionCreate,
+                             idempotency_key: Optional[str] = None) -> ConversationSession:
+        """Create a new conversation session.
+
+        With an idempotency key the session ID is derived from it, and a retried
+        create returns the session made the first time.
+        """
+        session_id = self.session_id_for(idempotency_key) if idempotency_key else str(uuid.uuid4())
         
         session = ConversationSession(
             session_id=session_id,
@@ -51,143 +184,518 @@ class ConversationCRUD:
         session_dict = session.dict(by_alias=True)
         session_dict["_id"] = session_id
         
-        await self.sessions_collection.insert_one(session_dict)
-        return session
+        try:
+            await self.sessions_collection.insert_one(session_dict)
+        except DuplicateKeyError:
+            existing = await self.get_session(session_id) if idempotency_key else None
+            if existing:
+                return existing
+            raise
+        await self.rollups.session_created(session_dict)
+        return self._remember_session(session)
 
     async def get_session(self, session_id: str) -> Optional[ConversationSession]:
         """Get a conversation session by ID"""
+        session = self._request_sessions.get(session_id)
+        if session is not None:
+            self.cache.request_hits += 1
+            return session
+
+        session = self.cache.get(session_id)
+        if session is not None:
+            self._request_sessions[session_id] = session
+            return session
+
         session_doc = await self.sessions_collection.find_one({"_id": session_id})
         if session_doc:
-            return ConversationSession(**session_doc)
+            return self._remember_session(ConversationSession(**session_doc))
         return None
 
+    async def _is_archived(self, session_id: str) -> bool:
+        """Check whether a session's messages are in cold storage"""
+        session = await self.get_session(session_id)
+        return bool(session and session.archived)
+
     async def update_session(self, session_id: str, update_data: ConversationSessionUpdate) -> Optional[ConversationSession]:
         """Update a conversation session"""
+        if update_data.status == ConversationStatus.ACTIVE and await self._is_archived(session_id):
+            await self.archiver.restore_session(session_id)
+
         update_dict = {k: v for k, v in update_data.dict().items() if v is not None}
         update_dict["updated_at"] = datetime.utcnow()
         
-        result = await self.sessions_collection.update_one(
+        self._invalidate_session(session_id)
+        before = await self.sessions_collection.find_one_and_update(
             {"_id": session_id},
-            {"$set": update_dict}
+            {"$set": update_dict},
+            return_document=ReturnDocument.BEFORE
         )
         
-        if result.modified_count > 0:
-            return await self.get_session(session_id)
+        if before:
+            session_doc = {**before, **update_dict}
+            await self.rollups.session_changed(before, session_doc)
+            session = self._remember_session(ConversationSession(**session_doc))
+            await self.events.publish(session_id, "session", session_response_dict(session))
+            return session
         return None
 
-    async def close_session(self, session_id: str) -> bool:
-        """Close a conversation session"""
-        result = await self.sessions_collection.update_one(
+    async def _set_session_fields(self, session_id: str, fields: dict) -> bool:
+        """Set fields on a session, keeping the cache and rollups in step"""
+        fields["updated_at"] = datetime.utcnow()
+        before = await self.sessions_collection.find_one_and_update(
             {"_id": session_id},
-            {"$set": {"status": ConversationStatus.CLOSED, "updated_at": datetime.utcnow()}}
+            {"$set": fields},
+            return_document=ReturnDocument.BEFORE
         )
-        return result.modified_count > 0
+        self._invalidate_session(session_id)
+        if not before:
+            return False
+        await self.rollups.session_changed(before, {**before, **fields})
+        await self.events.publish(session_id, "session", {"session_id": session_id, **fields})
+        return True
+
+    async def close_session(self, session_id: str) -> bool:
+        """Close a conversation session"""
+        return await self._set_session_fields(session_id, {"status": ConversationStatus.CLOSED})
+
+    async def reopen_session(self, session_id: str) -> bool:
+        """Reopen a closed conversation session, unpacking archived messages"""
+        if await self._is_archived(session_id):
+            await self.archiver.restore_session(session_id)
 
-    async def get_user_sessions(self, user_id: str = None, user_email: str = None, limit: int = 20, skip: int = 0) -> List[ConversationSession]:
-        """Get conversation sessions for a user"""
+        return await self._set_session_fields(session_id, {"status": ConversationStatus.ACTIVE})
+
+    async def get_session_previews(self, user_id: str = None, user_email: str = None, limit: int = 20, skip: int = 0) -> List[dict]:
+        """Get sidebar previews of sessions, most recently active first, in one indexed query"""
         query = {}
         if user_id:
             query["user_id"] = user_id
         elif user_email:
             query["user_email"] = user_email
-        else:
-            return []
-            
-        cursor = self.sessions_collection.find(query).sort("created_at", DESCENDING).skip(skip).limit(limit)
-        sessions = []
+
+        cursor = self.sessions_collection.find(query, SESSION_PREVIEW_PROJECTION).sort("updated_at", DESCENDING).skip(skip).limit(limit)
+        previews = []
         async for session_doc in cursor:
-            sessions.append(ConversationSession(**session_doc))
-        return sessions
+            session_doc["session_id"] = session_doc.pop("_id")
+            previews.append(session_doc)
+        return previews
 
-    async def search_sessions(self, query: str, limit: int = 20) -> List[ConversationSession]:
-        """Search conversation sessions by title or tags"""
-        search_query = {
+    @staticmethod
+    def search_sessions_query(query: str) -> dict:
+        """Build the title/tag query for searching sessions"""
+        return {
             "$or": [
                 {"title": {"$regex": query, "$options": "i"}},
                 {"tags": {"$in": [query]}}
             ]
         }
-        
-        cursor = self.sessions_collection.find(search_query).sort("created_at", DESCENDING).limit(limit)
-        sessions = []
-        async for session_doc in cursor:
-            sessions.append(ConversationSession(**session_doc))
-        return sessions
+
+    async def search_messages(
+        self,
+        query: str,
+        user_id: Optional[str] = None,
+        user_email: Optional[str] = None,
+        category: Optional[ConversationCategory] = None,
+        status: Optional[ConversationStatus] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        limit: int = 20
+    ) -> List[dict]:
+        """Full-text search over message content and session titles, grouped by session.
+
+        Both lookups go through MongoDB text indexes, so cost depends on the number
+        of matches rather than the size of the collections. Messages of archived
+        sessions live in compressed archives outside the text index, so those
+        sessions are found by their title only until they are restored.
+        """
+        message_match = {"$text": {"$search": query}}
+        if start_date or end_date:
+            message_match["timestamp"] = {}
+            if start_date:
+                message_match["timestamp"]["$gte"] = start_date
+            if end_date:
+                message_match["timestamp"]["$lte"] = end_date
+
+        session_filter = {}
+        if user_id:
+            session_filter["user_id"] = user_id
+        if user_email:
+            session_filter["user_email"] = user_email
+        if category:
+            session_filter["category"] = category
+        if status:
+            session_filter["status"] = status
+        if session_filter:
+            # Restrict the message ranking to the filtered sessions up front, so the
+            # candidate limit below never drops sessions that pass the filter
+            filtered_ids = await self.sessions_collection.distinct("_id", session_filter)
+            if not filtered_ids:
+                return []
+            message_match["session_id"] = {"$in": filtered_ids}
+
+        pipeline = [
+            {"$match": message_match},
+            {"$addFields": {"score": {"$meta": "textScore"}}},
+            {"$group": {
+                "_id": "$session_id",
+                "score": {"$sum": "$score"},
+                "matched_messages": {"$sum": 1},
+                # Keep only the best few messages per session for snippets
+                "contents": {"$topN": {
+                    "n": SEARCH_SNIPPETS_PER_SESSION,
+                    "sortBy": {"score": DESCENDING},
+                    "output": "$content"
+                }}
+            }},
+            {"$sort": {"score": DESCENDING}},
+            {"$limit": SEARCH_CANDIDATE_SESSIONS}
+        ]
+
+        hits = {}
+        async for group in self.messages_collection.aggregate(pipeline):
+            hits[group["_id"]] = {
+                "score": group["score"],
+                "matched_messages": group["matched_messages"],
+                "title_match": False,
+                "contents": group["contents"]
+            }
+
+        # Sessions whose title matches, scored alongside the message hits
+        title_query = {"$text": {"$search": query}, **session_filter}
+        if start_date or end_date:
+            title_query["updated_at"] = message_match["timestamp"]
+        title_cursor = self.sessions_collection.find(
+            title_query, {"score": {"$meta": "textScore"}}
+        ).sort([("score", {"$meta": "textScore"})]).limit(SEARCH_CANDIDATE_SESSIONS)
+
+        sessions = {}
+        async for session_doc in title_cursor:
+            hit = hits.setdefault(session_doc["_id"], {
+                "score": 0.0, "matched_messages": 0, "title_match": False, "contents": []
+            })
+            hit["score"] += session_doc.pop("score", 0.0)
+            hit["title_match"] = True
+            sessions[session_doc["_id"]] = session_doc
+
+        # Load and filter the sessions that only matched on message content
+        missing = [session_id for session_id in hits if session_id not in sessions]
+        if missing:
+            async for session_doc in self.sessions_collection.find({"_id": {"$in": missing}, **session_filter}):
+                sessions[session_doc["_id"]] = session_doc
+
+        terms = [re.escape(term) for term in query.split() if term]
+        term_pattern = re.compile("|".join(terms), re.IGNORECASE) if terms else None
+
+        results = []
+        for session_id, hit in sorted(hits.items(), key=lambda item: item[1]["score"], reverse=True):
+            session_doc = sessions.get(session_id)
+            if not session_doc:
+                continue
+            results.append({
+                "session_id": session_id,
+                "title": session_doc.get("title"),
+                "user_id": session_doc.get("user_id"),
+                "user_email": session_doc.get("user_email"),
+                "status": session_doc.get("status", ConversationStatus.ACTIVE),
+                "category": session_doc.get("category", ConversationCategory.INQUIRING),
+                "updated_at": session_doc.get("updated_at"),
+                "score": hit["score"],
+                "matched_messages": hit["matched_messages"],
+                "title_match": hit["title_match"],
+                "snippets": [self._make_snippet(content, term_pattern) for content in hit["contents"]]
+            })
+            if len(results) >= limit:
+                break
+        return results
+
+    @staticmethod
+    def _make_snippet(content: str, term_pattern) -> str:
+        """Cut a short snippet of content around the first matching term"""
+        if len(content) <= SEARCH_SNIPPET_CHARS:
+            return content
+        match = term_pattern.search(content) if term_pattern else None
+        start = max(0, match.start() - SEARCH_SNIPPET_CHARS // 3) if match else 0
+        snippet = content[start:start + SEARCH_SNIPPET_CHARS].strip()
+        if start > 0:
+            snippet = "..." + snippet
+        if start + SEARCH_SNIPPET_CHARS < len(content):
+            snippet += "..."
+        return snippet
+
+    @staticmethod
+    def message_id_for(session_id: str, idempotency_key: str) -> str:
+        """Derive the message ID for an idempotency key, so retries map to the same document"""
+        return str(uuid.uuid5(MESSAGE_ID_NAMESPACE, f"{session_id}:{idempotency_key}"))
+
+    @staticmethod
+    def session_id_for(idempotency_key: str) -> str:
+        """Derive the session ID for an idempotency key, so a retried create maps to the same session"""
+        return str(uuid.uuid5(MESSAGE_ID_NAMESPACE, f"session:{idempotency_key}"))
+
+    async def get_message_by_key(self, session_id: str, idempotency_key: str) -> Optional[ChatMessage]:
+        """Get the message stored under an idempotency key, if any"""
+        message_id = self.message_id_for(session_id, idempotency_key)
+        if await self._is_archived(session_id):
+            archived = await self.archiver.load_messages(session_id)
+            message_doc = next((doc for doc in archived if doc.get("_id") == message_id), None)
+        else:
+            message_doc = await self.messages_collection.find_one({"_id": message_id})
+        return ChatMessage(**message_doc) if message_doc else None
 
     async def add_message(self, session_id: str, message_data: MessageCreate) -> ChatMessage:
-        """Add a message to a conversation"""
-        message_id = str(uuid.uuid4())
-        
-        message = ChatMessage(
-            message_id=message_id,
-            session_id=session_id,
-            sender=message_data.sender,
-            content=message_data.content,
-            timestamp=datetime.utcnow(),
-            metadata=message_data.metadata
-        )
-        
-        # Convert to dict for MongoDB
-        message_dict = message.dict(by_alias=True)
-        message_dict["_id"] = message_id
-        
-        # Insert message
-        await self.messages_collection.insert_one(message_dict)
-        
-        # Update session message count and timestamp
-        await self.sessions_collection.update_one(
+        """Add a message to a conversation.
+
+        When the message carries an idempotency key its ID is derived from it, so a
+        retried write hits the unique _id index and the original message is returned
+        without counting it twice.
+        """
+        return (await self.add_turn(session_id, [message_data]))[0]
+
+    async def add_turn(self, session_id: str, messages_data: List[MessageCreate]) -> List[ChatMessage]:
+        """Add the messages of one turn with a single insert and a single session update.
+
+        Messages are timestamped a millisecond apart so they keep their order.
+        Messages whose idempotency key was already stored are returned as
+        stored and not counted again.
+        """
+        if await self._is_archived(session_id):
+            await self.archiver.restore_session(session_id)
+            self._invalidate_session(session_id)
+
+        now = datetime.utcnow()
+        messages = [
+            ChatMessage(
+                message_id=(
+                    self.message_id_for(session_id, message_data.idempotency_key)
+                    if message_data.idempotency_key else str(uuid.uuid4())
+                ),
+                session_id=session_id,
+                sender=message_data.sender,
+                content=message_data.content,
+                timestamp=now + timedelta(milliseconds=offset),
+                metadata=message_data.metadata
+            )
+            for offset, message_data in enumerate(messages_data)
+        ]
+        message_dicts = []
+        for message in messages:
+            message_dict = message.dict(by_alias=True)
+            message_dict["_id"] = message.message_id
+            message_dicts.append(message_dict)
+
+        duplicate_indexes = set()
+        try:
+            await self.messages_collection.insert_many(message_dicts, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(error.get("code") != 11000 for error in errors):
+                raise
+            duplicate_indexes = {error["index"] for error in errors}
+        if duplicate_indexes:
+            existing = {
+                message_doc["_id"]: ChatMessage(**message_doc)
+                async for message_doc in self.messages_collection.find(
+                    {"_id": {"$in": [messages[index].message_id for index in duplicate_indexes]}}
+                )
+            }
+            messages = [existing.get(message.message_id, message) for message in messages]
+        inserted = [message for index, message in enumerate(messages) if index not in duplicate_indexes]
+        if not inserted:
+            return messages
+
+        sender_counts = {}
+        for message in inserted:
+            key = f"sender_counts.{message.sender.value}"
+            sender_counts[key] = sender_counts.get(key, 0) + 1
+        last = inserted[-1]
+        self._invalidate_session(session_id)
+        session_doc = await self.sessions_collection.find_one_and_update(
             {"_id": session_id},
             {
-                "$inc": {"message_count": 1},
-                "$set": {"updated_at": datetime.utcnow()}
-            }
+                "$inc": {"message_count": len(inserted), **sender_counts},
+                "$set": {
+                    "updated_at": datetime.utcnow(),
+                    "last_message_preview": message_preview(last.content),
+                    "last_message_sender": last.sender,
+                    "last_message_at": last.timestamp
+                }
+            },
+            return_document=ReturnDocument.AFTER
         )
-        
-        # Auto-generate title if this is the first user message
-        if message_data.sender.value == "user":
-            session = await self.get_session(session_id)
-            if session and session.message_count <= 2 and not session.title or session.title == "New Conversation":
-                # Generate title from first user message (first 50 chars)
-                title = message_data.content[:50].strip()
-                if len(message_data.content) > 50:
+        if session_doc:
+            session = self._remember_session(ConversationSession(**session_doc))
+            for message in inserted:
+                await self.rollups.message_added(session_doc, message.sender)
+
+            # Title a new conversation after its first user message
+            first_user = next((message for message in inserted if message.sender.value == "user"), None)
+            if first_user and (not session.title or session.title == "New Conversation"):
+                title = first_user.content[:50].strip()
+                if len(first_user.content) > 50:
                     title += "..."
                 await self.update_session(session_id, ConversationSessionUpdate(title=title))
-        
-        return message
+
+        for message in inserted:
+            await self.events.publish(session_id, "message", message.model_dump())
+        return messages
 
     async def get_messages(self, session_id: str, limit: int = 100, skip: int = 0) -> List[ChatMessage]:
         """Get messages for a conversation session"""
+        if await self._is_archived(session_id):
+            archived = await self.archiver.load_messages(session_id)
+            return [ChatMessage(**message_doc) for message_doc in archived[skip:skip + limit]]
+
         cursor = self.messages_collection.find({"session_id": session_id}).sort("timestamp", ASCENDING).skip(skip).limit(limit)
         messages = []
         async for message_doc in cursor:
             messages.append(ChatMessage(**message_doc))
         return messages
 
-    async def get_conversation_history(self, session_id: str) -> Optional[tuple]:
-        """Get full conversation history (session + messages)"""
-        session = await self.get_session(session_id)
-        if not session:
+    async def get_message_documents(self, session_id: str, limit: int = 100, skip: int = 0) -> List[dict]:
+        """Get messages already shaped like ChatMessageResponse, without building models"""
+        if await self._is_archived(session_id):
+            archived = await self.archiver.load_messages(session_id)
+            return [message_response_dict(message_doc) for message_doc in archived[skip:skip + limit]]
+
+        cursor = self.messages_collection.find(
+            {"session_id": session_id}, MESSAGE_RESPONSE_PROJECTION
+        ).sort("timestamp", ASCENDING).skip(skip).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    async def get_session_documents(self, query: dict, sort_field: str, limit: int, skip: int = 0) -> List[dict]:
+        """Get sessions already shaped like ConversationSessionResponse, without building models"""
+        cursor = self.sessions_collection.find(
+            query, SESSION_RESPONSE_PROJECTION
+        ).sort(sort_field, DESCENDING).skip(skip).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    async def get_recent_messages(self, session_id: str, last_n: int = 10, max_chars: Optional[int] = None) -> tuple:
+        """Get the newest messages of a session that fit within last_n and a character budget.
+
+        Returns (messages in chronological order, oldest returned timestamp, truncated flag).
+        """
+        if await self._is_archived(session_id):
+            archived = await self.archiver.load_messages(session_id)
+            message_docs = archived[::-1][:last_n + 1]
+        else:
+            cursor = self.messages_collection.find(
+                {"session_id": session_id},
+                {"_id": 0, "sender": 1, "content": 1, "timestamp": 1}
+            ).sort("timestamp", DESCENDING).limit(last_n + 1)
+            message_docs = await cursor.to_list(length=last_n + 1)
+
+        messages = []
+        oldest_timestamp = None
+        used_chars = 0
+        truncated = False
+        for message_doc in message_docs:
+            if len(messages) >= last_n:
+                truncated = True
+                break
+            content = message_doc.get("content", "")
+            if max_chars is not None and messages and used_chars + len(content) > max_chars:
+                truncated = True
+                break
+            if max_chars is not None and not messages and len(content) > max_chars:
+                # Always return the newest message, keeping its most recent part
+                content = content[-max_chars:]
+                truncated = True
+            used_chars += len(content)
+            oldest_timestamp = message_doc.get("timestamp")
+            messages.append(ContextMessage(sender=message_doc["sender"], content=content))
+
+        messages.reverse()
+        return messages, oldest_timestamp, truncated
+
+    async def get_context_summary(self, session_id: str, before: datetime) -> Optional[str]:
+        """Get a cached rolling summary of the turns older than ``before``.
+
+        The summary is stored on the session document and only extended with the
+        messages added since it was last built, so each message is summarized once.
+        Each line keeps its message timestamp, and only lines older than ``before``
+        are returned, so a summary built for a smaller tail window never repeats
+        turns that are in a larger one.
+        """
+        session_doc = await self.sessions_collection.find_one({"_id": session_id}, {"context_summary": 1, "archived": 1})
+        if not session_doc:
             return None
-            
-        messages = await self.get_messages(session_id)
-        return session, messages
+
+        summary = session_doc.get("context_summary") or {}
+        lines = summary.get("lines", [])
+        covered_until = summary.get("covered_until")
+        if any(not isinstance(line, dict) for line in lines):
+            # Built before lines carried timestamps; start over
+            lines, covered_until = [], None
+
+        if session_doc.get("archived"):
+            message_docs = [
+                message_doc for message_doc in await self.archiver.load_messages(session_id)
+                if message_doc["timestamp"] < before and (not covered_until or message_doc["timestamp"] > covered_until)
+            ][:CONTEXT_SUMMARY_BATCH]
+        else:
+            query = {"session_id": session_id, "timestamp": {"$lt": before}}
+            if covered_until:
+                query["timestamp"]["$gt"] = covered_until
+            message_docs = await self.messages_collection.find(
+                query,
+                {"_id": 0, "sender": 1, "content": 1, "timestamp": 1}
+            ).sort("timestamp", ASCENDING).limit(CONTEXT_SUMMARY_BATCH).to_list(length=CONTEXT_SUMMARY_BATCH)
+
+        new_lines = 0
+        for message_doc in message_docs:
+            text = " ".join(message_doc.get("content", "").split())
+            if len(text) > CONTEXT_SUMMARY_LINE_CHARS:
+                text = text[:CONTEXT_SUMMARY_LINE_CHARS].rstrip() + "..."
+            sender = getattr(message_doc["sender"], "value", message_doc["sender"])
+            lines.append({"at": message_doc["timestamp"], "text": f"{sender}: {text}"})
+            covered_until = message_doc["timestamp"]
+            new_lines += 1
+
+        # Keep the most recent lines within the summary budget
+        while lines and sum(len(line["text"]) + 1 for line in lines) > CONTEXT_SUMMARY_MAX_CHARS:
+            lines.pop(0)
+
+        if new_lines:
+            await self.sessions_collection.update_one(
+                {"_id": session_id},
+                {"$set": {"context_summary": {"lines": lines, "covered_until": covered_until}}}
+            )
+
+        older = [line["text"] for line in lines if line["at"] < before]
+        return "\n".join(older) if older else None
+
+    async def iter_messages(self, session_id: str, batch_size: int = 500) -> AsyncIterator[dict]:
+        """Stream raw message documents of a session in chronological order"""
+        if await self._is_archived(session_id):
+            for message_doc in await self.archiver.load_messages(session_id):
+                yield message_doc
+            return
+
+        cursor = self.messages_collection.find({"session_id": session_id}).sort("timestamp", ASCENDING).batch_size(batch_size)
+        async for message_doc in cursor:
+            yield message_doc
+
+    async def iter_sessions(self, query: Optional[dict] = None, batch_size: int = 500) -> AsyncIterator[dict]:
+        """Stream raw session documents, oldest first"""
+        cursor = self.sessions_collection.find(query or {}).sort("created_at", ASCENDING).batch_size(batch_size)
+        async for session_doc in cursor:
+            yield session_doc
 
     async def delete_session(self, session_id: str) -> bool:
         """Delete a conversation session and all its messages"""
         # Delete all messages first
         await self.messages_collection.delete_many({"session_id": session_id})
         
+        await self.archiver.delete_archive(session_id)
+        
         # Delete session
-        result = await self.sessions_collection.delete_one({"_id": session_id})
-        return result.deleted_count > 0
-
-    async def get_recent_sessions(self, limit: int = 10) -> List[ConversationSession]:
-        """Get recent conversation sessions"""
-        cursor = self.sessions_collection.find().sort("updated_at", DESCENDING).limit(limit)
-        sessions = []
-        async for session_doc in cursor:
-            sessions.append(ConversationSession(**session_doc))
-        return sessions
+        session_doc = await self.sessions_collection.find_one_and_delete({"_id": session_id})
+        self._invalidate_session(session_id)
+        if not session_doc:
+            return False
+        await self.rollups.session_deleted(session_doc)
+        await self.events.publish(session_id, "deleted", {"session_id": session_id})
+        return True
 
     async def tag_session(self, session_id: str, tags: List[str]) -> bool:
         """Add tags to a conversation session"""
@@ -198,17 +706,172 @@ class ConversationCRUD:
                 "$set": {"updated_at": datetime.utcnow()}
             }
         )
+        self._invalidate_session(session_id)
+        if result.modified_count > 0:
+            await self.events.publish(session_id, "session", {"session_id": session_id, "tags_added": tags})
         return result.modified_count > 0
 
     async def categorize_session(self, session_id: str, category: ConversationCategory) -> bool:
         """Categorize a conversation session"""
-        result = await self.sessions_collection.update_one(
-            {"_id": session_id},
-            {
-                "$set": {
-                    "category": category,
-                    "updated_at": datetime.utcnow()
-                }
-            }
+        return await self._set_session_fields(session_id, {"category": category})
+
+    # Bulk operations
+    @staticmethod
+    def _filter_query(session_filter: Optional[SessionFilter]) -> dict:
+        """Build a MongoDB query from a session filter"""
+        query = {}
+        if not session_filter:
+            return query
+        if session_filter.user_id:
+            query["user_id"] = session_filter.user_id
+        if session_filter.user_email:
+            query["user_email"] = session_filter.user_email
+        if session_filter.status:
+            query["status"] = session_filter.status
+        if session_filter.category:
+            query["category"] = session_filter.category
+        if session_filter.tags:
+            query["tags"] = {"$in": session_filter.tags}
+        if session_filter.updated_before or session_filter.updated_after:
+            query["updated_at"] = {}
+            if session_filter.updated_before:
+                query["updated_at"]["$lt"] = session_filter.updated_before
+            if session_filter.updated_after:
+                query["updated_at"]["$gte"] = session_filter.updated_after
+        return query
+
+    @classmethod
+    def selection_error(cls, selection: BulkSessionSelection) -> Optional[str]:
+        """Why a bulk selection must be rejected, or None.
+
+        An empty filter would select every session, so a selection needs a
+        non-empty ID list or a filter with at least one condition.
+        """
+        if selection.session_ids is None and selection.filter is None:
+            return "Provide session_ids or a filter"
+        if selection.session_ids is not None and not selection.session_ids:
+            return "session_ids must not be empty"
+        if selection.session_ids is None and not cls._filter_query(selection.filter):
+            return "filter must set at least one condition"
+        return None
+
+    def _selection_queries(self, selection: BulkSessionSelection) -> List[dict]:
+        """Split a selection into queries, chunking explicit session IDs"""
+        error = self.selection_error(selection)
+        if error:
+            raise ValueError(error)
+        base = self._filter_query(selection.filter)
+        if selection.session_ids is None:
+            return [base]
+        ids = list(dict.fromkeys(selection.session_ids))
+        return [
+            {**base, "_id": {"$in": ids[i:i + BULK_ID_CHUNK]}}
+            for i in range(0, len(ids), BULK_ID_CHUNK)
+        ]
+
+    def _invalidate_selection(self, selection: BulkSessionSelection):
+        """Drop cached copies of every session a bulk write may have touched"""
+        if selection.session_ids is None:
+            self._request_sessions.clear()
+            self.cache.clear()
+            return
+        for session_id in selection.session_ids:
+            self._invalidate_session(session_id)
+
+    async def bulk_update_sessions(self, bulk_update: BulkSessionUpdate) -> tuple:
+        """Tag, categorize and/or close many sessions in one unordered bulk_write.
+
+        Returns (matched count, modified count).
+        """
+        fields = {}
+        if bulk_update.category:
+            fields["category"] = bulk_update.category
+        if bulk_update.close:
+            fields["status"] = ConversationStatus.CLOSED
+        if not fields and not bulk_update.add_tags:
+            return 0, 0
+
+        update = {"$set": {**fields, "updated_at": datetime.utcnow()}}
+        if bulk_update.add_tags:
+            update["$addToSet"] = {"tags": {"$each": bulk_update.add_tags}}
+
+        queries = self._selection_queries(bulk_update)
+
+        # Pre-images for the rollups, only needed when buckets can change
+        befores = []
+        if fields:
+            for query in queries:
+                async for session_doc in self.sessions_collection.find(
+                    query, {"status": 1, "category": 1}
+                ).batch_size(BULK_ID_CHUNK):
+                    befores.append(session_doc)
+
+        result = await self.sessions_collection.bulk_write(
+            [UpdateMany(query, update) for query in queries], ordered=False
         )
-        return result.modified_count > 0
+        self._invalidate_selection(bulk_update)
+        if befores:
+            await self.rollups.sessions_changed(befores, fields)
+        return result.matched_count, result.modified_count
+
+    async def bulk_delete_sessions(self, selection: BulkSessionSelection) -> tuple:
+        """Delete many sessions in one unordered bulk_write.
+
+        Returns (deleted count, deleted session IDs); their messages still need
+        to be removed with cascade_delete_messages.
+        """
+        queries = self._selection_queries(selection)
+        session_docs = []
+        for query in queries:
+            async for session_doc in self.sessions_collection.find(
+                query, {"status": 1, "category": 1, "message_count": 1, "sender_counts": 1, "user_id": 1, "user_email": 1}
+            ).batch_size(BULK_ID_CHUNK):
+                session_docs.append(session_doc)
+        if not session_docs:
+            return 0, []
+
+        session_ids = [session_doc["_id"] for session_doc in session_docs]
+        result = await self.sessions_collection.bulk_write(
+            [DeleteMany({"_id": {"$in": session_ids[i:i + BULK_ID_CHUNK]}})
+             for i in range(0, len(session_ids), BULK_ID_CHUNK)],
+            ordered=False
+        )
+        for session_id in session_ids:
+            self._invalidate_session(session_id)
+        await self.rollups.sessions_deleted(session_docs)
+        return result.deleted_count, session_ids
+
+    async def delete_session_messages(self, session_ids: List[str], chunk_size: int = CASCADE_DELETE_CHUNK) -> int:
+        """Delete the messages and archives of sessions in small _id batches.
+
+        Keeping each delete_many short means a large cascade never stalls other
+        writers. Returns the number of messages deleted.
+        """
+        messages_deleted = 0
+        while True:
+            cursor = self.messages_collection.find(
+                {"session_id": {"$in": session_ids}}, {"_id": 1}
+            ).limit(chunk_size)
+            message_ids = [message_doc["_id"] async for message_doc in cursor]
+            if not message_ids:
+                break
+            result = await self.messages_collection.delete_many({"_id": {"$in": message_ids}})
+            messages_deleted += result.deleted_count
+        await self.archiver.archives_collection.delete_many({"_id": {"$in": session_ids}})
+        return messages_deleted
+
+    async def cascade_delete_messages(self, session_ids: List[str], jobs=None, job_id: Optional[str] = None):
+        """Delete the messages of deleted sessions, reporting progress to the job tracker if given"""
+        try:
+            for i in range(0, len(session_ids), BULK_ID_CHUNK):
+                chunk = session_ids[i:i + BULK_ID_CHUNK]
+                messages_deleted = await self.delete_session_messages(chunk)
+                if jobs and job_id:
+                    await jobs.report(job_id, processed=len(chunk), messages_deleted=messages_deleted)
+            if jobs and job_id:
+                await jobs.finish(job_id)
+        except Exception as e:
+            if jobs and job_id:
+                await jobs.finish(job_id, error=str(e))
+            else:
+                raise
@@ -0,0 +1,133 @@
+import asyncio
+import json
+import logging
+import os
+from collections import defaultdict
+from typing import Dict, Set, Any, Optional
+
+from .serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+# Broker settings - you can set these in environment variables
+EVENT_BROKER_URL = os.getenv("EVENT_BROKER_URL", "")  # e.g. redis://localhost:6379/0
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "100"))
+EVENT_CHANNEL_PREFIX = "conversations:"
+EVENT_BROKER_RECONNECT_SECONDS = float(os.getenv("EVENT_BROKER_RECONNECT_SECONDS", "1"))
+EVENT_BROKER_MAX_RECONNECT_SECONDS = float(os.getenv("EVENT_BROKER_MAX_RECONNECT_SECONDS", "30"))
+
+class InProcessBroker:
+    """Per-session pub/sub for conversation events within one worker process.
+
+    Each subscriber gets its own bounded queue; when a slow subscriber's queue
+    is full the oldest event is dropped rather than blocking publishers.
+    """
+
+    def __init__(self, queue_size: int = EVENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+
+    def subscribe(self, session_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[session_id].add(queue)
+        return queue
+
+    def unsubscribe(self, session_id: str, queue: asyncio.Queue) -> None:
+        subscribers = self._subscribers.get(session_id)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[session_id]
+
+    def subscriber_count(self, session_id: Optional[str] = None) -> int:
+        if session_id:
+            return len(self._subscribers.get(session_id, ()))
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def deliver(self, session_id: str, event: Dict[str, Any]) -> None:
+        """Hand an event to this process's subscribers of a session"""
+        for queue in list(self._subscribers.get(session_id, ())):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    async def publish(self, session_id: str, event_type: str, data: Dict[str, Any]) -> None:
+        """Publish an event to every subscriber of a session"""
+        if self._subscribers.get(session_id):
+            # Round-trip through JSON so subscribers never share mutable state
+            self.deliver(session_id, {"type": event_type, "data": json.loads(dumps(data))})
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+class RedisBroker(InProcessBroker):
+    """Cross-worker broker: events are published to Redis and fanned out locally"""
+
+    def __init__(self, url: str, queue_size: int = EVENT_QUEUE_SIZE):
+        super().__init__(queue_size)
+        import redis.asyncio as redis
+        self.redis = redis.from_url(url)
+        self._listener: Optional[asyncio.Task] = None
+
+    async def publish(self, session_id: str, event_type: str, data: Dict[str, Any]) -> None:
+        payload = dumps({"session_id": session_id, "type": event_type, "data": data})
+        try:
+            await self.redis.publish(f"{EVENT_CHANNEL_PREFIX}{session_id}", payload)
+        except Exception as e:
+            logger.error(f"Failed to publish conversation event: {e}")
+
+    async def _listen(self) -> None:
+        """Fan out Redis events, resubscribing with exponential backoff when the connection drops.
+
+        Events published while the connection is down are not replayed.
+        """
+        delay = EVENT_BROKER_RECONNECT_SECONDS
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.psubscribe(f"{EVENT_CHANNEL_PREFIX}*")
+                delay = EVENT_BROKER_RECONNECT_SECONDS
+                async for message in pubsub.listen():
+                    if message.get("type") != "pmessage":
+                        continue
+                    try:
+                        event = json.loads(message["data"])
+                        session_id = event.pop("session_id")
+                        self.deliver(session_id, event)
+                    except Exception as e:
+                        logger.error(f"Invalid conversation event: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Event broker connection lost, reconnecting in {delay:.1f}s: {e}")
+            finally:
+                try:
+                    await pubsub.reset()
+                except Exception:
+                    pass
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, EVENT_BROKER_MAX_RECONNECT_SECONDS)
+
+    async def start(self) -> None:
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener:
+            self._listener.cancel()
+        await self.redis.close()
+
+def create_broker() -> InProcessBroker:
+    """Create the configured broker, falling back to the in-process one"""
+    if EVENT_BROKER_URL.startswith(("redis://", "rediss://")):
+        try:
+            return RedisBroker(EVENT_BROKER_URL)
+        except ImportError:
+            logger.warning("redis package not installed, using in-process event broker")
+    return InProcessBroker()
+
+# Shared broker instance
+event_broker = create_broker()
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Dict
 from pydantic import BaseModel, Field
 from enum import Enum
 
@@ -30,6 +30,13 @@ class ConversationSession(BaseModel):
     message_count: int = 0
     tags: List[str] = Field(default_factory=list)
     metadata: dict = Field(default_factory=dict)
+    # Denormalized preview, maintained by add_message for the conversation sidebar
+    last_message_preview: Optional[str] = None
+    last_message_sender: Optional[MessageSender] = None
+    last_message_at: Optional[datetime] = None
+    sender_counts: Dict[str, int] = Field(default_factory=dict)
+    # Set once the archiver has packed the messages into cold storage
+    archived: bool = False
 
     class Config:
         populate_by_name = True
@@ -67,6 +74,7 @@ class MessageCreate(BaseModel):
     content: str
     sender: MessageSender = MessageSender.USER
     metadata: dict = Field(default_factory=dict)
+    idempotency_key: Optional[str] = Field(None, max_length=200)  # Retries with the same key return the original message
 
 class ConversationSessionResponse(BaseModel):
     session_id: str
@@ -81,6 +89,20 @@ class ConversationSessionResponse(BaseModel):
     tags: List[str]
     metadata: dict
 
+class ConversationSessionPreview(BaseModel):
+    session_id: str
+    title: Optional[str]
+    status: ConversationStatus
+    category: ConversationCategory
+    created_at: datetime
+    updated_at: datetime
+    message_count: int
+    tags: List[str] = []
+    last_message_preview: Optional[str] = None
+    last_message_sender: Optional[MessageSender] = None
+    last_message_at: Optional[datetime] = None
+    sender_counts: Dict[str, int] = {}
+
 class ChatMessageResponse(BaseModel):
     message_id: str
     session_id: str
@@ -93,3 +115,57 @@ class ConversationHistoryResponse(BaseModel):
     session: ConversationSessionResponse
     messages: List[ChatMessageResponse]
     total_messages: int
+
+class ContextMessage(BaseModel):
+    sender: MessageSender
+    content: str
+
+class ConversationContextResponse(BaseModel):
+    session_id: str
+    messages: List[ContextMessage]
+    returned_messages: int
+    total_messages: int
+    truncated: bool
+    summary: Optional[str] = None
+
+class ConversationSearchResult(BaseModel):
+    session_id: str
+    title: Optional[str]
+    user_id: Optional[str]
+    user_email: Optional[str]
+    status: ConversationStatus
+    category: ConversationCategory
+    updated_at: datetime
+    score: float
+    matched_messages: int
+    title_match: bool
+    snippets: List[str]
+
+class ConversationStatsResponse(BaseModel):
+    totals: dict
+    daily: List[dict]
+    user: Optional[dict] = None
+
+# Bulk operation models
+class SessionFilter(BaseModel):
+    user_id: Optional[str] = None
+    user_email: Optional[str] = None
+    status: Optional[ConversationStatus] = None
+    category: Optional[ConversationCategory] = None
+    tags: Optional[List[str]] = None  # Sessions having any of these tags
+    updated_before: Optional[datetime] = None
+    updated_after: Optional[datetime] = None
+
+class BulkSessionSelection(BaseModel):
+    session_ids: Optional[List[str]] = None
+    filter: Optional[SessionFilter] = None
+
+class BulkSessionUpdate(BulkSessionSelection):
+    add_tags: Optional[List[str]] = None
+    category: Optional[ConversationCategory] = None
+    close: bool = False
+
+class BulkOperationResponse(BaseModel):
+    matched_count: int
+    modified_count: int
+    job_id: Optional[str] = None
@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
+
+from .models import ConversationStatus, BulkSessionSelection
+
+logger = logging.getLogger(__name__)
+
+# Retention settings - you can set these in environment variables (0 disables a policy)
+RETENTION_GUEST_CLOSED_DAYS = int(os.getenv("RETENTION_GUEST_CLOSED_DAYS", "0"))
+RETENTION_CATEGORY_DAYS = os.getenv("RETENTION_CATEGORY_DAYS", "")  # e.g. "resolved=90,general=30"
+RETENTION_TTL_GRACE_DAYS = int(os.getenv("RETENTION_TTL_GRACE_DAYS", "7"))
+RETENTION_INTERVAL_SECONDS = int(os.getenv("RETENTION_INTERVAL_SECONDS", "0"))  # 0 disables the loop
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "200"))
+RETENTION_PAUSE_SECONDS = float(os.getenv("RETENTION_PAUSE_SECONDS", "0.1"))
+
+GUEST_TTL_INDEX = "guest_closed_ttl"
+# Closed sessions of guests, who are identified by user_email only
+GUEST_CLOSED_FILTER = {
+    "status": ConversationStatus.CLOSED.value,
+    "user_id": {"$type": "null"},
+    "user_email": {"$type": "string"}
+}
+GUEST_CLOSED_QUERY = {
+    "status": ConversationStatus.CLOSED.value,
+    "user_id": None,
+    "user_email": {"$ne": None}
+}
+
+def parse_category_days(value: str) -> Dict[str, int]:
+    """Parse "category=days,..." into a mapping, skipping malformed entries"""
+    policies = {}
+    for item in value.split(","):
+        category, _, days = item.partition("=")
+        if category.strip() and days.strip().isdigit() and int(days) > 0:
+            policies[category.strip()] = int(days)
+    return policies
+
+class RetentionManager:
+    """Expires conversations according to the configured retention policies.
+
+    The retention job deletes messages first, in small chunks, and then the
+    sessions themselves. While the job runs periodically, a partial TTL index on
+    closed guest sessions acts as a backstop; its grace period gives the job
+    time to cascade to messages before MongoDB removes the sessions on its own.
+    """
+
+    def __init__(self, conversation_crud, guest_closed_days: int = RETENTION_GUEST_CLOSED_DAYS,
+                 category_days: Optional[Dict[str, int]] = None, interval: int = RETENTION_INTERVAL_SECONDS):
+        self.crud = conversation_crud
+        self.guest_closed_days = guest_closed_days
+        self.interval = interval
+        self.category_days = category_days if category_days is not None else parse_category_days(RETENTION_CATEGORY_DAYS)
+
+    def policies(self) -> List[Dict[str, Any]]:
+        """Describe the active retention policies with their session queries"""
+        now = datetime.utcnow()
+        policies = []
+        if self.guest_closed_days > 0:
+            policies.append({
+                "name": "guest_closed",
+                "days": self.guest_closed_days,
+                "query": {**GUEST_CLOSED_QUERY, "updated_at": {"$lt": now - timedelta(days=self.guest_closed_days)}}
+            })
+        for category, days in self.category_days.items():
+            policies.append({
+                "name": f"category:{category}",
+                "days": days,
+                "query": {"category": category, "updated_at": {"$lt": now - timedelta(days=days)}}
+            })
+        return policies
+
+    async def create_ttl_index(self) -> None:
+        """Create or update the TTL index on closed guest sessions.
+
+        The index only backs up the periodic job: on its own it would delete
+        sessions without their messages, archives or rollup adjustments, so it
+        is dropped whenever the job is disabled.
+        """
+        if self.guest_closed_days <= 0 or self.interval <= 0:
+            try:
+                await self.crud.sessions_collection.drop_index(GUEST_TTL_INDEX)
+            except OperationFailure:
+                pass  # Not there
+            return
+        expire_after = (self.guest_closed_days + RETENTION_TTL_GRACE_DAYS) * 86400
+        try:
+            await self.crud.sessions_collection.create_index(
+                [("updated_at", ASCENDING)],
+                name=GUEST_TTL_INDEX,
+                expireAfterSeconds=expire_after,
+                partialFilterExpression=GUEST_CLOSED_FILTER
+            )
+        except OperationFailure:
+            # The index exists with a different expiry
+            await self.crud.db.command(
+                "collMod", self.crud.sessions_collection.name,
+                index={"name": GUEST_TTL_INDEX, "expireAfterSeconds": expire_after}
+            )
+
+    async def run_once(self, jobs=None, job_id: Optional[str] = None) -> Dict[str, Any]:
+        """Delete every expired session and its messages, policy by policy"""
+        report = {"policies": {}, "sessions_deleted": 0, "messages_deleted": 0}
+        try:
+            for policy in self.policies():
+                sessions_deleted = 0
+                messages_deleted = 0
+                while True:
+                    cursor = self.crud.sessions_collection.find(policy["query"], {"_id": 1}).limit(RETENTION_BATCH_SIZE)
+                    session_ids = [session_doc["_id"] async for session_doc in cursor]
+                    if not session_ids:
+                        break
+
+                    # Messages first, so an interrupted run leaves sessions to retry
+                    deleted_messages = await self.crud.delete_session_messages(session_ids)
+                    deleted_sessions, _ = await self.crud.bulk_delete_sessions(
+                        BulkSessionSelection(session_ids=session_ids)
+                    )
+                    sessions_deleted += deleted_sessions
+                    messages_deleted += deleted_messages
+                    if not deleted_sessions:
+                        break
+                    if jobs and job_id:
+                        await jobs.report(
+                            job_id, processed=deleted_sessions,
+                            sessions_deleted=deleted_sessions, messages_deleted=deleted_messages
+                        )
+                    # Give other writers room between batches
+                    await asyncio.sleep(RETENTION_PAUSE_SECONDS)
+
+                report["policies"][policy["name"]] = {
+                    "sessions_deleted": sessions_deleted,
+                    "messages_deleted": messages_deleted
+                }
+                report["sessions_deleted"] += sessions_deleted
+                report["messages_deleted"] += messages_deleted
+
+            if jobs and job_id:
+                await jobs.finish(job_id, result=report)
+        except Exception as e:
+            if jobs and job_id:
+                await jobs.finish(job_id, error=str(e))
+            else:
+                raise
+        return report
+
+    async def run_periodically(self, interval: Optional[int] = None) -> None:
+        """Apply the retention policies in the background every ``interval`` seconds"""
+        interval = interval or self.interval
+        while True:
+            try:
+                report = await self.run_once()
+                if report["sessions_deleted"]:
+                    logger.info(f"Expired conversations: {report}")
+            except Exception as e:
+                logger.error(f"Conversation retention failed: {e}")
+            await asyncio.sleep(interval)
@@ -0,0 +1,230 @@
+import logging
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Iterable
+
+from pymongo.errors import DuplicateKeyError
+
+from counter_store import CounterStore, TOTALS_ID, day_id
+
+logger = logging.getLogger(__name__)
+
+def _value(v) -> str:
+    """Get the plain string value of an enum or string"""
+    return getattr(v, "value", v)
+
+def _user_id(session_doc: Dict[str, Any]) -> Optional[str]:
+    owner = session_doc.get("user_id") or session_doc.get("user_email")
+    return f"user:{owner}" if owner else None
+
+def _merge(target: Dict[str, Dict[str, int]], increments: Dict[str, Dict[str, int]]) -> None:
+    """Add one set of per-document increments into another"""
+    for rollup_id, inc in increments.items():
+        if not rollup_id:
+            continue
+        bucket = target.setdefault(rollup_id, {})
+        for field, amount in inc.items():
+            bucket[field] = bucket.get(field, 0) + amount
+
+class ConversationRollups(CounterStore):
+    """Materialized conversation counters, updated incrementally with $inc upserts.
+
+    Documents in ``conversations_rollups``:
+      - ``totals``: current counts by status and category plus all-time totals
+      - ``day:YYYY-MM-DD``: sessions created/closed and messages added that day
+      - ``user:<user_id or email>``: sessions and messages per user
+    """
+
+    label = "conversation rollups"
+
+    def __init__(self, database):
+        super().__init__(database["conversations_rollups"])
+
+    async def seed(self, sessions_collection, messages_collection) -> bool:
+        """Build the rollups from existing sessions and messages on first run.
+
+        Seeding is claimed by creating the totals document, so it runs once.
+        Only data from before the claim is aggregated; anything written after
+        it is counted by the live updates. Daily active users are not
+        reconstructed, and messages of archived sessions only count in the
+        totals and per-user rollups.
+        Returns True if this call seeded the rollups.
+        """
+        cutoff = datetime.utcnow()
+        try:
+            claim = await self.collection.update_one(
+                {"_id": TOTALS_ID}, {"$setOnInsert": {"seeded_at": cutoff}}, upsert=True
+            )
+        except DuplicateKeyError:
+            return False
+        if not claim.upserted_id:
+            return False
+
+        increments: Dict[str, Dict[str, int]] = {}
+        day = {"$concat": ["day:", {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}}]}
+        async for group in sessions_collection.aggregate([
+            {"$match": {"created_at": {"$lt": cutoff}}},
+            {"$group": {
+                "_id": {"status": "$status", "category": "$category", "day": day},
+                "sessions": {"$sum": 1},
+                "messages": {"$sum": {"$ifNull": ["$message_count", 0]}}
+            }}
+        ]):
+            key = group["_id"]
+            _merge(increments, {
+                TOTALS_ID: {
+                    "sessions": group["sessions"],
+                    "messages": group["messages"],
+                    f"by_status.{key['status']}": group["sessions"],
+                    f"by_category.{key['category']}": group["sessions"]
+                },
+                key["day"]: {"sessions_created": group["sessions"], f"by_category.{key['category']}": group["sessions"]}
+            })
+
+        async for group in sessions_collection.aggregate([
+            {"$match": {"created_at": {"$lt": cutoff}}},
+            {"$project": {"counts": {"$objectToArray": {"$ifNull": ["$sender_counts", {}]}}}},
+            {"$unwind": "$counts"},
+            {"$group": {"_id": "$counts.k", "messages": {"$sum": "$counts.v"}}}
+        ]):
+            _merge(increments, {TOTALS_ID: {f"by_sender.{group['_id']}": group["messages"]}})
+
+        async for group in sessions_collection.aggregate([
+            {"$match": {"created_at": {"$lt": cutoff}}},
+            {"$group": {
+                "_id": {"$ifNull": ["$user_id", "$user_email"]},
+                "sessions": {"$sum": 1},
+                "messages": {"$sum": {"$ifNull": ["$message_count", 0]}}
+            }}
+        ]):
+            if group["_id"]:
+                _merge(increments, {f"user:{group['_id']}": {"sessions": group["sessions"], "messages": group["messages"]}})
+
+        async for group in messages_collection.aggregate([
+            {"$match": {"timestamp": {"$lt": cutoff}}},
+            {"$group": {
+                "_id": {"sender": "$sender", "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}}},
+                "messages": {"$sum": 1}
+            }}
+        ]):
+            key = group["_id"]
+            _merge(increments, {f"day:{key['day']}": {"messages": group["messages"], f"by_sender.{key['sender']}": group["messages"]}})
+
+        await self._apply(increments)
+        return True
+
+    async def session_created(self, session_doc: Dict[str, Any]) -> None:
+        status = _value(session_doc.get("status"))
+        category = _value(session_doc.get("category"))
+        await self._apply({
+            TOTALS_ID: {"sessions": 1, f"by_status.{status}": 1, f"by_category.{category}": 1},
+            day_id(): {"sessions_created": 1, f"by_category.{category}": 1},
+            _user_id(session_doc): {"sessions": 1}
+        })
+
+    async def message_added(self, session_doc: Dict[str, Any], sender) -> None:
+        sender = _value(sender)
+        day = {"messages": 1, f"by_sender.{sender}": 1}
+        if sender == "user" and await self._mark_active(_user_id(session_doc)):
+            day["active_users"] = 1
+        await self._apply({
+            TOTALS_ID: {"messages": 1, f"by_sender.{sender}": 1},
+            day_id(): day,
+            _user_id(session_doc): {"messages": 1}
+        })
+
+    async def _mark_active(self, rollup_id: Optional[str]) -> bool:
+        """Record today's activity on a user rollup; True only for the first message of the day"""
+        if not rollup_id:
+            return False
+        today = day_id()
+        try:
+            result = await self.collection.update_one(
+                {"_id": rollup_id, "last_active_day": {"$ne": today}},
+                {"$set": {"last_active_day": today}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # The rollup exists and was already marked today
+            return False
+        except Exception as e:
+            logger.error(f"Failed to update conversation rollups: {e}")
+            return False
+        return bool(result.modified_count or result.upserted_id)
+
+    async def session_changed(self, before: Dict[str, Any], after: Dict[str, Any]) -> None:
+        """Move a session between status/category buckets"""
+        await self._apply(self._changed_increments(before, after))
+
+    async def sessions_changed(self, befores: Iterable[Dict[str, Any]], fields: Dict[str, Any]) -> None:
+        """Move many sessions between buckets after the same update, in one round-trip"""
+        increments = {}
+        for before in befores:
+            _merge(increments, self._changed_increments(before, {**before, **fields}))
+        await self._apply(increments)
+
+    @staticmethod
+    def _changed_increments(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Dict[str, int]]:
+        totals = {}
+        day = {}
+        old_status, new_status = _value(before.get("status")), _value(after.get("status"))
+        if old_status != new_status:
+            totals[f"by_status.{old_status}"] = -1
+            totals[f"by_status.{new_status}"] = 1
+            day[f"sessions_{new_status}"] = 1
+
+        old_category, new_category = _value(before.get("category")), _value(after.get("category"))
+        if old_category != new_category:
+            totals[f"by_category.{old_category}"] = -1
+            totals[f"by_category.{new_category}"] = 1
+            day[f"categorized.{new_category}"] = 1
+
+        return {TOTALS_ID: totals, day_id(): day}
+
+    async def session_deleted(self, session_doc: Dict[str, Any]) -> None:
+        await self._apply(self._deleted_increments(session_doc))
+
+    async def sessions_deleted(self, session_docs: Iterable[Dict[str, Any]]) -> None:
+        """Remove many deleted sessions from the counters in one round-trip"""
+        increments = {}
+        for session_doc in session_docs:
+            _merge(increments, self._deleted_increments(session_doc))
+        await self._apply(increments)
+
+    @staticmethod
+    def _deleted_increments(session_doc: Dict[str, Any]) -> Dict[str, Dict[str, int]]:
+        message_count = session_doc.get("message_count", 0)
+        totals = {
+            "sessions": -1,
+            "messages": -message_count,
+            f"by_status.{_value(session_doc.get('status'))}": -1,
+            f"by_category.{_value(session_doc.get('category'))}": -1
+        }
+        for sender, count in (session_doc.get("sender_counts") or {}).items():
+            totals[f"by_sender.{sender}"] = -count
+        return {
+            TOTALS_ID: totals,
+            _user_id(session_doc): {"sessions": -1, "messages": -message_count}
+        }
+
+    async def get_stats(self, days: int = 30, user: Optional[str] = None) -> Dict[str, Any]:
+        """Read the totals, the last ``days`` daily rollups and optionally one user's rollup"""
+        ids: List[str] = [TOTALS_ID]
+        if user:
+            ids.append(f"user:{user}")
+
+        docs = {}
+        async for doc in self.collection.find({"_id": {"$in": ids}}):
+            docs[doc["_id"]] = doc
+
+        daily = await self._daily(days)
+
+        totals = docs.get(TOTALS_ID, {})
+        totals.pop("_id", None)
+        totals.pop("updated_at", None)
+        totals.pop("seeded_at", None)
+        user_doc = docs.get(f"user:{user}") if user else None
+        if user_doc:
+            user_doc.pop("_id", None)
+            user_doc.pop("updated_at", None)
+
+        return {"totals": totals, "daily": daily, "user": user_doc}
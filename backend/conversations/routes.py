@@ -1,22 +1,41 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Header, BackgroundTasks, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
 from datetime import datetime
+import asyncio
 
 from .models import (
     ConversationSessionCreate, ConversationSessionUpdate, MessageCreate,
     ConversationSessionResponse, ChatMessageResponse, ConversationHistoryResponse,
-    ConversationCategory, ConversationStatus
+    ConversationCategory, ConversationStatus, ConversationContextResponse,
+    ConversationSearchResult, ConversationSessionPreview,
+    ConversationStatsResponse, BulkSessionSelection, BulkSessionUpdate,
+    BulkOperationResponse
+)
+from .crud import ConversationCRUD, CHARS_PER_TOKEN
+from .cache import session_cache
+from .serialization import json_response, session_response_dict, dumps
+from .events import event_broker
+from .retention import RetentionManager
+from .streaming import (
+    STREAM_BATCH_SIZE, NDJSON_MEDIA_TYPE, SSE_MEDIA_TYPE,
+    session_record, message_record, encode_ndjson, encode_sse, gzip_stream
 )
-from .crud import ConversationCRUD
 from database import get_database
+from jobs import JobTracker
 
 router = APIRouter(prefix="/api/conversations", tags=["Conversations"])
 
+_indexes_created = False
+
 async def get_conversation_crud():
     """Dependency to get conversation CRUD instance"""
+    global _indexes_created
     db = get_database()  # Remove await - get_database() returns db directly
     crud = ConversationCRUD(db)
-    await crud.create_indexes()  # Ensure indexes exist
+    if not _indexes_created:
+        await crud.create_indexes()  # Ensure indexes exist, once per process
+        _indexes_created = True
     return crud
 
 # Session Management Endpoints
@@ -105,6 +124,18 @@ async def close_conversation_session(
     
     return {"message": "Session closed successfully", "session_id": session_id}
 
+@router.post("/sessions/{session_id}/reopen")
+async def reopen_conversation_session(
+    session_id: str,
+    conversation_crud: ConversationCRUD = Depends(get_conversation_crud)
+):
+    """Reopen a closed conversation session"""
+    success = await conversation_crud.reopen_session(session_id)
+    if not success:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    return {"message": "Session reopened successfully", "session_id": session_id}
+
 @router.delete("/sessions/{session_id}")
 async def delete_conversation_session(
     session_id: str,
@@ -117,14 +148,55 @@ async def delete_conversation_session(
     
     return {"message": "Session deleted successfully", "session_id": session_id}
 
+# Bulk Session Operations
+@router.post("/sessions/bulk/update", response_model=BulkOperationResponse)
+async def bulk_update_conversation_sessions(
+    bulk_update: BulkSessionUpdate,
+    conversation_crud: ConversationCRUD = Depends(get_conversation_crud)
+):
+    """Tag, categorize and/or close many sessions selected by ID list or filter"""
+    selection_error = ConversationCRUD.selection_error(bulk_update)
+    if selection_error:
+        raise HTTPException(status_code=400, detail=selection_error)
+    try:
+        matched, modified = await conversation_crud.bulk_update_sessions(bulk_update)
+        return BulkOperationResponse(matched_count=matched, modified_count=modified)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to update sessions: {str(e)}")
+
+@router.post("/sessions/bulk/delete", response_model=BulkOperationResponse)
+async def bulk_delete_conversation_sessions(
+    selection: BulkSessionSelection,
+    background_tasks: BackgroundTasks,
+    conversation_crud: ConversationCRUD = Depends(get_conversation_crud)
+):
+    """Delete many sessions; their messages are removed by a background job"""
+    selection_error = ConversationCRUD.selection_error(selection)
+    if selection_error:
+        raise HTTPException(status_code=400, detail=selection_error)
+    try:
+        deleted, session_ids = await conversation_crud.bulk_delete_sessions(selection)
+        job_id = None
+        if session_ids:
+            jobs = JobTracker(conversation_crud.db)
+            job_id = await jobs.create_job("conversations.cascade_delete", total=len(session_ids))
+            background_tasks.add_task(conversation_crud.cascade_delete_messages, session_ids, jobs, job_id)
+        return BulkOperationResponse(matched_count=deleted, modified_count=deleted, job_id=job_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to delete sessions: {str(e)}")
+
 # Message Management Endpoints
 @router.post("/sessions/{session_id}/messages", response_model=ChatMessageResponse)
 async def add_message_to_session(
     session_id: str,
     message_data: MessageCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     conversation_crud: ConversationCRUD = Depends(get_conversation_crud)
 ):
-    """Add a message to a conversation session"""
+    """Add a message to a conversation session (safe to retry with an Idempotency-Key)"""
+    if idempotency_key and not message_data.idempotency_key:
+        message_data.idempotency_key = idempotency_key
+    
     # Verify session exists
     session = await conversation_crud.get_session(session_id)
     if not session:
@@ -151,18 +223,8 @@ async def get_session_messages(
     conversation_crud: ConversationCRUD = Depends(get_conversation_crud)
 ):
     """Get messages for a conversation session"""
-    messages = await conversation_crud.get_messages(session_id, limit, skip)
-    return [
-        ChatMessageResponse(
-            message_id=msg.message_id,
-            session_id=msg.session_id,
-            sender=msg.sender,
-            content=msg.content,
-            timestamp=msg.timestamp,
-            metadata=msg.metadata
-        )
-        for msg in messages
-    ]
+    messages = await conversation_crud.get_message_documents(session_id, limit, skip)
+    return json_response(messages)
 
 @router.get("/sessions/{session_id}/history", response_model=ConversationHistoryResponse)
 async def get_conversation_history(
@@ -170,40 +232,128 @@ async def get_conversation_history(
     conversation_crud: ConversationCRUD = Depends(get_conversation_crud)
 ):
     """Get full conversation history (session + messages)"""
-    result = await conversation_crud.get_conversation_history(session_id)
-    if not result:
+    session = await conversation_crud.get_session(session_id)
+    if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    session, messages = result
-    
-    return ConversationHistoryResponse(
-        session=ConversationSessionResponse(
-            session_id=session.session_id,
-            user_id=session.user_id,
-            user_email=session.user_email,
-            title=session.title,
-            status=session.status,
-            category=session.category,
-            created_at=session.created_at,
-            updated_at=session.updated_at,
-            message_count=session.message_count,
-            tags=session.tags,
-            metadata=session.metadata
-        ),
-        messages=[
-            ChatMessageResponse(
-                message_id=msg.message_id,
-                session_id=msg.session_id,
-                sender=msg.sender,
-                content=msg.content,
-                timestamp=msg.timestamp,
-                metadata=msg.metadata
-            )
-            for msg in messages
-        ],
-        total_messages=len(messages)
+    messages = await conversation_crud.get_message_documents(session_id)
+    return json_response({
+        "session": session_response_dict(session),
+        "messages": messages,
+        "total_messages": len(messages)
+    })
+
+@router.get("/sessions/{session_id}/history/stream")
+async def stream_conversation_history(
+    session_id: str,
+    format: str = Query("ndjson", pattern="^(ndjson|sse)$"),
+    batch_size: int = Query(STREAM_BATCH_SIZE, ge=1, le=5000),
+    conversation_crud: ConversationCRUD = Depends(get_conversation_crud)
+):
+    """Stream conversation history (session + messages) as NDJSON or server-sent events"""
+    session = await conversation_crud.get_session(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    encode = encode_sse if format == "sse" else encode_ndjson
+
+    async def generate():
+        yield encode("session", session.dict())
+        total = 0
+        async for message_doc in conversation_crud.iter_messages(session_id, batch_size):
+            total += 1
+            yield encode("message", message_record(message_doc))
+        yield encode("end", {"session_id": session_id, "total_messages": total})
+
+    return StreamingResponse(generate(), media_type=SSE_MEDIA_TYPE if format == "sse" else NDJSON_MEDIA_TYPE)
+
+@router.get("/sessions/{session_id}/context", response_model=ConversationContextResponse)
+async def get_conversation_context(
+    session_id: str,
+    last_n: int = Query(10, ge=1, le=100),
+    max_chars: Optional[int] = Query(None, ge=1),
+    max_tokens: Optional[int] = Query(None, ge=1),
+    include_summary: bool = Query(False),
+    conversation_crud: ConversationCRUD = Depends(get_conversation_crud)
+):
+    """Get the newest messages of a session for building LLM context"""
+    session = await conversation_crud.get_session(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    budgets = [b for b in (max_chars, max_tokens * CHARS_PER_TOKEN if max_tokens else None) if b]
+    char_budget = min(budgets) if budgets else None
+
+    messages, oldest_timestamp, truncated = await conversation_crud.get_recent_messages(
+        session_id, last_n, char_budget
     )
 
+    summary = None
+    if include_summary and truncated and oldest_timestamp:
+        summary = await conversation_crud.get_context_summary(session_id, oldest_timestamp)
+
+    return ConversationContextResponse(
+        session_id=session_id,
+        messages=messages,
+        returned_messages=len(messages),
+        total_messages=session.message_count,
+        truncated=truncated,
+        summary=summary
+    )
+
+# Real-time Updates
+EVENT_KEEPALIVE_SECONDS = 25
+
+@router.websocket("/sessions/{session_id}/ws")
+async def conversation_session_websocket(websocket: WebSocket, session_id: str):
+    """Push new messages and session updates to a connected client"""
+    await websocket.accept()
+    queue = event_broker.subscribe(session_id)
+
+    async def receive():
+        # Reading is what notices a closed connection while no events arrive
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
+    async def send():
+        while True:
+            event = await queue.get()
+            await websocket.send_text(dumps(event).decode("utf-8"))
+
+    tasks = [asyncio.create_task(receive()), asyncio.create_task(send())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            try:
+                task.result()
+            except WebSocketDisconnect:
+                pass
+    finally:
+        for task in tasks:
+            task.cancel()
+        event_broker.unsubscribe(session_id, queue)
+
+@router.get("/sessions/{session_id}/events")
+async def conversation_session_events(session_id: str):
+    """Push new messages and session updates as server-sent events"""
+    queue = event_broker.subscribe(session_id)
+
+    async def generate():
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=EVENT_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                yield encode_sse(event["type"], event["data"])
+        finally:
+            event_broker.unsubscribe(session_id, queue)
+
+    return StreamingResponse(generate(), media_type=SSE_MEDIA_TYPE)
+
 # User Session Management
 @router.get("/users/{user_id}/sessions", response_model=List[ConversationSessionResponse])
 async def get_user_sessions(
@@ -213,23 +363,8 @@ async def get_user_sessions(
     conversation_crud: ConversationCRUD = Depends(get_conversation_crud)
 ):
     """Get conversation sessions for a user"""
-    sessions = await conversation_crud.get_user_sessions(user_id=user_id, limit=limit, skip=skip)
-    return [
-        ConversationSessionResponse(
-            session_id=session.session_id,
-            user_id=session.user_id,
-            user_email=session.user_email,
-            title=session.title,
-            status=session.status,
-            category=session.category,
-            created_at=session.created_at,
-            updated_at=session.updated_at,
-            message_count=session.message_count,
-            tags=session.tags,
-            metadata=session.metadata
-        )
-        for session in sessions
-    ]
+    sessions = await conversation_crud.get_session_documents({"user_id": user_id}, "created_at", limit, skip)
+    return json_response(sessions)
 
 @router.get("/users/email/{user_email}/sessions", response_model=List[ConversationSessionResponse])
 async def get_user_sessions_by_email(
@@ -239,24 +374,110 @@ async def get_user_sessions_by_email(
     conversation_crud: ConversationCRUD = Depends(get_conversation_crud)
 ):
     """Get conversation sessions for a user by email"""
-    sessions = await conversation_crud.get_user_sessions(user_email=user_email, limit=limit, skip=skip)
+    sessions = await conversation_crud.get_session_documents({"user_email": user_email}, "created_at", limit, skip)
+    return json_response(sessions)
+
+# Cold storage
+@router.post("/archive/run")
+async def run_conversation_archiver(
+    idle_days: int = Query(30, ge=0, description="Also archive active sessions idle for this many days"),
+    limit: int = Query(100, ge=1, le=5000),
+    conversation_crud: ConversationCRUD = Depends(get_conversation_crud)
+):
+    """Pack the messages of closed or idle sessions into compressed archives"""
+    try:
+        return await conversation_crud.archiver.run_once(idle_days=idle_days, limit=limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to archive conversations: {str(e)}")
+
+# Retention
+@router.get("/retention/policies")
+async def get_retention_policies(
+    conversation_crud: ConversationCRUD = Depends(get_conversation_crud)
+):
+    """Get the active retention policies"""
     return [
-        ConversationSessionResponse(
-            session_id=session.session_id,
-            user_id=session.user_id,
-            user_email=session.user_email,
-            title=session.title,
-            status=session.status,
-            category=session.category,
-            created_at=session.created_at,
-            updated_at=session.updated_at,
-            message_count=session.message_count,
-            tags=session.tags,
-            metadata=session.metadata
-        )
-        for session in sessions
+        {"name": policy["name"], "days": policy["days"]}
+        for policy in RetentionManager(conversation_crud).policies()
     ]
 
+@router.post("/retention/run")
+async def run_conversation_retention(
+    background_tasks: BackgroundTasks,
+    conversation_crud: ConversationCRUD = Depends(get_conversation_crud)
+):
+    """Expire sessions and messages according to the retention policies in the background"""
+    try:
+        retention = RetentionManager(conversation_crud)
+        jobs = JobTracker(conversation_crud.db)
+        job_id = await jobs.create_job(
+            "conversations.retention",
+            params={"policies": [policy["name"] for policy in retention.policies()]}
+        )
+        background_tasks.add_task(retention.run_once, jobs, job_id)
+        return {"message": "Retention job started", "job_id": job_id}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to start retention job: {str(e)}")
+
+# Export
+@router.get("/export")
+async def export_conversations(
+    user_id: Optional[str] = Query(None),
+    status: Optional[ConversationStatus] = Query(None),
+    since: Optional[datetime] = Query(None, description="Only sessions updated at or after this time"),
+    compress: bool = Query(True),
+    batch_size: int = Query(STREAM_BATCH_SIZE, ge=1, le=5000),
+    conversation_crud: ConversationCRUD = Depends(get_conversation_crud)
+):
+    """Stream every matching session and its messages as (gzip-compressed) JSONL"""
+    query = {}
+    if user_id:
+        query["user_id"] = user_id
+    if status:
+        query["status"] = status
+    if since:
+        query["updated_at"] = {"$gte": since}
+
+    async def generate():
+        async for session_doc in conversation_crud.iter_sessions(query, batch_size):
+            session_id = session_doc["_id"]
+            yield encode_ndjson("session", session_record(session_doc))
+            async for message_doc in conversation_crud.iter_messages(session_id, batch_size):
+                yield encode_ndjson("message", message_record(message_doc))
+
+    if compress:
+        return StreamingResponse(
+            gzip_stream(generate()),
+            media_type="application/gzip",
+            headers={"Content-Disposition": "attachment; filename=conversations.jsonl.gz"}
+        )
+    return StreamingResponse(generate(), media_type=NDJSON_MEDIA_TYPE)
+
+@router.get("/sidebar", response_model=List[ConversationSessionPreview])
+async def get_sidebar_sessions(
+    user_id: Optional[str] = Query(None),
+    user_email: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    skip: int = Query(0, ge=0),
+    conversation_crud: ConversationCRUD = Depends(get_conversation_crud)
+):
+    """Get session previews (last message, counts) for the conversation sidebar"""
+    return await conversation_crud.get_session_previews(
+        user_id=user_id, user_email=user_email, limit=limit, skip=skip
+    )
+
+@router.get("/stats", response_model=ConversationStatsResponse)
+async def get_conversation_stats(
+    days: int = Query(30, ge=1, le=366),
+    user: Optional[str] = Query(None, description="User ID or email to include per-user counts for"),
+    conversation_crud: ConversationCRUD = Depends(get_conversation_crud)
+):
+    """Get conversation counts by status, category, sender and day from the rollups"""
+    try:
+        return await conversation_crud.rollups.get_stats(days=days, user=user)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch conversation stats: {str(e)}")
+
 # Search and Organization
 @router.get("/search", response_model=List[ConversationSessionResponse])
 async def search_conversations(
@@ -265,23 +486,29 @@ async def search_conversations(
     conversation_crud: ConversationCRUD = Depends(get_conversation_crud)
 ):
     """Search conversation sessions by title or tags"""
-    sessions = await conversation_crud.search_sessions(q, limit)
-    return [
-        ConversationSessionResponse(
-            session_id=session.session_id,
-            user_id=session.user_id,
-            user_email=session.user_email,
-            title=session.title,
-            status=session.status,
-            category=session.category,
-            created_at=session.created_at,
-            updated_at=session.updated_at,
-            message_count=session.message_count,
-            tags=session.tags,
-            metadata=session.metadata
-        )
-        for session in sessions
-    ]
+    sessions = await conversation_crud.get_session_documents(
+        conversation_crud.search_sessions_query(q), "created_at", limit
+    )
+    return json_response(sessions)
+
+@router.get("/search/messages", response_model=List[ConversationSearchResult])
+async def search_conversation_messages(
+    q: str = Query(..., min_length=1, description="Full-text search query"),
+    user_id: Optional[str] = Query(None),
+    user_email: Optional[str] = Query(None),
+    category: Optional[ConversationCategory] = Query(None),
+    status: Optional[ConversationStatus] = Query(None),
+    start_date: Optional[datetime] = Query(None),
+    end_date: Optional[datetime] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    conversation_crud: ConversationCRUD = Depends(get_conversation_crud)
+):
+    """Full-text search over message content and session titles, ranked and grouped by session"""
+    results = await conversation_crud.search_messages(
+        q, user_id=user_id, user_email=user_email, category=category, status=status,
+        start_date=start_date, end_date=end_date, limit=limit
+    )
+    return [ConversationSearchResult(**result) for result in results]
 
 @router.post("/sessions/{session_id}/tag")
 async def tag_conversation_session(
@@ -315,20 +542,10 @@ async def get_recent_conversations(
     conversation_crud: ConversationCRUD = Depends(get_conversation_crud)
 ):
     """Get recent conversation sessions"""
-    sessions = await conversation_crud.get_recent_sessions(limit)
-    return [
-        ConversationSessionResponse(
-            session_id=session.session_id,
-            user_id=session.user_id,
-            user_email=session.user_email,
-            title=session.title,
-            status=session.status,
-            category=session.category,
-            created_at=session.created_at,
-            updated_at=session.updated_at,
-            message_count=session.message_count,
-            tags=session.tags,
-            metadata=session.metadata
-        )
-        for session in sessions
-    ]
+    sessions = await conversation_crud.get_session_documents({}, "updated_at", limit)
+    return json_response(sessions)
+
+@router.get("/metrics/cache")
+async def get_session_cache_metrics():
+    """Get session cache size and hit ratios"""
+    return session_cache.stats()
@@ -0,0 +1,79 @@
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, List
+
+from fastapi import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from .models import ConversationSession
+
+# Fields of ConversationSessionResponse / ChatMessageResponse
+SESSION_RESPONSE_FIELDS = [
+    "session_id", "user_id", "user_email", "title", "status", "category",
+    "created_at", "updated_at", "message_count", "tags", "metadata"
+]
+MESSAGE_RESPONSE_FIELDS = ["message_id", "session_id", "sender", "content", "timestamp", "metadata"]
+
+# Projections that shape documents like the response models inside MongoDB,
+# renaming _id and filling defaults so no intermediate models are needed
+SESSION_RESPONSE_PROJECTION = {
+    "_id": 0,
+    "session_id": "$_id",
+    "user_id": {"$ifNull": ["$user_id", None]},
+    "user_email": {"$ifNull": ["$user_email", None]},
+    "title": {"$ifNull": ["$title", None]},
+    "status": 1,
+    "category": 1,
+    "created_at": 1,
+    "updated_at": 1,
+    "message_count": 1,
+    "tags": {"$ifNull": ["$tags", []]},
+    "metadata": {"$ifNull": ["$metadata", {}]}
+}
+MESSAGE_RESPONSE_PROJECTION = {
+    "_id": 0,
+    "message_id": "$_id",
+    "session_id": 1,
+    "sender": 1,
+    "content": 1,
+    "timestamp": 1,
+    "metadata": {"$ifNull": ["$metadata", {}]}
+}
+
+def _json_default(value):
+    """Encode values the json module does not know about"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return str(value)
+
+def dumps(content: Any) -> bytes:
+    """Serialize to JSON bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_json_default)
+    return json.dumps(content, default=_json_default, separators=(",", ":")).encode("utf-8")
+
+def json_response(content: Any, status_code: int = 200) -> Response:
+    """Build a JSON response directly, skipping response_model validation"""
+    return Response(content=dumps(content), status_code=status_code, media_type="application/json")
+
+def session_response_dict(session: ConversationSession) -> Dict[str, Any]:
+    """Shape a session model like ConversationSessionResponse"""
+    return session.model_dump(include=set(SESSION_RESPONSE_FIELDS))
+
+def message_response_dict(message_doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Shape a raw message document (e.g. from an archive) like ChatMessageResponse"""
+    return {
+        "message_id": message_doc.get("_id"),
+        "session_id": message_doc.get("session_id"),
+        "sender": message_doc.get("sender"),
+        "content": message_doc.get("content"),
+        "timestamp": message_doc.get("timestamp"),
+        "metadata": message_doc.get("metadata") or {}
+    }
@@ -0,0 +1,43 @@
+import zlib
+from typing import AsyncIterator, Dict, Any
+
+from .serialization import dumps
+
+# Streaming settings
+STREAM_BATCH_SIZE = 500
+GZIP_FLUSH_BYTES = 64 * 1024
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+SSE_MEDIA_TYPE = "text/event-stream"
+
+def session_record(session_doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Rename a raw session document's _id to match the API models"""
+    session_doc["session_id"] = session_doc.pop("_id", None)
+    return session_doc
+
+def message_record(message_doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Rename a raw message document's _id to match the API models"""
+    message_doc["message_id"] = message_doc.pop("_id", None)
+    return message_doc
+
+def encode_ndjson(record_type: str, record: Dict[str, Any]) -> bytes:
+    """Encode one record as an NDJSON line"""
+    return dumps({"type": record_type, "data": record}) + b"\n"
+
+def encode_sse(record_type: str, record: Dict[str, Any]) -> bytes:
+    """Encode one record as a server-sent event"""
+    return b"event: " + record_type.encode("utf-8") + b"\ndata: " + dumps(record) + b"\n\n"
+
+async def gzip_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Gzip-compress a byte stream incrementally"""
+    compressor = zlib.compressobj(wbits=31)  # 31 = gzip container
+    pending = 0
+    async for chunk in chunks:
+        pending += len(chunk)
+        compressed = compressor.compress(chunk)
+        if pending >= GZIP_FLUSH_BYTES:
+            compressed += compressor.flush(zlib.Z_SYNC_FLUSH)
+            pending = 0
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,58 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+TOTALS_ID = "totals"
+
+def day_id(when: Optional[datetime] = None) -> str:
+    return f"day:{(when or datetime.utcnow()).strftime('%Y-%m-%d')}"
+
+class CounterStore:
+    """Materialized counters in one collection, updated incrementally with $inc upserts.
+
+    Counter documents are keyed by ``_id``: ``totals`` for all-time counts and
+    ``day:YYYY-MM-DD`` for daily ones; subclasses add their own kinds.
+    """
+
+    # Named in the log when an update fails
+    label = "counters"
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def _apply(self, increments: Dict[str, Dict[str, int]], labels: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
+        """Apply $inc upserts for several counter documents in one round-trip.
+
+        ``labels`` holds extra fields to $set on some of the documents.
+        """
+        labels = labels or {}
+        operations = [
+            UpdateOne(
+                {"_id": counter_id},
+                {"$inc": inc, "$set": {"updated_at": datetime.utcnow(), **labels.get(counter_id, {})}},
+                upsert=True
+            )
+            for counter_id, inc in increments.items() if counter_id and inc
+        ]
+        if not operations:
+            return
+        try:
+            await self.collection.bulk_write(operations, ordered=False)
+        except Exception as e:
+            # Counters must never break the write path; they can be rebuilt
+            logger.error(f"Failed to update {self.label}: {e}")
+
+    async def _daily(self, days: int) -> List[Dict[str, Any]]:
+        """Read the daily counters of the last ``days`` days, oldest first"""
+        start = day_id(datetime.utcnow() - timedelta(days=days - 1))
+        daily = []
+        cursor = self.collection.find({"_id": {"$gte": start, "$lt": "day;"}}).sort("_id", 1)
+        async for doc in cursor:
+            doc["date"] = doc.pop("_id")[len("day:"):]
+            doc.pop("updated_at", None)
+            daily.append(doc)
+        return daily
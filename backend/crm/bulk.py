@@ -0,0 +1,248 @@
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from starlette.concurrency import run_in_threadpool
+
+from .crud import normalize_email
+from .models import UserCreate, UserPreferences
+from .search import build_search_fields
+from conversations.serialization import dumps
+
+# Bulk settings - you can set these in environment variables
+IMPORT_BATCH_SIZE = int(os.getenv("CRM_IMPORT_BATCH_SIZE", "1000"))
+EXPORT_BATCH_SIZE = int(os.getenv("CRM_EXPORT_BATCH_SIZE", "2000"))
+MAX_REPORTED_ERRORS = 1000
+
+# Columns of a CSV export; preferences are flattened to "preferences.<field>"
+EXPORT_COLUMNS = [
+    "id", "name", "email", "phone", "company", "job_title", "tags", "notes",
+    "created_at", "updated_at", "last_interaction", "total_conversations"
+] + [f"preferences.{field}" for field in UserPreferences.model_fields]
+# Internal fields that are not part of an exported user
+EXPORT_PROJECTION = {"search_tokens": 0, "name_lower": 0, "email_normalized": 0, "dedup_keys": 0}
+TAG_SEPARATOR = ";"
+# Fields the search tokens are built from (see build_search_fields)
+SEARCH_SOURCE_FIELDS = ("name", "email", "company")
+
+def detect_format(filename: Optional[str], requested: Optional[str] = None) -> str:
+    """Pick the upload format from the request or the file extension"""
+    if requested:
+        return requested
+    if filename and filename.lower().endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    return "csv"
+
+def iter_row_batches(file, file_format: str, batch_size: int = IMPORT_BATCH_SIZE) -> Iterator[List[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]]:
+    """Parse an uploaded file incrementally into batches of (row number, row, error)"""
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    batch = []
+    try:
+        if file_format == "ndjson":
+            rows = _iter_ndjson(text)
+        else:
+            rows = ((reader.line_num, row, None) for reader in [csv.DictReader(text)] for row in reader)
+        for parsed in rows:
+            batch.append(parsed)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        # The upload owns the underlying file
+        text.detach()
+
+def _iter_ndjson(text) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, f"Invalid JSON: {e}"
+            continue
+        if isinstance(row, dict):
+            yield line_number, row, None
+        else:
+            yield line_number, None, "Row must be a JSON object"
+
+async def iter_upload_batches(file, file_format: str, batch_size: int = IMPORT_BATCH_SIZE):
+    """Async wrapper around iter_row_batches that parses in a worker thread"""
+    batches = iter_row_batches(file, file_format, batch_size)
+    while True:
+        batch = await run_in_threadpool(next, batches, None)
+        if batch is None:
+            break
+        yield batch
+
+def validate_row(row: Dict[str, Any]) -> UserCreate:
+    """Validate an import row, accepting CSV-style tags and preference columns"""
+    fields: Dict[str, Any] = {}
+    preferences: Dict[str, Any] = {}
+    for key, value in row.items():
+        if key is None or value is None or (isinstance(value, str) and not value.strip()):
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+        if key.startswith("preferences."):
+            preferences[key.split(".", 1)[1]] = value
+        else:
+            fields[key] = value
+    if isinstance(fields.get("tags"), str):
+        fields["tags"] = [tag.strip() for tag in fields["tags"].split(TAG_SEPARATOR) if tag.strip()]
+    if isinstance(preferences.get("product_interests"), str):
+        preferences["product_interests"] = [
+            item.strip() for item in preferences["product_interests"].split(TAG_SEPARATOR) if item.strip()
+        ]
+    if preferences:
+        fields["preferences"] = {**(fields.get("preferences") or {}), **preferences}
+
+    user = UserCreate(**fields)
+    if not user.email or "@" not in user.email:
+        raise ValueError("A valid email is required")
+    return user
+
+def user_upsert(email_normalized: str, user: UserCreate) -> UpdateOne:
+    """Build the upsert of one imported user, keyed on the normalized email"""
+    now = datetime.utcnow()
+    fields = user.dict(exclude_none=True)
+    fields["email_normalized"] = email_normalized
+    fields["updated_at"] = now
+    if all(fields.get(field) for field in SEARCH_SOURCE_FIELDS):
+        fields.update(build_search_fields(fields))
+    return UpdateOne(
+        {"email_normalized": email_normalized},
+        {
+            "$set": fields,
+            "$setOnInsert": {"created_at": now, "total_conversations": 0},
+            # Imported users are picked up by the next duplicate scan
+            "$unset": {"dedup_keys": ""}
+        },
+        upsert=True
+    )
+
+def _row_error(row_number: int, error: str) -> Dict[str, Any]:
+    return {"row": row_number, "error": error}
+
+def _validation_message(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" for item in error.errors()
+        )
+    return str(error)
+
+async def import_user_batch(collection, batch: List[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]) -> Dict[str, Any]:
+    """Validate and upsert one batch of rows with an unordered bulk write"""
+    result = {"rows": len(batch), "created": 0, "updated": 0, "unchanged": 0, "failed": 0, "errors": []}
+    # Later rows for the same email win, so one batch never races itself
+    users: Dict[str, Tuple[int, UserCreate]] = {}
+    for row_number, row, error in batch:
+        if error is None:
+            try:
+                user = validate_row(row)
+                users[normalize_email(user.email)] = (row_number, user)
+                continue
+            except (ValidationError, ValueError, TypeError) as e:
+                error = _validation_message(e)
+        result["errors"].append(_row_error(row_number, error))
+
+    if users:
+        row_numbers = [row_number for row_number, _ in users.values()]
+        operations = [user_upsert(email, user) for email, (_, user) in users.items()]
+        try:
+            write = await collection.bulk_write(operations, ordered=False)
+            details = {
+                "nUpserted": write.upserted_count,
+                "nModified": write.modified_count,
+                "nMatched": write.matched_count
+            }
+        except BulkWriteError as e:
+            details = e.details
+            for write_error in details.get("writeErrors", []):
+                result["errors"].append(_row_error(row_numbers[write_error["index"]], write_error.get("errmsg", "Write failed")))
+        result["created"] = details.get("nUpserted", 0)
+        result["updated"] = details.get("nModified", 0)
+        result["unchanged"] = details.get("nMatched", 0) - result["updated"]
+
+        # Rows without every search field merge into stored users, so their
+        # search tokens are rebuilt from the stored documents
+        partial = [
+            email for email, (_, user) in users.items()
+            if not all(getattr(user, field) for field in SEARCH_SOURCE_FIELDS)
+        ]
+        if partial:
+            cursor = collection.find({"email_normalized": {"$in": partial}}, {field: 1 for field in SEARCH_SOURCE_FIELDS})
+            search_updates = [
+                UpdateOne({"_id": user_doc["_id"]}, {"$set": build_search_fields(user_doc)})
+                async for user_doc in cursor
+            ]
+            if search_updates:
+                await collection.bulk_write(search_updates, ordered=False)
+
+    result["failed"] = len(result["errors"])
+    return result
+
+async def import_users(collection, file, file_format: str, jobs=None, job_id: Optional[str] = None,
+                       batch_size: int = IMPORT_BATCH_SIZE, counters=None) -> Dict[str, Any]:
+    """Stream an uploaded CSV/NDJSON file into the users collection batch by batch.
+
+    ``file`` is the already spooled upload; it is parsed and upserted one
+    batch at a time, so memory stays bounded by the batch size.
+    """
+    report = {"rows": 0, "created": 0, "updated": 0, "unchanged": 0, "failed": 0, "errors": []}
+    started = datetime.utcnow()
+    async for batch in iter_upload_batches(file, file_format, batch_size):
+        result = await import_user_batch(collection, batch)
+        if counters and result["created"]:
+            await counters.users_created(result["created"])
+        for counter in ("rows", "created", "updated", "unchanged", "failed"):
+            report[counter] += result[counter]
+        room = MAX_REPORTED_ERRORS - len(report["errors"])
+        if room > 0:
+            report["errors"].extend(result["errors"][:room])
+        if jobs and job_id:
+            await jobs.report(
+                job_id, processed=result["rows"],
+                created=result["created"], updated=result["updated"], failed=result["failed"]
+            )
+
+    elapsed = (datetime.utcnow() - started).total_seconds()
+    report["rows_per_second"] = round(report["rows"] / elapsed, 1) if elapsed else None
+    return report
+
+def export_record(user_doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Shape a raw user document for export"""
+    user_doc["id"] = str(user_doc.pop("_id"))
+    return user_doc
+
+def _csv_value(value: Any) -> Any:
+    if isinstance(value, list):
+        return TAG_SEPARATOR.join(str(item) for item in value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def encode_csv_rows(records: List[Dict[str, Any]], header: bool = False) -> bytes:
+    """Encode export records as CSV lines"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    for record in records:
+        preferences = record.get("preferences") or {}
+        writer.writerow([
+            _csv_value(preferences.get(column.split(".", 1)[1]) if column.startswith("preferences.") else record.get(column))
+            for column in EXPORT_COLUMNS
+        ])
+    return buffer.getvalue().encode("utf-8")
+
+def encode_ndjson_rows(records: List[Dict[str, Any]]) -> bytes:
+    """Encode export records as NDJSON lines"""
+    return b"".join(dumps(record) + b"\n" for record in records)
@@ -0,0 +1,101 @@
+from datetime import datetime
+from typing import Dict, Any, List
+
+from pymongo import ASCENDING, DESCENDING
+
+from counter_store import CounterStore, TOTALS_ID, day_id
+
+def _labels(user_doc: Dict[str, Any]) -> Dict[str, Dict[str, str]]:
+    """Company and tag counter documents of a user, with their display labels"""
+    labels = {}
+    company = (user_doc.get("company") or "").strip()
+    if company:
+        labels[f"company:{company.lower()}"] = {"kind": "company", "name": company}
+    for tag in user_doc.get("tags") or []:
+        tag = (tag or "").strip()
+        if tag:
+            labels[f"tag:{tag.lower()}"] = {"kind": "tag", "name": tag}
+    return labels
+
+class CRMCounters(CounterStore):
+    """Materialized CRM counters, updated incrementally with $inc upserts.
+
+    Documents in ``crm_counters``:
+      - ``totals``: users, conversations and messages
+      - ``day:YYYY-MM-DD``: new users, active users, conversations and messages that day
+      - ``company:<name>`` / ``tag:<tag>``: conversations of users with that company or tag
+    """
+
+    label = "CRM counters"
+
+    def __init__(self, database):
+        super().__init__(database["crm_counters"])
+        self.users_collection = database["users"]
+        self.conversations_collection = database["conversations"]
+
+    async def create_indexes(self):
+        """Index the company/tag counters and seed the totals on first run"""
+        await self.collection.create_index([("kind", ASCENDING), ("conversations", DESCENDING)])
+        if not await self.collection.find_one({"_id": TOTALS_ID}, {"_id": 1}):
+            # Buckets keep a message_count on the header; older conversations an inline array
+            messages = 0
+            async for doc in self.conversations_collection.aggregate([
+                {"$group": {"_id": None, "messages": {"$sum": {
+                    "$ifNull": ["$message_count", {"$size": {"$ifNull": ["$messages", []]}}]
+                }}}}
+            ]):
+                messages = doc["messages"]
+            await self.collection.update_one(
+                {"_id": TOTALS_ID},
+                {"$setOnInsert": {
+                    "users": await self.users_collection.count_documents({}),
+                    "conversations": await self.conversations_collection.count_documents({}),
+                    "messages": messages,
+                    "updated_at": datetime.utcnow()
+                }},
+                upsert=True
+            )
+
+    async def users_created(self, count: int = 1) -> None:
+        await self._apply({TOTALS_ID: {"users": count}, day_id(): {"new_users": count}})
+
+    async def users_deleted(self, count: int = 1) -> None:
+        await self._apply({TOTALS_ID: {"users": -count}})
+
+    async def conversation_created(self, message_count: int = 0) -> None:
+        await self._apply({
+            TOTALS_ID: {"conversations": 1, "messages": message_count},
+            day_id(): {"conversations": 1, "messages": message_count}
+        })
+
+    async def messages_added(self, count: int = 1) -> None:
+        await self._apply({TOTALS_ID: {"messages": count}, day_id(): {"messages": count}})
+
+    async def user_interacted(self, user_before: Dict[str, Any]) -> None:
+        """Count a conversation for a user's company and tags, and the user as active today.
+
+        ``user_before`` is the user document as it was before its
+        ``last_interaction`` was moved to now.
+        """
+        labels = _labels(user_before)
+        increments = {counter_id: {"conversations": 1} for counter_id in labels}
+        last_interaction = user_before.get("last_interaction")
+        if not last_interaction or day_id(last_interaction) != day_id():
+            increments[day_id()] = {"active_users": 1}
+        await self._apply(increments, labels)
+
+    async def _top(self, kind: str, limit: int) -> List[Dict[str, Any]]:
+        cursor = self.collection.find(
+            {"kind": kind}, {"_id": 0, "name": 1, "conversations": 1}
+        ).sort("conversations", DESCENDING).limit(limit)
+        return [doc async for doc in cursor]
+
+    async def get_stats(self, days: int = 30, top: int = 10) -> Dict[str, Any]:
+        """Read the totals, the last ``days`` daily counters and the top companies and tags"""
+        totals = await self.collection.find_one({"_id": TOTALS_ID}, {"_id": 0, "updated_at": 0}) or {}
+        return {
+            "totals": totals,
+            "daily": await self._daily(days),
+            "by_company": await self._top("company", top),
+            "by_tag": await self._top("tag", top)
+        }
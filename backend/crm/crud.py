@@ -2,26 +2,109 @@ from typing import List, Optional, Dict, Any
 from datetime import datetime
 from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from pymongo import ReturnDocument
+from pymongo import ReturnDocument, ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import OperationFailure, DuplicateKeyError, BulkWriteError
+import logging
+import os
 
 from .models import User, UserCreate, UserUpdate, Conversation, ConversationCreate
 from database import get_database
+from .search import (
+    build_search_fields, query_terms, most_selective_term, rank_user, encode_cursor, decode_cursor
+)
+from .dedup import DuplicateDetector
+from .counters import CRMCounters
+
+logger = logging.getLogger(__name__)
+
+# Messages per conversation bucket - you can set this in environment variables
+MESSAGE_BUCKET_SIZE = int(os.getenv("CRM_MESSAGE_BUCKET_SIZE", "100"))
+# Conversation headers at this version keep their messages in buckets only
+CONVERSATION_SCHEMA_VERSION = 2
+
+def normalize_email(email: Optional[str]) -> Optional[str]:
+    """Normalize an email for uniqueness checks and lookups"""
+    if not email:
+        return None
+    normalized = email.strip().lower()
+    return normalized or None
 
 class UserCRUD:
+    # Whether the unique email index exists; until it does, writes check for duplicates themselves
+    email_index_ready = False
+
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
         self.collection = db.users
+        self.duplicates = DuplicateDetector(db)
+        self.counters = CRMCounters(db)
+
+    async def create_indexes(self):
+        """Create database indexes, backfilling normalized emails first"""
+        await self.collection.update_many(
+            {"email": {"$type": "string"}, "email_normalized": {"$exists": False}},
+            [{"$set": {"email_normalized": {"$toLower": {"$trim": {"input": "$email"}}}}}]
+        )
+        try:
+            await self.collection.create_index(
+                [("email_normalized", ASCENDING)], unique=True, sparse=True
+            )
+            UserCRUD.email_index_ready = True
+        except OperationFailure as e:
+            # Existing duplicate emails must be merged before the index can be built;
+            # until then create_user and update_user check for duplicates themselves
+            UserCRUD.email_index_ready = False
+            logger.error(f"Failed to create unique email index, falling back to duplicate checks: {e}")
+
+        # Typeahead search: equality on a prefix token, read in keyset (name, _id) order
+        await self.collection.create_index([("search_tokens", ASCENDING), ("name_lower", ASCENDING), ("_id", ASCENDING)])
+        await self._backfill_search_fields()
+        await self.duplicates.create_indexes()
+
+    async def _backfill_search_fields(self, batch_size: int = 1000):
+        """Add search fields to users created before search indexing existed"""
+        operations = []
+        cursor = self.collection.find(
+            {"search_tokens": {"$exists": False}}, {"name": 1, "email": 1, "company": 1}
+        ).batch_size(batch_size)
+        async for user_doc in cursor:
+            operations.append(UpdateOne({"_id": user_doc["_id"]}, {"$set": build_search_fields(user_doc)}))
+            if len(operations) >= batch_size:
+                await self.collection.bulk_write(operations, ordered=False)
+                operations = []
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False)
+
+    async def _check_email_available(self, email_normalized: Optional[str], user_id: Optional[ObjectId] = None):
+        """Raise DuplicateKeyError if another user has the email (only needed without the unique index)"""
+        if UserCRUD.email_index_ready or not email_normalized:
+            return
+        query: Dict[str, Any] = {"email_normalized": email_normalized}
+        if user_id is not None:
+            query["_id"] = {"$ne": user_id}
+        if await self.collection.find_one(query, {"_id": 1}):
+            raise DuplicateKeyError(f"User with email {email_normalized} already exists")
 
     async def create_user(self, user_data: UserCreate) -> User:
-        """Create a new user"""
+        """Create a new user in a single write.
+
+        Raises pymongo's DuplicateKeyError if a user with the same email exists.
+        """
         user_dict = user_data.dict(exclude_unset=True)
         user_dict["created_at"] = datetime.utcnow()
         user_dict["updated_at"] = datetime.utcnow()
         user_dict["total_conversations"] = 0
+        email_normalized = normalize_email(user_dict.get("email"))
+        if email_normalized:
+            user_dict["email_normalized"] = email_normalized
+        await self._check_email_available(email_normalized)
+        user_dict.update(build_search_fields(user_dict))
         
         result = await self.collection.insert_one(user_dict)
-        created_user = await self.collection.find_one({"_id": result.inserted_id})
-        return User(**created_user)
+        user_dict["_id"] = result.inserted_id
+        await self.duplicates.index_user(user_dict)
+        await self.counters.users_created()
+        return User(**user_dict)
 
     async def get_user_by_id(self, user_id: str) -> Optional[User]:
         """Get user by ID"""
@@ -33,7 +116,10 @@ class UserCRUD:
 
     async def get_user_by_email(self, email: str) -> Optional[User]:
         """Get user by email"""
-        user_doc = await self.collection.find_one({"email": email})
+        email_normalized = normalize_email(email)
+        if not email_normalized:
+            return None
+        user_doc = await self.collection.find_one({"email_normalized": email_normalized})
         return User(**user_doc) if user_doc else None
 
     async def get_users(self, skip: int = 0, limit: int = 100) -> List[User]:
@@ -44,6 +130,18 @@ class UserCRUD:
             users.append(User(**user_doc))
         return users
 
+    async def iter_user_batches(self, projection: Optional[Dict[str, Any]] = None, batch_size: int = 1000):
+        """Yield all users as lists of raw documents, ``batch_size`` per cursor round-trip"""
+        cursor = self.collection.find({}, projection).sort("_id", ASCENDING).batch_size(batch_size)
+        batch = []
+        async for user_doc in cursor:
+            batch.append(user_doc)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
     async def update_user(self, user_id: str, user_data: UserUpdate) -> Optional[User]:
         """Update user"""
         if not ObjectId.is_valid(user_id):
@@ -52,12 +150,26 @@ class UserCRUD:
         update_data = user_data.dict(exclude_unset=True)
         if update_data:
             update_data["updated_at"] = datetime.utcnow()
+            update = {"$set": update_data}
+            if "email" in update_data:
+                email_normalized = normalize_email(update_data["email"])
+                if email_normalized:
+                    update_data["email_normalized"] = email_normalized
+                    await self._check_email_available(email_normalized, ObjectId(user_id))
+                else:
+                    update["$unset"] = {"email_normalized": ""}
             
             updated_user = await self.collection.find_one_and_update(
                 {"_id": ObjectId(user_id)},
-                {"$set": update_data},
+                update,
                 return_document=ReturnDocument.AFTER
             )
+            if updated_user and {"name", "email", "company"} & update_data.keys():
+                search_fields = build_search_fields(updated_user)
+                await self.collection.update_one({"_id": updated_user["_id"]}, {"$set": search_fields})
+                updated_user.update(search_fields)
+            if updated_user and {"name", "email", "phone", "company"} & update_data.keys():
+                await self.duplicates.index_user(updated_user)
             return User(**updated_user) if updated_user else None
         return None
 
@@ -67,89 +179,335 @@ class UserCRUD:
             return False
         
         result = await self.collection.delete_one({"_id": ObjectId(user_id)})
+        if result.deleted_count:
+            await self.duplicates.remove_user(ObjectId(user_id))
+            await self.counters.users_deleted()
         return result.deleted_count > 0
 
-    async def search_users(self, query: str) -> List[User]:
-        """Search users by name, email, or company"""
-        search_filter = {
-            "$or": [
-                {"name": {"$regex": query, "$options": "i"}},
-                {"email": {"$regex": query, "$options": "i"}},
-                {"company": {"$regex": query, "$options": "i"}}
-            ]
-        }
-        
-        cursor = self.collection.find(search_filter)
-        users = []
-        async for user_doc in cursor:
-            users.append(User(**user_doc))
-        return users
+    async def search_users(self, query: str, limit: int = 20, cursor: Optional[str] = None) -> tuple:
+        """Search users by name, email, or company prefixes.
+
+        Each page is a window of ``limit`` candidates read in (name_lower, _id)
+        order from the search_tokens index with an equality on the query's most
+        selective token, resuming after the keyset cursor; only that window is
+        ranked. An exact email match is looked up separately and leads the
+        first page. Returns (users, next cursor or None).
+        """
+        terms = query_terms(query)
+        if not terms:
+            return [], None
+
+        selective = most_selective_term(terms)
+        match: Dict[str, Any] = {"search_tokens": selective}
+        conditions = [{"search_tokens": term} for term in terms if term != selective]
+
+        query_lower = query.strip().lower()
+        exact = []
+        position = decode_cursor(cursor)
+        if position is None:
+            exact_doc = await self.collection.find_one({"email_normalized": query_lower}, {"search_tokens": 0})
+            if exact_doc:
+                exact.append(exact_doc)
+        else:
+            name_lower, last_id = position
+            conditions.append({"$or": [
+                {"name_lower": {"$gt": name_lower}},
+                {"name_lower": name_lower, "_id": {"$gt": last_id}}
+            ]})
+        conditions.append({"email_normalized": {"$ne": query_lower}})
+        match["$and"] = conditions
+
+        window = await self.collection.find(match, {"search_tokens": 0}).sort(
+            [("name_lower", ASCENDING), ("_id", ASCENDING)]
+        ).limit(limit + 1).to_list(length=None)
+        # One extra document tells whether there is a next window
+        has_more = len(window) > limit
+        window = window[:limit]
+        next_cursor = encode_cursor(window[-1].get("name_lower") or "", window[-1]["_id"]) if has_more else None
+
+        window.sort(key=lambda user_doc: -rank_user(user_doc, query, terms))
+        return [User(**user_doc) for user_doc in exact + window], next_cursor
 
     async def update_last_interaction(self, user_id: str) -> bool:
         """Update user's last interaction timestamp"""
         if not ObjectId.is_valid(user_id):
             return False
         
-        result = await self.collection.update_one(
+        user_before = await self.collection.find_one_and_update(
             {"_id": ObjectId(user_id)},
             {
                 "$set": {"last_interaction": datetime.utcnow()},
                 "$inc": {"total_conversations": 1}
-            }
+            },
+            projection={"company": 1, "tags": 1, "last_interaction": 1}
         )
-        return result.modified_count > 0
+        if not user_before:
+            return False
+        await self.counters.user_interacted(user_before)
+        return True
 
 class ConversationCRUD:
-    def __init__(self, db: AsyncIOMotorDatabase):
+    """CRM conversations stored with the bucket pattern.
+
+    The conversation document is a small header (``message_count``,
+    ``bucket_count``, ``last_message_at``); messages live in fixed-size
+    documents of ``conversation_message_buckets``, keyed by
+    (conversation_id, bucket). Conversations written before buckets existed
+    keep an inline ``messages`` array until their next append moves it out.
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase, bucket_size: int = MESSAGE_BUCKET_SIZE):
         self.db = db
         self.collection = db.conversations
+        self.buckets_collection = db.conversation_message_buckets
+        self.bucket_size = bucket_size
+        self.counters = CRMCounters(db)
+
+    async def create_indexes(self):
+        """Create indexes for conversations and message buckets"""
+        await self.collection.create_index([("user_id", ASCENDING)])
+        await self.buckets_collection.create_index(
+            [("conversation_id", ASCENDING), ("bucket", ASCENDING)], unique=True
+        )
+
+    def _bucket_docs(self, conversation_id: ObjectId, messages: List[Dict[str, Any]], first_index: int = 0) -> List[Dict[str, Any]]:
+        """Split messages into bucket documents, starting at message ``first_index``"""
+        bucket_docs = []
+        for start in range(0, len(messages), self.bucket_size):
+            chunk = messages[start:start + self.bucket_size]
+            bucket_docs.append({
+                "conversation_id": conversation_id,
+                "bucket": (first_index + start) // self.bucket_size,
+                "count": len(chunk),
+                "messages": chunk,
+                "first_at": datetime.utcnow(),
+                "last_at": datetime.utcnow()
+            })
+        return bucket_docs
+
+    def _header_fields(self, message_count: int) -> Dict[str, Any]:
+        return {
+            "message_count": message_count,
+            "bucket_count": -(-message_count // self.bucket_size),
+            "last_message_at": datetime.utcnow() if message_count else None
+        }
 
     async def create_conversation(self, conversation_data: ConversationCreate) -> Conversation:
         """Create a new conversation"""
         conversation_dict = conversation_data.dict()
+        messages = conversation_dict.pop("messages") or []
         conversation_dict["created_at"] = datetime.utcnow()
         conversation_dict["updated_at"] = datetime.utcnow()
+        conversation_dict.update(self._header_fields(len(messages)))
+        conversation_dict["schema_version"] = CONVERSATION_SCHEMA_VERSION
         
         # Convert user_id to ObjectId if provided
         if conversation_dict.get("user_id"):
             conversation_dict["user_id"] = ObjectId(conversation_dict["user_id"])
         
         result = await self.collection.insert_one(conversation_dict)
-        created_conversation = await self.collection.find_one({"_id": result.inserted_id})
-        return Conversation(**created_conversation)
+        conversation_dict["_id"] = result.inserted_id
+        if messages:
+            await self.buckets_collection.insert_many(self._bucket_docs(result.inserted_id, messages))
+        await self.counters.conversation_created(len(messages))
+        return Conversation(**conversation_dict, messages=messages)
 
     async def get_conversation_by_id(self, conversation_id: str) -> Optional[Conversation]:
-        """Get conversation by ID"""
+        """Get a conversation header with its latest bucket of messages"""
         if not ObjectId.is_valid(conversation_id):
             return None
         
         conversation_doc = await self.collection.find_one({"_id": ObjectId(conversation_id)})
-        return Conversation(**conversation_doc) if conversation_doc else None
+        if not conversation_doc:
+            return None
+        if not conversation_doc.get("messages") and conversation_doc.get("bucket_count"):
+            bucket_doc = await self.buckets_collection.find_one(
+                {"conversation_id": conversation_doc["_id"], "bucket": conversation_doc["bucket_count"] - 1}
+            )
+            conversation_doc["messages"] = bucket_doc["messages"] if bucket_doc else []
+        return Conversation(**conversation_doc)
 
     async def get_conversations_by_user(self, user_id: str) -> List[Conversation]:
-        """Get all conversations for a user"""
+        """Get all conversation headers for a user"""
         if not ObjectId.is_valid(user_id):
             return []
         
-        cursor = self.collection.find({"user_id": ObjectId(user_id)})
+        cursor = self.collection.find({"user_id": ObjectId(user_id)}, {"messages": 0})
         conversations = []
         async for conversation_doc in cursor:
             conversations.append(Conversation(**conversation_doc))
         return conversations
 
-    async def add_message_to_conversation(self, conversation_id: str, message: Dict[str, Any]) -> bool:
-        """Add a message to an existing conversation"""
+    async def get_message_bucket(self, conversation_id: str, bucket: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Get one bucket of a conversation's messages, the latest by default"""
         if not ObjectId.is_valid(conversation_id):
-            return False
-        
-        result = await self.collection.update_one(
+            return None
+
+        header = await self.collection.find_one(
             {"_id": ObjectId(conversation_id)},
+            {"message_count": 1, "bucket_count": 1, "messages": 1}
+        )
+        if not header:
+            return None
+
+        if header.get("messages"):
+            # Not migrated yet: page through the inline array
+            messages = header["messages"]
+            message_count = len(messages)
+            bucket_count = -(-message_count // self.bucket_size)
+            if bucket is None:
+                bucket = max(bucket_count - 1, 0)
+            page = messages[bucket * self.bucket_size:(bucket + 1) * self.bucket_size]
+        else:
+            message_count = header.get("message_count", 0)
+            bucket_count = header.get("bucket_count", 0)
+            if bucket is None:
+                bucket = max(bucket_count - 1, 0)
+            bucket_doc = await self.buckets_collection.find_one(
+                {"conversation_id": header["_id"], "bucket": bucket}
+            )
+            page = bucket_doc["messages"] if bucket_doc else []
+
+        return {
+            "conversation_id": str(header["_id"]),
+            "bucket": bucket,
+            "bucket_count": bucket_count,
+            "message_count": message_count,
+            "messages": page
+        }
+
+    async def _migrate_inline_messages(self, conversation_id: ObjectId) -> bool:
+        """Move a legacy inline ``messages`` array into buckets.
+
+        Appends only touch headers at CONVERSATION_SCHEMA_VERSION, so nothing
+        writes the buckets until the migration is done. The buckets are written
+        first, each created only if missing, which makes concurrent or retried
+        migrations harmless; the inline array is unset afterwards.
+        Returns False if the conversation does not exist.
+        """
+        header = await self.collection.find_one(
+            {"_id": conversation_id}, {"messages": 1, "schema_version": 1}
+        )
+        if not header:
+            return False
+        if header.get("schema_version") == CONVERSATION_SCHEMA_VERSION:
+            return True
+        messages = header.get("messages") or []
+        if messages:
+            operations = [
+                UpdateOne(
+                    {"conversation_id": conversation_id, "bucket": bucket_doc["bucket"]},
+                    {"$setOnInsert": {field: bucket_doc[field] for field in ("count", "messages", "first_at", "last_at")}},
+                    upsert=True
+                )
+                for bucket_doc in self._bucket_docs(conversation_id, messages)
+            ]
+            try:
+                await self.buckets_collection.bulk_write(operations, ordered=False)
+            except BulkWriteError as e:
+                # A concurrent migration created the same buckets first
+                if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                    raise
+            header_fields = self._header_fields(len(messages))
+        else:
+            # Already in buckets (or empty); only the version is missing
+            header_fields = {}
+        await self.collection.update_one(
+            {"_id": conversation_id, "schema_version": {"$ne": CONVERSATION_SCHEMA_VERSION}},
             {
-                "$push": {"messages": message},
-                "$set": {"updated_at": datetime.utcnow()}
+                "$unset": {"messages": ""},
+                "$set": {**header_fields, "schema_version": CONVERSATION_SCHEMA_VERSION}
             }
         )
-        return result.modified_count > 0
+        return True
+
+    async def add_message_to_conversation(self, conversation_id: str, message: Dict[str, Any]) -> bool:
+        """Append a message to the conversation's current bucket.
+
+        The header's ``message_count`` is incremented first; the returned count
+        decides the bucket, so concurrent appends never overfill one.
+        """
+        if not ObjectId.is_valid(conversation_id):
+            return False
+        object_id = ObjectId(conversation_id)
+
+        now = datetime.utcnow()
+        header_filter = {"_id": object_id, "schema_version": CONVERSATION_SCHEMA_VERSION}
+        header_update = {
+            "$inc": {"message_count": 1},
+            "$set": {"updated_at": now, "last_message_at": now}
+        }
+        header = await self.collection.find_one_and_update(
+            header_filter, header_update, projection={"message_count": 1}, return_document=ReturnDocument.AFTER
+        )
+        if not header:
+            # Missing, or a legacy conversation that is migrated on its first append
+            if not await self._migrate_inline_messages(object_id):
+                return False
+            header = await self.collection.find_one_and_update(
+                header_filter, header_update, projection={"message_count": 1}, return_document=ReturnDocument.AFTER
+            )
+            if not header:
+                return False
+
+        bucket = (header["message_count"] - 1) // self.bucket_size
+        bucket_update = {
+            "$push": {"messages": message},
+            "$inc": {"count": 1},
+            "$set": {"last_at": now},
+            "$setOnInsert": {"first_at": now}
+        }
+        bucket_filter = {"conversation_id": object_id, "bucket": bucket}
+        try:
+            await self.buckets_collection.update_one(bucket_filter, bucket_update, upsert=True)
+        except DuplicateKeyError:
+            # Another append created the bucket first
+            await self.buckets_collection.update_one(bucket_filter, bucket_update)
+        await self.counters.messages_added()
+        await self.collection.update_one(
+            {"_id": object_id, "bucket_count": {"$not": {"$gt": bucket}}},
+            {"$set": {"bucket_count": bucket + 1}}
+        )
+        return True
+
+    async def iter_conversation_batches(self, query: Dict[str, Any], batch_size: int = 200):
+        """Yield matching conversations as lists of (ID, messages).
+
+        The buckets of a whole batch are fetched with a single query.
+        """
+        cursor = self.collection.find(query, {"messages": 1}).sort("_id", ASCENDING).batch_size(batch_size)
+        headers = []
+        async for conversation_doc in cursor:
+            headers.append(conversation_doc)
+            if len(headers) >= batch_size:
+                yield await self._with_bucket_messages(headers)
+                headers = []
+        if headers:
+            yield await self._with_bucket_messages(headers)
+
+    async def _with_bucket_messages(self, headers: List[Dict[str, Any]]) -> List[tuple]:
+        messages = {header["_id"]: list(header.get("messages") or []) for header in headers}
+        cursor = self.buckets_collection.find(
+            {"conversation_id": {"$in": list(messages)}}, {"conversation_id": 1, "messages": 1}
+        ).sort([("conversation_id", ASCENDING), ("bucket", ASCENDING)])
+        async for bucket_doc in cursor:
+            messages[bucket_doc["conversation_id"]].extend(bucket_doc["messages"])
+        return list(messages.items())
+
+    async def iter_messages(self, conversation_id: str):
+        """Yield every message of a conversation, bucket by bucket"""
+        if not ObjectId.is_valid(conversation_id):
+            return
+        object_id = ObjectId(conversation_id)
+        header = await self.collection.find_one({"_id": object_id}, {"messages": 1})
+        if not header:
+            return
+        for message in header.get("messages") or []:
+            yield message
+        cursor = self.buckets_collection.find({"conversation_id": object_id}).sort("bucket", ASCENDING)
+        async for bucket_doc in cursor:
+            for message in bucket_doc["messages"]:
+                yield message
 
 # Initialize CRUD instances
 def get_user_crud() -> UserCRUD:
@@ -0,0 +1,327 @@
+import asyncio
+import logging
+import os
+import re
+import zlib
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+import numpy as np
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# Duplicate detection settings - you can set these in environment variables
+DEDUP_MIN_SCORE = float(os.getenv("CRM_DEDUP_MIN_SCORE", "0.6"))
+DEDUP_BATCH_SIZE = int(os.getenv("CRM_DEDUP_BATCH_SIZE", "500"))
+# Blocks larger than this (e.g. a very common surname) are too unspecific to compare
+DEDUP_MAX_BLOCK_SIZE = int(os.getenv("CRM_DEDUP_MAX_BLOCK_SIZE", "50"))
+
+TRIGRAM_DIMENSIONS = 512
+FIELD_WEIGHTS = {"name": 0.4, "phone": 0.25, "email": 0.2, "company": 0.15}
+# Shared mailbox providers say nothing about whether two contacts are related
+FREE_MAIL_DOMAINS = {
+    "gmail.com", "googlemail.com", "yahoo.com", "hotmail.com", "outlook.com", "live.com",
+    "msn.com", "icloud.com", "me.com", "aol.com", "proton.me", "protonmail.com"
+}
+COMPANY_SUFFIXES = {"inc", "llc", "ltd", "corp", "corporation", "co", "company", "group", "plc", "gmbh"}
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+_NON_DIGIT = re.compile(r"\D+")
+_SOUNDEX_CODES = {
+    **dict.fromkeys("bfpv", "1"), **dict.fromkeys("cgjkqsxz", "2"), **dict.fromkeys("dt", "3"),
+    "l": "4", **dict.fromkeys("mn", "5"), "r": "6"
+}
+
+def soundex(word: str) -> str:
+    """American Soundex code of a word (e.g. "Robert" -> "R163")"""
+    letters = [char for char in word.lower() if char.isalpha()]
+    if not letters:
+        return ""
+    code = letters[0].upper()
+    previous = _SOUNDEX_CODES.get(letters[0], "")
+    for char in letters[1:]:
+        digit = _SOUNDEX_CODES.get(char, "")
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        if char not in "hw":
+            previous = digit
+    return code.ljust(4, "0")
+
+def phone_digits(phone: Optional[str]) -> Optional[str]:
+    """The last ten digits of a phone number, ignoring formatting and country codes"""
+    digits = _NON_DIGIT.sub("", phone or "")
+    return digits[-10:] if len(digits) >= 7 else None
+
+def email_parts(email: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """Split an email into a normalized local part (no dots or +tags) and its domain"""
+    local, _, domain = (email or "").strip().lower().rpartition("@")
+    if not local or not domain:
+        return None, None
+    local = local.split("+", 1)[0].replace(".", "")
+    return local or None, domain
+
+def company_key(company: Optional[str]) -> Optional[str]:
+    words = [word for word in _NON_ALNUM.split((company or "").lower()) if word and word not in COMPANY_SUFFIXES]
+    return " ".join(words) or None
+
+def name_key(name: Optional[str]) -> Optional[str]:
+    """First initial plus the Soundex code of the last name"""
+    words = [word for word in _NON_ALNUM.split((name or "").lower()) if word]
+    if not words:
+        return None
+    return f"{words[0][0]}{soundex(words[-1])}"
+
+def blocking_keys(user_doc: Dict[str, Any]) -> List[str]:
+    """Keys that put a user in the same block as its likely duplicates"""
+    keys = []
+    local, domain = email_parts(user_doc.get("email"))
+    if local and len(local) >= 4:
+        keys.append(f"local:{local}")
+    if domain and domain not in FREE_MAIL_DOMAINS:
+        keys.append(f"domain:{domain}")
+    phone = phone_digits(user_doc.get("phone"))
+    if phone:
+        keys.append(f"phone:{phone}")
+    name = name_key(user_doc.get("name"))
+    if name:
+        keys.append(f"name:{name}")
+    company = company_key(user_doc.get("company"))
+    if company:
+        keys.append(f"company:{company}")
+    return keys
+
+def trigram_vectors(values: List[Optional[str]]) -> np.ndarray:
+    """Unit-length hashed character-trigram vectors, one row per value"""
+    vectors = np.zeros((len(values), TRIGRAM_DIMENSIONS), dtype=np.float32)
+    for row, value in enumerate(values):
+        text = f"  {value.lower()} " if value else ""
+        for index in range(len(text) - 2):
+            vectors[row, zlib.crc32(text[index:index + 3].encode("utf-8")) % TRIGRAM_DIMENSIONS] += 1.0
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+def score_pairs(pairs: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """Score candidate pairs of user documents in one vectorized pass.
+
+    Each field contributes its similarity (trigram cosine, or exact match for
+    phones) weighted by FIELD_WEIGHTS; fields missing on either side are left
+    out of the weighted average. Returns (scores, per-field similarities).
+    """
+    left = [pair[0] for pair in pairs]
+    right = [pair[1] for pair in pairs]
+    similarities = {}
+    present = {}
+
+    for field, extract in (
+        ("name", lambda doc: doc.get("name")),
+        ("email", lambda doc: email_parts(doc.get("email"))[0]),
+        ("company", lambda doc: company_key(doc.get("company")))
+    ):
+        left_values = [extract(doc) for doc in left]
+        right_values = [extract(doc) for doc in right]
+        similarities[field] = np.einsum("ij,ij->i", trigram_vectors(left_values), trigram_vectors(right_values))
+        present[field] = np.array([bool(a and b) for a, b in zip(left_values, right_values)])
+
+    left_phones = [phone_digits(doc.get("phone")) for doc in left]
+    right_phones = [phone_digits(doc.get("phone")) for doc in right]
+    similarities["phone"] = np.array([float(a == b) for a, b in zip(left_phones, right_phones)], dtype=np.float32)
+    present["phone"] = np.array([bool(a and b) for a, b in zip(left_phones, right_phones)])
+
+    weighted = np.zeros(len(pairs), dtype=np.float32)
+    total_weight = np.zeros(len(pairs), dtype=np.float32)
+    for field, weight in FIELD_WEIGHTS.items():
+        weighted += weight * similarities[field] * present[field]
+        total_weight += weight * present[field]
+    scores = np.divide(weighted, total_weight, out=np.zeros_like(weighted), where=total_weight > 0)
+    return scores, {field: similarities[field] * present[field] for field in FIELD_WEIGHTS}
+
+def suggestion_id(first_id, second_id) -> str:
+    return ":".join(sorted((str(first_id), str(second_id))))
+
+class DuplicateDetector:
+    """Finds likely duplicate users through blocking keys.
+
+    Each user stores its ``dedup_keys``; only users sharing a key are compared,
+    so indexing a user costs one indexed lookup instead of a collection scan.
+    Users without keys (new imports, users from before detection existed) are
+    picked up by ``scan``, which makes the first full pass incremental as well.
+    Suggestions are kept in ``user_merge_suggestions``.
+    """
+
+    USER_FIELDS = {"name": 1, "email": 1, "phone": 1, "company": 1, "dedup_keys": 1}
+
+    def __init__(self, db, min_score: float = DEDUP_MIN_SCORE):
+        self.users_collection = db.users
+        self.collection = db.user_merge_suggestions
+        self.min_score = min_score
+
+    async def create_indexes(self):
+        await self.users_collection.create_index([("dedup_keys", ASCENDING)])
+        await self.collection.create_index([("status", ASCENDING), ("score", DESCENDING)])
+        await self.collection.create_index([("user_ids", ASCENDING)])
+
+    async def index_users(self, user_docs: List[Dict[str, Any]]) -> int:
+        """Refresh the blocking keys of some users and suggest merges with their block-mates.
+
+        Returns the number of suggestions written.
+        """
+        if not user_docs:
+            return 0
+        keys_by_user = {user_doc["_id"]: blocking_keys(user_doc) for user_doc in user_docs}
+        await self.users_collection.bulk_write([
+            UpdateOne({"_id": user_id}, {"$set": {"dedup_keys": keys}})
+            for user_id, keys in keys_by_user.items()
+        ], ordered=False)
+
+        pairs, reasons = await self._candidate_pairs(user_docs, keys_by_user)
+        matched_ids = await self._write_suggestions(pairs, reasons) if pairs else []
+
+        # Open suggestions of these users whose pair no longer matches go stale
+        await self.collection.update_many(
+            {"user_ids": {"$in": list(keys_by_user)}, "status": "open", "_id": {"$nin": matched_ids}},
+            {"$set": {"status": "stale", "updated_at": datetime.utcnow()}}
+        )
+        return len(matched_ids)
+
+    async def _block_size(self, key: str) -> int:
+        """Count a block's members, stopping just past DEDUP_MAX_BLOCK_SIZE"""
+        return await self.users_collection.count_documents({"dedup_keys": key}, limit=DEDUP_MAX_BLOCK_SIZE + 1)
+
+    async def _candidate_pairs(self, user_docs: List[Dict[str, Any]], keys_by_user: Dict[Any, List[str]]) -> tuple:
+        """Pair each user with the other members of its blocks.
+
+        Block sizes are counted (bounded, on the dedup_keys index) before any
+        member is fetched, so an oversized block costs a short index scan
+        rather than loading all of its users.
+        """
+        pairs: Dict[str, Tuple[Dict[str, Any], Dict[str, Any]]] = {}
+        reasons: Dict[str, Set[str]] = defaultdict(set)
+        all_keys = list({key for keys in keys_by_user.values() for key in keys})
+        if not all_keys:
+            return pairs, reasons
+        sizes = await asyncio.gather(*(self._block_size(key) for key in all_keys))
+        keys = {key for key, size in zip(all_keys, sizes) if size <= DEDUP_MAX_BLOCK_SIZE}
+        if not keys:
+            return pairs, reasons
+        blocks: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        cursor = self.users_collection.find({"dedup_keys": {"$in": list(keys)}}, self.USER_FIELDS)
+        async for candidate in cursor:
+            for key in candidate.get("dedup_keys") or []:
+                if key in keys:
+                    blocks[key].append(candidate)
+
+        for user_doc in user_docs:
+            for key in keys_by_user[user_doc["_id"]]:
+                for candidate in blocks.get(key, []):
+                    if candidate["_id"] == user_doc["_id"]:
+                        continue
+                    pair_id = suggestion_id(user_doc["_id"], candidate["_id"])
+                    pairs.setdefault(pair_id, (user_doc, candidate))
+                    reasons[pair_id].add(key.split(":", 1)[0])
+        return pairs, reasons
+
+    async def _write_suggestions(self, pairs: Dict[str, tuple], reasons: Dict[str, Set[str]]) -> List[str]:
+        """Score candidate pairs and upsert those above the threshold; returns their IDs"""
+        pair_ids = list(pairs)
+        # Vectorized scoring is CPU-bound; keep it off the event loop
+        scores, similarities = await asyncio.to_thread(score_pairs, [pairs[pair_id] for pair_id in pair_ids])
+
+        now = datetime.utcnow()
+        operations = []
+        matched_ids = []
+        for index, pair_id in enumerate(pair_ids):
+            first, second = pairs[pair_id]
+            user_ids = sorted([first["_id"], second["_id"]], key=str)
+            if scores[index] < self.min_score:
+                continue
+            matched_ids.append(pair_id)
+            operations.append(UpdateOne(
+                {"_id": pair_id},
+                {
+                    "$set": {
+                        "user_ids": user_ids,
+                        "score": round(float(scores[index]), 3),
+                        "reasons": sorted(reasons[pair_id]),
+                        "signals": {field: round(float(values[index]), 3) for field, values in similarities.items()},
+                        "updated_at": now
+                    },
+                    "$setOnInsert": {"status": "open", "created_at": now}
+                },
+                upsert=True
+            ))
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False)
+            # Stale suggestions reopen when a later edit makes the pair match again;
+            # dismissed ones stay dismissed
+            await self.collection.update_many(
+                {"_id": {"$in": matched_ids}, "status": "stale"},
+                {"$set": {"status": "open"}}
+            )
+        return matched_ids
+
+    async def index_user(self, user_doc: Dict[str, Any]) -> None:
+        """Index one created or updated user, logging rather than raising on failure"""
+        try:
+            await self.index_users([user_doc])
+        except Exception as e:
+            logger.error(f"Duplicate detection failed for user {user_doc.get('_id')}: {e}")
+
+    async def remove_user(self, user_id) -> None:
+        await self.collection.delete_many({"user_ids": user_id})
+
+    async def scan(self, jobs=None, job_id: Optional[str] = None, batch_size: int = DEDUP_BATCH_SIZE) -> Dict[str, Any]:
+        """Index every user that has no blocking keys yet"""
+        report = {"users": 0, "suggestions": 0}
+        try:
+            while True:
+                cursor = self.users_collection.find({"dedup_keys": {"$exists": False}}, self.USER_FIELDS).limit(batch_size)
+                user_docs = [user_doc async for user_doc in cursor]
+                if not user_docs:
+                    break
+                suggestions = await self.index_users(user_docs)
+                report["users"] += len(user_docs)
+                report["suggestions"] += suggestions
+                if jobs and job_id:
+                    await jobs.report(job_id, processed=len(user_docs), suggestions=suggestions)
+            if jobs and job_id:
+                await jobs.finish(job_id, result=report)
+        except Exception as e:
+            if jobs and job_id:
+                await jobs.finish(job_id, error=str(e))
+            else:
+                raise
+        return report
+
+    async def get_suggestions(self, min_score: Optional[float] = None, status: str = "open", limit: int = 50, skip: int = 0) -> List[Dict[str, Any]]:
+        """Get merge suggestions, best first, with a summary of both users"""
+        query: Dict[str, Any] = {"status": status}
+        if min_score is not None:
+            query["score"] = {"$gte": min_score}
+        cursor = self.collection.find(query).sort("score", DESCENDING).skip(skip).limit(limit)
+        suggestions = [suggestion async for suggestion in cursor]
+
+        user_ids = {user_id for suggestion in suggestions for user_id in suggestion["user_ids"]}
+        users = {}
+        if user_ids:
+            async for user_doc in self.users_collection.find(
+                {"_id": {"$in": list(user_ids)}}, {"name": 1, "email": 1, "phone": 1, "company": 1}
+            ):
+                user_doc["id"] = str(user_doc.pop("_id"))
+                users[user_doc["id"]] = user_doc
+
+        for suggestion in suggestions:
+            suggestion["id"] = suggestion.pop("_id")
+            suggestion["user_ids"] = [str(user_id) for user_id in suggestion["user_ids"]]
+            suggestion["users"] = [users[user_id] for user_id in suggestion["user_ids"] if user_id in users]
+        return suggestions
+
+    async def set_status(self, suggestion_id: str, status: str) -> bool:
+        result = await self.collection.update_one(
+            {"_id": suggestion_id},
+            {"$set": {"status": status, "updated_at": datetime.utcnow()}}
+        )
+        return result.matched_count > 0
@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# Extraction settings - you can set these in environment variables
+EXTRACTION_WORKERS = int(os.getenv("CRM_EXTRACTION_WORKERS", "0")) or (os.cpu_count() or 1)
+EXTRACTION_BATCH_SIZE = int(os.getenv("CRM_EXTRACTION_BATCH_SIZE", "200"))
+
+# Extractors are compiled once per process, not per conversation
+EMAIL_PATTERN = re.compile(r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b")
+PHONE_PATTERN = re.compile(r"(?<![\w+])(?:\+?\d{1,3}[\s.-]?)?(?:\(\d{3}\)|\d{3})[\s.-]?\d{3}[\s.-]?\d{4}(?!\w)")
+NAME_PATTERN = re.compile(
+    r"\b(?i:my name is|i am|i'm|this is|call me)\s+([A-Z][a-z'-]+(?:\s+[A-Z][a-z'-]+)?)"
+)
+COMPANY_PATTERNS = [
+    re.compile(r"\b(?i:work(?:ing)? (?:at|for)|i'm with|i am with|represent(?:ing)?)\s+([A-Z][\w&.-]*(?:\s+[A-Z][\w&.-]*){0,3})"),
+    re.compile(r"\b([A-Z][\w&-]*(?:\s+[A-Z][\w&-]*){0,2}\s+(?:Inc|LLC|Ltd|Corp|Corporation|Group|Partners)\b\.?)")
+]
+
+# Confidence added by each extracted field
+FIELD_CONFIDENCE = {"email": 0.3, "name": 0.3, "phone": 0.2, "company": 0.2}
+
+def message_text(message: Any) -> Optional[str]:
+    """Return the text of a user message, or None for other senders.
+
+    Messages may be stored as dicts or as objects with ``role``/``content``.
+    """
+    if isinstance(message, dict):
+        role = message.get("role") or message.get("sender")
+        content = message.get("content")
+    else:
+        role = getattr(message, "role", None) or getattr(message, "sender", None)
+        content = getattr(message, "content", None)
+    role = getattr(role, "value", role)
+    if role not in (None, "user") or not isinstance(content, str):
+        return None
+    return content
+
+def extract_user_data(messages: List[Any]) -> Dict[str, Any]:
+    """Extract contact details from the user messages of a conversation"""
+    text = "\n".join(filter(None, (message_text(message) for message in messages)))
+    extracted_data = {
+        "potential_name": None,
+        "potential_email": None,
+        "potential_phone": None,
+        "potential_company": None,
+        "confidence_score": 0.0,
+        "extracted_from": "conversation_analysis"
+    }
+    if not text:
+        return extracted_data
+
+    email = EMAIL_PATTERN.search(text)
+    if email:
+        extracted_data["potential_email"] = email.group(0)
+    phone = PHONE_PATTERN.search(text)
+    if phone:
+        extracted_data["potential_phone"] = phone.group(0).strip()
+    name = NAME_PATTERN.search(text)
+    if name:
+        extracted_data["potential_name"] = name.group(1)
+    for pattern in COMPANY_PATTERNS:
+        company = pattern.search(text)
+        if company:
+            extracted_data["potential_company"] = company.group(1).rstrip(".")
+            break
+
+    extracted_data["confidence_score"] = round(sum(
+        confidence for field, confidence in FIELD_CONFIDENCE.items()
+        if extracted_data[f"potential_{field}"]
+    ), 2)
+    return extracted_data
+
+class ExtractionPool:
+    """Process pool shared by extraction jobs, created once and reused.
+
+    Workers are spawned rather than forked, so they never inherit the event
+    loop, Mongo client threads or locks of the server process.
+    """
+
+    def __init__(self, workers: int = EXTRACTION_WORKERS):
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def start(self) -> None:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        # Started lazily when used outside the app lifespan
+        self.start()
+        return self._executor
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+extraction_pool = ExtractionPool()
+
+def extract_batch(conversations: List[Tuple[str, List[Any]]]) -> List[Tuple[str, Dict[str, Any]]]:
+    """Run the extractors over a batch of (conversation ID, messages); used by worker processes"""
+    return [(conversation_id, extract_user_data(messages)) for conversation_id, messages in conversations]
+
+async def run_extraction(conversation_crud, query: Dict[str, Any], jobs=None, job_id: Optional[str] = None,
+                         pool: Optional[ExtractionPool] = None, batch_size: int = EXTRACTION_BATCH_SIZE) -> Dict[str, Any]:
+    """Extract user data from every matching conversation across the shared process pool.
+
+    Conversations are streamed in batches; up to two batches per worker are in
+    flight while results are written back to ``extracted_data`` in bulk.
+    """
+    report = {"conversations": 0, "with_contact": 0}
+    started = datetime.utcnow()
+    loop = asyncio.get_running_loop()
+    pool = pool or extraction_pool
+    executor = pool.executor
+    pending = set()
+
+    async def write_results(done) -> None:
+        for future in done:
+            results = future.result()
+            extracted_at = datetime.utcnow()
+            operations = [
+                UpdateOne(
+                    {"_id": conversation_id},
+                    {"$set": {"extracted_data": {**extracted_data, "extracted_at": extracted_at}}}
+                )
+                for conversation_id, extracted_data in results
+            ]
+            if operations:
+                await conversation_crud.collection.bulk_write(operations, ordered=False)
+            with_contact = sum(1 for _, extracted_data in results if extracted_data["confidence_score"] > 0)
+            report["conversations"] += len(results)
+            report["with_contact"] += with_contact
+            if jobs and job_id:
+                await jobs.report(job_id, processed=len(results), with_contact=with_contact)
+
+    try:
+        async for batch in conversation_crud.iter_conversation_batches(query, batch_size):
+            pending.add(loop.run_in_executor(executor, extract_batch, batch))
+            if len(pending) >= pool.workers * 2:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                await write_results(done)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            await write_results(done)
+
+        elapsed = (datetime.utcnow() - started).total_seconds()
+        report["elapsed_seconds"] = round(elapsed, 2)
+        report["conversations_per_second"] = round(report["conversations"] / elapsed, 1) if elapsed else None
+        if jobs and job_id:
+            await jobs.finish(job_id, result=report)
+    except Exception as e:
+        for future in pending:
+            future.cancel()
+        if jobs and job_id:
+            await jobs.finish(job_id, error=str(e))
+        else:
+            raise
+    return report
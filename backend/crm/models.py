@@ -63,6 +63,22 @@ class Conversation(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     extracted_data: Optional[Dict[str, Any]] = None
+    message_count: int = 0
+    bucket_count: int = 0
+    last_message_at: Optional[datetime] = None
+
+class MessageBucketResponse(BaseModel):
+    conversation_id: str
+    bucket: int
+    bucket_count: int
+    message_count: int
+    messages: List[Dict[str, Any]] = []
+
+class ExtractionRequest(BaseModel):
+    conversation_ids: Optional[List[str]] = None
+    user_id: Optional[str] = None
+    updated_since: Optional[datetime] = None
+    only_missing: bool = Field(False, description="Skip conversations that already have extracted_data")
 
 class UserCreate(BaseModel):
     name: Optional[str] = None
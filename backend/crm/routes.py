@@ -1,46 +1,84 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Depends, Query, Response, UploadFile, File, BackgroundTasks
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, Dict, Any
 from datetime import datetime
 from pydantic import BaseModel
+from pymongo.errors import DuplicateKeyError
+from bson import ObjectId
+import asyncio
 import os
-from openai import OpenAI
+import time
+import uuid
 from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
 
 # Load environment variables
 load_dotenv()
 
 from .models import (
     User, UserCreate, UserUpdate, UserResponse,
-    Conversation, ConversationCreate
+    Conversation, ConversationCreate, MessageBucketResponse, ExtractionRequest
 )
 from .crud import get_user_crud, get_conversation_crud, UserCRUD, ConversationCRUD
-
-# Import property search service
-try:
-    from analytics.property_search import PropertySearchService
-    property_search = PropertySearchService()
-except ImportError:
-    property_search = None
-    print("Warning: Property search service not available")
-
-# Initialize OpenRouter client
-client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY"),
-    base_url=os.getenv("OPENAI_BASE_URL", "https://openrouter.ai/api/v1")
+from .bulk import (
+    detect_format, import_users, export_record, encode_csv_rows, encode_ndjson_rows,
+    EXPORT_PROJECTION, EXPORT_BATCH_SIZE
 )
+from .extraction import extract_user_data, run_extraction
+from jobs import JobTracker
+from conversations.rollups import ConversationRollups
+from conversations.crud import ConversationCRUD as SessionCRUD
+from conversations.models import MessageCreate, MessageSender
+from conversations.routes import get_conversation_crud as get_session_crud
+from conversations.streaming import encode_sse, encode_ndjson, SSE_MEDIA_TYPE, NDJSON_MEDIA_TYPE
+from llm.gateway import llm_gateway
+from agent.intents import route_message
+from agent.retrieval import property_context, associate_context, market_context
 
 # Chat models
 class ChatMessage(BaseModel):
     content: str
     role: str = "user"
+    session_id: Optional[str] = None  # Conversation session to store the turn in
+    turn_id: Optional[str] = None  # Makes retried turns idempotent
 
 class ChatResponse(BaseModel):
     message: str
     model: str
     usage: Optional[dict] = None
+    cached: bool = False
 
 router = APIRouter(prefix="/api/crm", tags=["CRM"])
 
+# Stats endpoint
+@router.get("/stats")
+async def get_crm_stats(
+    days: int = Query(30, ge=1, le=365),
+    top: int = Query(10, ge=1, le=100),
+    user_crud: UserCRUD = Depends(get_user_crud)
+):
+    """Get CRM and chat totals, daily activity and conversations by company/tag from the counters"""
+    try:
+        crm = await user_crud.counters.get_stats(days=days, top=top)
+        chat = await ConversationRollups(user_crud.db).get_stats(days=days)
+        today = datetime.utcnow().strftime("%Y-%m-%d")
+        crm_today = next((day for day in crm["daily"] if day["date"] == today), {})
+        chat_today = next((day for day in chat["daily"] if day["date"] == today), {})
+        return {
+            "summary": {
+                "users": crm["totals"].get("users", 0),
+                "new_users_today": crm_today.get("new_users", 0),
+                "active_users_today": crm_today.get("active_users", 0),
+                "active_chat_users_today": chat_today.get("active_users", 0),
+                "conversations": crm["totals"].get("conversations", 0) + chat["totals"].get("sessions", 0),
+                "messages": crm["totals"].get("messages", 0) + chat["totals"].get("messages", 0)
+            },
+            "crm": crm,
+            "chat": chat
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 # User endpoints
 @router.post("/users", response_model=UserResponse)
 async def create_user(
@@ -49,12 +87,7 @@ async def create_user(
 ):
     """Create a new user"""
     try:
-        # Check if user with email already exists
-        if user_data.email:
-            existing_user = await user_crud.get_user_by_email(user_data.email)
-            if existing_user:
-                raise HTTPException(status_code=400, detail="User with this email already exists")
-        
+        # The unique email index rejects duplicates, so no lookup is needed first
         user = await user_crud.create_user(user_data)
         return UserResponse(
             id=str(user.id),
@@ -71,20 +104,26 @@ async def create_user(
             last_interaction=user.last_interaction,
             total_conversations=user.total_conversations
         )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="User with this email already exists")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/users", response_model=List[UserResponse])
 async def get_users(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     search: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None, description="Cursor from X-Next-Cursor to get the next search page"),
     user_crud: UserCRUD = Depends(get_user_crud)
 ):
     """Get all users with optional search and pagination"""
     try:
         if search:
-            users = await user_crud.search_users(search)
+            users, next_cursor = await user_crud.search_users(search, limit=min(limit, 100), cursor=cursor)
+            if next_cursor:
+                response.headers["X-Next-Cursor"] = next_cursor
         else:
             users = await user_crud.get_users(skip=skip, limit=limit)
         
@@ -108,6 +147,100 @@ async def get_users(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/users/import")
+async def import_users_file(
+    file: UploadFile = File(..., description="CSV with a header row, or NDJSON with one user per line"),
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$", description="Defaults to the file extension"),
+    user_crud: UserCRUD = Depends(get_user_crud)
+):
+    """Create or update users in bulk, keyed on email, reporting per-row errors.
+
+    The multipart upload is spooled by Starlette (to disk past 1 MB) before
+    this handler runs; only the parsing and the upserts are streamed, batch
+    by batch, from that spooled file.
+    """
+    file_format = detect_format(file.filename, format)
+    jobs = JobTracker(user_crud.db)
+    job_id = None
+    try:
+        job_id = await jobs.create_job("crm.user_import", params={"filename": file.filename, "format": file_format})
+        report = await import_users(user_crud.collection, file.file, file_format, jobs, job_id, counters=user_crud.counters)
+        await jobs.finish(job_id, result={key: value for key, value in report.items() if key != "errors"})
+        return {"job_id": job_id, **report}
+    except Exception as e:
+        if job_id:
+            await jobs.finish(job_id, error=str(e))
+        raise HTTPException(status_code=500, detail=f"Failed to import users: {str(e)}")
+
+@router.get("/users/export")
+async def export_users(
+    format: str = Query("ndjson", pattern="^(csv|ndjson)$"),
+    batch_size: int = Query(EXPORT_BATCH_SIZE, ge=1, le=10000),
+    user_crud: UserCRUD = Depends(get_user_crud)
+):
+    """Stream every user as CSV or NDJSON"""
+    async def generate():
+        header = True
+        async for user_docs in user_crud.iter_user_batches(EXPORT_PROJECTION, batch_size):
+            records = [export_record(user_doc) for user_doc in user_docs]
+            if format == "csv":
+                yield encode_csv_rows(records, header=header)
+                header = False
+            else:
+                yield encode_ndjson_rows(records)
+        if format == "csv" and header:
+            yield encode_csv_rows([], header=True)
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/csv" if format == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f"attachment; filename=users.{format}"}
+    )
+
+@router.get("/users/duplicates")
+async def get_duplicate_users(
+    min_score: Optional[float] = Query(None, ge=0, le=1),
+    status: str = Query("open", pattern="^(open|dismissed|stale)$"),
+    limit: int = Query(50, ge=1, le=500),
+    skip: int = Query(0, ge=0),
+    user_crud: UserCRUD = Depends(get_user_crud)
+):
+    """Get suggested merges of likely duplicate users, best match first"""
+    try:
+        return await user_crud.duplicates.get_suggestions(min_score=min_score, status=status, limit=limit, skip=skip)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/users/duplicates/scan")
+async def scan_duplicate_users(
+    background_tasks: BackgroundTasks,
+    user_crud: UserCRUD = Depends(get_user_crud)
+):
+    """Index users that have not been checked for duplicates yet, in a background job"""
+    try:
+        jobs = JobTracker(user_crud.db)
+        total = await user_crud.collection.count_documents({"dedup_keys": {"$exists": False}})
+        job_id = await jobs.create_job("crm.duplicate_scan", total=total)
+        background_tasks.add_task(user_crud.duplicates.scan, jobs, job_id)
+        return {"message": "Duplicate scan started", "job_id": job_id, "total": total}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to start duplicate scan: {str(e)}")
+
+@router.post("/users/duplicates/{suggestion_id}/dismiss")
+async def dismiss_duplicate_suggestion(
+    suggestion_id: str,
+    user_crud: UserCRUD = Depends(get_user_crud)
+):
+    """Dismiss a merge suggestion so it is not suggested again"""
+    try:
+        if not await user_crud.duplicates.set_status(suggestion_id, "dismissed"):
+            raise HTTPException(status_code=404, detail="Suggestion not found")
+        return {"message": "Suggestion dismissed"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/users/{user_id}", response_model=UserResponse)
 async def get_user(
     user_id: str,
@@ -147,7 +280,10 @@ async def update_user(
 ):
     """Update user"""
     try:
-        user = await user_crud.update_user(user_id, user_data)
+        try:
+            user = await user_crud.update_user(user_id, user_data)
+        except DuplicateKeyError:
+            raise HTTPException(status_code=400, detail="User with this email already exists")
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
@@ -224,6 +360,43 @@ async def get_conversation(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/conversations/{conversation_id}/messages", response_model=MessageBucketResponse)
+async def get_conversation_messages(
+    conversation_id: str,
+    bucket: Optional[int] = Query(None, ge=0, description="Bucket number; defaults to the latest"),
+    conversation_crud: ConversationCRUD = Depends(get_conversation_crud)
+):
+    """Get one bucket (page) of a conversation's messages"""
+    try:
+        page = await conversation_crud.get_message_bucket(conversation_id, bucket)
+        if not page:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+        
+        return page
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/conversations/{conversation_id}/messages")
+async def add_conversation_message(
+    conversation_id: str,
+    message: Dict[str, Any],
+    conversation_crud: ConversationCRUD = Depends(get_conversation_crud)
+):
+    """Append a message to a conversation"""
+    try:
+        message.setdefault("timestamp", datetime.utcnow().isoformat())
+        added = await conversation_crud.add_message_to_conversation(conversation_id, message)
+        if not added:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+        
+        return {"message": "Message added successfully"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/users/{user_id}/conversations", response_model=List[Conversation])
 async def get_user_conversations(
     user_id: str,
@@ -236,62 +409,60 @@ async def get_user_conversations(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-# Data extraction endpoint
+# Data extraction endpoints
 @router.post("/extract-user-data")
 async def extract_user_data_from_conversation(
     conversation_id: str,
     user_crud: UserCRUD = Depends(get_user_crud),
     conversation_crud: ConversationCRUD = Depends(get_conversation_crud)
 ):
-    """Extract user data from conversation messages (placeholder for AI integration)"""
+    """Extract user data from conversation messages with the regex extractors"""
     try:
-        conversation = await conversation_crud.get_conversation_by_id(conversation_id)
-        if not conversation:
+        if not await conversation_crud.get_conversation_by_id(conversation_id):
             raise HTTPException(status_code=404, detail="Conversation not found")
         
-        # This is a placeholder - in a real implementation, you would use AI/NLP
-        # to extract user information from conversation messages
-        extracted_data = {
-            "potential_name": None,
-            "potential_email": None,
-            "potential_company": None,
-            "confidence_score": 0.0,
-            "extracted_from": "conversation_analysis"
-        }
-        
-        # Simple regex-based extraction (you can enhance this with AI)
-        import re
-        all_messages = " ".join([msg.content for msg in conversation.messages if msg.role == "user"])
-        
-        # Extract email
-        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-        emails = re.findall(email_pattern, all_messages)
-        if emails:
-            extracted_data["potential_email"] = emails[0]
-            extracted_data["confidence_score"] += 0.3
-        
-        # Extract potential company names (basic pattern)
-        company_indicators = ["work at", "company", "organization", "Corp", "Inc", "LLC"]
-        for indicator in company_indicators:
-            if indicator.lower() in all_messages.lower():
-                extracted_data["confidence_score"] += 0.1
-                break
-        
-        return extracted_data
+        messages = [message async for message in conversation_crud.iter_messages(conversation_id)]
+        return extract_user_data(messages)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-# Chat endpoint with OpenRouter integration and property data
-@router.post("/chat", response_model=ChatResponse)
-async def chat_endpoint(message: ChatMessage):
-    """Chat with AI using Google Gemma 3 27B via OpenRouter with property data integration"""
+@router.post("/extract-user-data/batch")
+async def extract_user_data_batch(
+    request: ExtractionRequest,
+    background_tasks: BackgroundTasks,
+    conversation_crud: ConversationCRUD = Depends(get_conversation_crud)
+):
+    """Extract user data from many conversations in a background job"""
+    query = {}
+    if request.conversation_ids is not None:
+        query["_id"] = {"$in": [ObjectId(conversation_id) for conversation_id in request.conversation_ids if ObjectId.is_valid(conversation_id)]}
+    if request.user_id:
+        if not ObjectId.is_valid(request.user_id):
+            raise HTTPException(status_code=400, detail="Invalid user_id")
+        query["user_id"] = ObjectId(request.user_id)
+    if request.updated_since:
+        query["updated_at"] = {"$gte": request.updated_since}
+    if request.only_missing:
+        query["extracted_data"] = None
     try:
-        model = os.getenv("OPENAI_MODEL", "google/gemma-2-27b-it")
-        
-        # Enhanced system prompt with property knowledge
-        system_prompt = """You are a helpful AI assistant for OkADA & CO, a commercial real estate firm. You have access to a comprehensive property database and can help with:
+        jobs = JobTracker(conversation_crud.db)
+        total = await conversation_crud.collection.count_documents(query)
+        job_id = await jobs.create_job(
+            "crm.extract_user_data", total=total,
+            params=request.model_dump(mode="json", exclude_none=True)
+        )
+        background_tasks.add_task(run_extraction, conversation_crud, query, jobs, job_id)
+        return {"message": "Extraction job started", "job_id": job_id, "total": total}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to start extraction job: {str(e)}")
+
+# Chat endpoint with OpenRouter integration and property data
+def build_chat_messages(message: ChatMessage) -> List[Dict[str, str]]:
+    """Build the system prompt, with relevant property data, and the user's message"""
+    # Enhanced system prompt with property knowledge
+    system_prompt = """You are a helpful AI assistant for OkADA & CO, a commercial real estate firm. You have access to a comprehensive property database and can help with:
 
 1. Property searches and recommendations
 2. Rent comparisons and market analysis  
@@ -301,65 +472,121 @@ async def chat_endpoint(message: ChatMessage):
 
 When users ask about properties, provide specific data from your knowledge base. Be professional, knowledgeable, and helpful in all real estate matters."""
 
-        # Search for relevant property data if the message contains property-related keywords
-        property_context = ""
-        property_keywords = [
-            'property', 'properties', 'rent', 'rental', 'building', 'address', 'square feet', 'sqft',
-            'associate', 'broker', 'lease', 'annual', 'monthly', 'price', 'cost', 'market',
-            'broadway', 'avenue', 'street', 'manhattan', 'floor', 'suite', 'office'
-        ]
-        
-        message_lower = message.content.lower()
-        if property_search and any(keyword in message_lower for keyword in property_keywords):
-            try:
-                # Search for relevant properties
-                search_results = property_search.search_properties(message.content, limit=5)
-                
-                if search_results:
-                    property_context = "\n\nRELEVANT PROPERTY DATA:\n"
-                    for i, result in enumerate(search_results[:3], 1):
-                        prop = result['property']
-                        property_context += f"\n{i}. {prop['formatted_info']}\n"
-                        if result['match_reasons']:
-                            property_context += f"   Match reasons: {', '.join(result['match_reasons'])}\n"
-                    
-                    property_context += "\nUse this property data to provide specific, accurate answers about our real estate portfolio."
-                
-                # Also get market summary if asking about market trends
-                if any(term in message_lower for term in ['market', 'trend', 'summary', 'overview']):
-                    market_summary = property_search.get_market_summary()
-                    if market_summary:
-                        property_context += f"\n\nMARKET SUMMARY:\n"
-                        property_context += f"Total Properties: {market_summary.get('total_properties', 0)}\n"
-                        property_context += f"Average Annual Rent: ${market_summary.get('average_rent', 0):,.0f}\n"
-                        property_context += f"Average Size: {market_summary.get('average_size', 0):,.0f} sq ft\n"
-                        property_context += f"Average Rent per Sq Ft: ${market_summary.get('rent_per_sqft', 0):.2f}/year\n"
-                        
-            except Exception as e:
-                print(f"Property search error: {e}")
-                # Continue without property data if search fails
-        
-        # Combine system prompt with property context
-        full_system_prompt = system_prompt + property_context
-        
-        response = client.chat.completions.create(
+    # Fetch only the property data the message needs, as decided by the intent router
+    plan = route_message(message.content)
+    context = ""
+    for retrieve in (
+        lambda: property_context(message.content, plan),
+        lambda: associate_context(plan),
+        lambda: market_context(plan)
+    ):
+        try:
+            context += retrieve()
+        except Exception as e:
+            print(f"Property search error: {e}")
+            # Continue without property data if search fails
+
+    # Combine system prompt with property context
+    full_system_prompt = system_prompt + context
+
+    return [
+        {"role": "system", "content": full_system_prompt},
+        {"role": message.role, "content": message.content}
+    ]
+
+async def persist_chat_turn(session_crud, message: ChatMessage, reply: str, metadata: Dict[str, Any]) -> None:
+    """Store a chat turn in the message's conversation session"""
+    turn_id = message.turn_id or str(uuid.uuid4())
+    await session_crud.add_message(message.session_id, MessageCreate(
+        content=message.content, sender=MessageSender.USER, idempotency_key=f"{turn_id}:user"
+    ))
+    await session_crud.add_message(message.session_id, MessageCreate(
+        content=reply, sender=MessageSender.ASSISTANT, metadata=metadata, idempotency_key=f"{turn_id}:assistant"
+    ))
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat_endpoint(
+    message: ChatMessage,
+    stream: Optional[str] = Query(None, pattern="^(sse|ndjson)$", description="Stream tokens as server-sent events or NDJSON"),
+    session_crud: SessionCRUD = Depends(get_session_crud)
+):
+    """Chat with AI using Google Gemma 3 27B via OpenRouter with property data integration"""
+    if message.session_id and not await session_crud.get_session(message.session_id):
+        raise HTTPException(status_code=404, detail="Conversation session not found")
+    model = os.getenv("OPENAI_MODEL", "google/gemma-2-27b-it")
+    if stream:
+        return stream_chat(message, model, stream, session_crud)
+    try:
+        completion = await llm_gateway.complete(
+            # Retrieval scans the property dataset with pandas; keep it off the event loop
+            messages=await run_in_threadpool(build_chat_messages, message),
             model=model,
-            messages=[
-                {"role": "system", "content": full_system_prompt},
-                {"role": message.role, "content": message.content}
-            ],
             max_tokens=1500,  # Increased for more detailed responses
             temperature=0.7
         )
+        if message.session_id:
+            await persist_chat_turn(session_crud, message, completion.content, {"model": completion.model, "usage": completion.usage})
         
         return ChatResponse(
-            message=response.choices[0].message.content,
-            model=model,
-            usage=response.usage.model_dump() if response.usage else None
+            message=completion.content,
+            model=completion.model,
+            usage=completion.usage,
+            cached=completion.cached
         )
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Chat error: the model did not respond in time")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat error: {str(e)}")
 
+def stream_chat(message: ChatMessage, model: str, stream_format: str, session_crud) -> StreamingResponse:
+    """Forward completion tokens as they arrive, ending with a "done" (or "error") event.
+
+    The reply is persisted once the stream completes, and the trailing event
+    carries the usage and timings, including time to first token.
+    """
+    encode = encode_sse if stream_format == "sse" else encode_ndjson
+
+    async def generate():
+        started = time.monotonic()
+        first_token_at = None
+        try:
+            llm_stream = llm_gateway.stream(
+                messages=await run_in_threadpool(build_chat_messages, message),
+                model=model, max_tokens=1500, temperature=0.7
+            )
+            async for token in llm_stream:
+                if first_token_at is None:
+                    first_token_at = time.monotonic()
+                yield encode("token", {"content": token})
+
+            completion = llm_stream.completion
+            finished_at = time.monotonic()
+            metadata = {
+                "model": completion.model,
+                "usage": completion.usage,
+                "cached": completion.cached,
+                "time_to_first_token_ms": round((first_token_at - started) * 1000) if first_token_at else None,
+                "duration_ms": round((finished_at - started) * 1000)
+            }
+            if message.session_id:
+                await persist_chat_turn(session_crud, message, completion.content, metadata)
+            yield encode("done", {"message": completion.content, **metadata})
+        except asyncio.TimeoutError:
+            yield encode("error", {"detail": "Chat error: the model did not respond in time"})
+        except Exception as e:
+            yield encode("error", {"detail": f"Chat error: {str(e)}"})
+
+    return StreamingResponse(
+        generate(),
+        media_type=SSE_MEDIA_TYPE if stream_format == "sse" else NDJSON_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/llm/metrics")
+async def get_llm_metrics():
+    """Get LLM gateway concurrency and response cache statistics"""
+    return llm_gateway.stats()
+
 # Extract user data from conversation using AI
 @router.post("/ai-extract-user-data")
 async def ai_extract_user_data(conversation_text: str):
@@ -367,16 +594,18 @@ async def ai_extract_user_data(conversation_text: str):
     try:
         model = os.getenv("OPENAI_MODEL", "google/gemma-2-27b-it")
         
-        response = client.chat.completions.create(
-            model=model,
+        completion = await llm_gateway.complete(
             messages=[
                 {"role": "system", "content": "Extract user information (name, email, phone, company, job title) from the conversation text. Return the information in JSON format with confidence scores."},
                 {"role": "user", "content": f"Extract user data from this conversation: {conversation_text}"}
             ],
+            model=model,
             max_tokens=500,
             temperature=0.3
         )
         
-        return {"extracted_data": response.choices[0].message.content}
+        return {"extracted_data": completion.content}
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Extraction error: the model did not respond in time")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Extraction error: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,90 @@
+import base64
+import json
+import re
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+# Longest prefix stored per word; longer query terms are truncated to it
+MAX_PREFIX_LENGTH = 15
+
+_WORD_SPLIT = re.compile(r"[^a-z0-9]+")
+
+def _words(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    return [word for word in _WORD_SPLIT.split(text.lower()) if word]
+
+def build_search_fields(user_doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the normalized search fields of a user document.
+
+    ``search_tokens`` holds the edge n-grams (prefixes) of every word of the
+    name, email and company, so a prefix query is one multikey index lookup.
+    """
+    words: Set[str] = set()
+    words.update(_words(user_doc.get("name")))
+    words.update(_words(user_doc.get("company")))
+    words.update(_words(user_doc.get("email")))
+
+    tokens: Set[str] = set()
+    for word in words:
+        for length in range(1, min(len(word), MAX_PREFIX_LENGTH) + 1):
+            tokens.add(word[:length])
+
+    return {
+        "search_tokens": sorted(tokens),
+        "name_lower": (user_doc.get("name") or "").strip().lower()
+    }
+
+def query_terms(query: str) -> List[str]:
+    """Split a search query into index tokens"""
+    return [word[:MAX_PREFIX_LENGTH] for word in _words(query)]
+
+def most_selective_term(terms: List[str]) -> str:
+    """Pick the query term whose token matches the fewest users: the longest prefix"""
+    return max(terms, key=len)
+
+def rank_user(user_doc: Dict[str, Any], query: str, terms: List[str]) -> float:
+    """Score how well a user matches a query; higher is better.
+
+    An exact email match wins outright; otherwise a name starting with the
+    query scores 5, and each term scores 3 for a whole name word, 2 for a
+    whole company or email word, 1.5 for a name word prefix and 1 otherwise.
+    """
+    query_lower = query.strip().lower()
+    if query_lower and user_doc.get("email_normalized") == query_lower:
+        return 100.0
+
+    score = 0.0
+    name_lower = user_doc.get("name_lower") or ""
+    if query_lower and name_lower.startswith(query_lower):
+        score += 5.0
+
+    name_words = set(_words(user_doc.get("name")))
+    other_words = set(_words(user_doc.get("company"))) | set(_words(user_doc.get("email")))
+    for term in terms:
+        if term in name_words:
+            score += 3.0
+        elif term in other_words:
+            score += 2.0
+        elif any(word.startswith(term) for word in name_words):
+            score += 1.5
+        else:
+            score += 1.0
+    return score
+
+def encode_cursor(name_lower: str, user_id: ObjectId) -> str:
+    """Encode the (name_lower, _id) position of the last user of a search window"""
+    position = {"n": name_lower, "i": str(user_id)}
+    return base64.urlsafe_b64encode(json.dumps(position).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[str, ObjectId]]:
+    """Decode a search cursor into a (name_lower, _id) position, treating bad cursors as the first page"""
+    if not cursor:
+        return None
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return str(position["n"]), ObjectId(position["i"])
+    except (ValueError, KeyError, TypeError, InvalidId):
+        return None
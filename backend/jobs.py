@@ -0,0 +1,86 @@
+from fastapi import APIRouter, HTTPException
+from datetime import datetime
+from typing import Optional, Dict, Any
+import uuid
+import logging
+
+from database import get_database
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+class JobStatus:
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+class JobTracker:
+    """Progress records for background jobs, stored in the ``jobs`` collection"""
+
+    def __init__(self, database=None):
+        self.collection = (database if database is not None else get_database())["jobs"]
+
+    async def create_job(self, job_type: str, total: Optional[int] = None, params: Optional[Dict[str, Any]] = None) -> str:
+        """Create a running job and return its ID"""
+        job_id = str(uuid.uuid4())
+        await self.collection.insert_one({
+            "_id": job_id,
+            "type": job_type,
+            "status": JobStatus.RUNNING,
+            "params": params or {},
+            "total": total,
+            "processed": 0,
+            "progress": {},
+            "errors": [],
+            "created_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow(),
+            "finished_at": None
+        })
+        return job_id
+
+    async def report(self, job_id: str, processed: int = 0, **counters: int) -> None:
+        """Add to a job's processed count and named progress counters"""
+        inc = {"processed": processed}
+        inc.update({f"progress.{name}": value for name, value in counters.items()})
+        await self.collection.update_one(
+            {"_id": job_id},
+            {"$inc": inc, "$set": {"updated_at": datetime.utcnow()}}
+        )
+
+    async def add_error(self, job_id: str, error: Dict[str, Any], max_errors: int = 1000) -> None:
+        """Record an error on a job, keeping at most ``max_errors`` entries"""
+        await self.collection.update_one(
+            {"_id": job_id},
+            {"$push": {"errors": {"$each": [error], "$slice": max_errors}}}
+        )
+
+    async def finish(self, job_id: str, error: Optional[str] = None, **fields: Any) -> None:
+        """Mark a job as completed, or failed when an error is given"""
+        update = {
+            "status": JobStatus.FAILED if error else JobStatus.COMPLETED,
+            "finished_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow(),
+            **fields
+        }
+        if error:
+            update["error"] = error
+            logger.error(f"Job {job_id} failed: {error}")
+        await self.collection.update_one({"_id": job_id}, {"$set": update})
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job's progress record"""
+        job_doc = await self.collection.find_one({"_id": job_id})
+        if job_doc:
+            job_doc["job_id"] = job_doc.pop("_id")
+        return job_doc
+
+# Job progress endpoint
+router = APIRouter(prefix="/api/jobs", tags=["Jobs"])
+
+@router.get("/{job_id}")
+async def get_job_progress(job_id: str):
+    """Get the progress of a background job"""
+    job = await JobTracker().get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
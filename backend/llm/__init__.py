@@ -0,0 +1 @@
+# LLM module: shared async gateway to the chat completion provider
@@ -0,0 +1,215 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple
+
+from .models import LLMCompletion
+
+logger = logging.getLogger(__name__)
+
+# Cache settings - you can set these in environment variables
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "1000"))  # 0 disables the cache
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "3600"))
+LLM_CACHE_MAX_TEMPERATURE = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0.7"))
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "")  # e.g. ./llm_cache.sqlite3 to keep entries across restarts
+LLM_CACHE_DISK_SIZE = int(os.getenv("LLM_CACHE_DISK_SIZE", "50000"))
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s?!.]+$")
+# Prompts that carry someone's contact details are personal and never cached
+_PERSONAL_DATA = re.compile(
+    r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}"
+    r"|(?<!\d)(?:\+?\d{1,3}[\s.-]?)?(?:\(\d{3}\)|\d{3})[\s.-]?\d{3}[\s.-]?\d{4}(?!\d)"
+    r"|\b(?i:my name is|i am called)\b"
+)
+
+def normalize_content(content: str) -> str:
+    """Case-fold and collapse whitespace so trivially different prompts share a key"""
+    return _TRAILING_PUNCTUATION.sub("", _WHITESPACE.sub(" ", content).strip().casefold())
+
+def cache_keys(model: str, temperature: float, max_tokens: int, messages: List[Dict[str, str]]) -> Tuple[str, str]:
+    """Hash a request into its exact and normalized-prompt cache keys"""
+    def digest(normalize) -> str:
+        payload = {
+            "model": model,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "messages": [[message.get("role"), normalize(message.get("content") or "")] for message in messages]
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+    return digest(lambda content: content), digest(normalize_content)
+
+def is_personal(messages: List[Dict[str, str]], include_system: bool = False) -> bool:
+    return any(
+        (include_system or message.get("role") != "system") and _PERSONAL_DATA.search(message.get("content") or "")
+        for message in messages
+    )
+
+class ResponseCache:
+    """Bounded LRU + TTL cache of LLM completions.
+
+    Entries are stored under an exact key and a normalized-prompt key, and
+    looked up in that order. With ``path`` set, entries are also written to a
+    local SQLite file and survive restarts; memory stays the first tier.
+    SQLite reads and writes run in worker threads, never on the event loop,
+    and prompts carrying personal data (even in the system prompt) are kept
+    in memory only.
+    """
+
+    def __init__(self, maxsize: int = LLM_CACHE_SIZE, ttl: float = LLM_CACHE_TTL,
+                 max_temperature: float = LLM_CACHE_MAX_TEMPERATURE, path: str = LLM_CACHE_PATH,
+                 disk_size: int = LLM_CACHE_DISK_SIZE):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_temperature = max_temperature
+        self.disk_size = disk_size
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._disk: Optional[sqlite3.Connection] = None
+        # One connection is shared by the worker threads
+        self._disk_lock = threading.Lock()
+        self._disk_writes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.evictions = 0
+        if path and maxsize > 0:
+            self._open_disk(path)
+
+    def _open_disk(self, path: str) -> None:
+        try:
+            self._disk = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._disk.execute("PRAGMA journal_mode=WAL")
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, expires_at REAL, value TEXT)"
+            )
+            self._disk.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+        except sqlite3.Error as e:
+            logger.error(f"LLM cache store unavailable at {path}: {e}")
+            self._disk = None
+
+    def cacheable(self, temperature: float, messages: List[Dict[str, str]]) -> bool:
+        """Whether a request may use the cache: low temperature and no personal data"""
+        return self.maxsize > 0 and temperature <= self.max_temperature and not is_personal(messages)
+
+    def persistable(self, messages: List[Dict[str, str]]) -> bool:
+        """Whether a cacheable request may also go to the disk tier: no personal data in any message"""
+        return self._disk is not None and not is_personal(messages, include_system=True)
+
+    def bypass(self) -> None:
+        self.bypasses += 1
+
+    def _get_memory(self, key: str) -> Optional[LLMCompletion]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, completion = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return completion
+
+    def _read_disk(self, keys: Tuple[str, str]) -> Optional[Tuple[str, float, str]]:
+        """Find the first unexpired (key, expires_at, value) row of ``keys``; runs in a worker thread"""
+        try:
+            with self._disk_lock:
+                for key in keys:
+                    row = self._disk.execute(
+                        "SELECT expires_at, value FROM responses WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row and row[0] >= time.time():
+                        return key, row[0], row[1]
+        except sqlite3.Error as e:
+            logger.error(f"LLM cache read failed: {e}")
+        return None
+
+    async def get(self, keys: Tuple[str, str], disk: bool = True) -> Optional[LLMCompletion]:
+        """Get a cached completion by its exact, then its normalized key.
+
+        Memory is checked first; ``disk=False`` skips the SQLite tier.
+        """
+        for key in keys:
+            completion = self._get_memory(key)
+            if completion is not None:
+                self.hits += 1
+                return completion
+        if disk and self._disk is not None:
+            row = await asyncio.to_thread(self._read_disk, keys)
+            if row is not None:
+                key, expires_at, value = row
+                completion = LLMCompletion.model_validate_json(value)
+                self._set_memory(key, completion, expires_at - time.time())
+                self.disk_hits += 1
+                return completion
+        self.misses += 1
+        return None
+
+    def _set_memory(self, key: str, completion: LLMCompletion, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, completion)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def set(self, keys: Tuple[str, str], completion: LLMCompletion, persist: bool = True) -> None:
+        """Store a completion under both keys; ``persist=False`` keeps it out of the disk tier"""
+        if self.maxsize <= 0:
+            return
+        for key in keys:
+            self._set_memory(key, completion, self.ttl)
+        if persist and self._disk is not None:
+            await asyncio.to_thread(self._write_disk, keys, completion.model_dump_json())
+
+    def _write_disk(self, keys: Tuple[str, str], value: str) -> None:
+        """Write one completion under its keys; runs in a worker thread"""
+        try:
+            with self._disk_lock:
+                self._disk.executemany(
+                    "INSERT OR REPLACE INTO responses (key, expires_at, value) VALUES (?, ?, ?)",
+                    [(key, time.time() + self.ttl, value) for key in set(keys)]
+                )
+                self._disk_writes += 1
+                if self._disk_writes % 100 == 0:
+                    self._prune_disk()
+        except sqlite3.Error as e:
+            logger.error(f"LLM cache write failed: {e}")
+
+    def _prune_disk(self) -> None:
+        """Drop expired entries and keep the store within its size bound"""
+        self._disk.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+        self._disk.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.disk_size,)
+        )
+
+    def clear(self) -> None:
+        """Drop every cached completion"""
+        self._entries.clear()
+        if self._disk is not None:
+            with self._disk_lock:
+                self._disk.execute("DELETE FROM responses")
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache size and hit ratios"""
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "persistent": self._disk is not None,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "bypasses": self.bypasses,
+            "evictions": self.evictions,
+            "hit_ratio": (self.hits + self.disk_hits) / lookups if lookups else 0.0
+        }
@@ -0,0 +1,212 @@
+import asyncio
+import logging
+import os
+from typing import Optional, List, Dict, Any
+
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+
+from singleflight import SingleFlight
+
+from .cache import ResponseCache, cache_keys
+from .models import LLMCompletion
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# LLM settings - you can set these in environment variables
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://openrouter.ai/api/v1")
+DEFAULT_MODEL = os.getenv("OPENAI_MODEL", "google/gemma-2-27b-it")
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "200"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+
+class LLMGateway:
+    """Async access to the chat completion provider.
+
+    One ``AsyncOpenAI`` client is shared by every request, so its keep-alive
+    connection pool is reused; a semaphore bounds the calls in flight and each
+    call (including its wait for a slot) is limited by a timeout. Completions
+    of cacheable requests are served from ``cache`` when possible, and
+    identical requests that arrive while one is in flight share its call.
+    """
+
+    def __init__(self, api_key: Optional[str] = OPENAI_API_KEY, base_url: str = OPENAI_BASE_URL,
+                 timeout: float = LLM_TIMEOUT_SECONDS, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 max_retries: int = LLM_MAX_RETRIES, cache: Optional[ResponseCache] = None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client: Optional[AsyncOpenAI] = None
+        self.in_flight = 0
+        self.cache = cache if cache is not None else ResponseCache()
+        self.flights = SingleFlight()
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        # Created on first use so importing the app does not require an API key
+        if self._client is None:
+            self._client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                timeout=self.timeout,
+                max_retries=self.max_retries
+            )
+        return self._client
+
+    async def _create(self, request: Dict[str, Any], timeout: float):
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                return await self.client.chat.completions.create(**request, timeout=timeout)
+            finally:
+                self.in_flight -= 1
+
+    def _cache_keys(self, model: str, temperature: float, max_tokens: int,
+                    messages: List[Dict[str, str]], cache: Optional[bool]) -> Optional[tuple]:
+        """Cache keys of a request, or None when it bypasses the cache.
+
+        ``cache=None`` decides automatically (see ResponseCache.cacheable);
+        ``False`` always bypasses.
+        """
+        if cache is False or not self.cache.cacheable(temperature, messages):
+            self.cache.bypass()
+            return None
+        return cache_keys(model, temperature, max_tokens, messages)
+
+    def _persist(self, messages: List[Dict[str, str]], persist: Optional[bool]) -> bool:
+        """Whether a cached completion may go to the disk tier.
+
+        ``persist=None`` decides automatically (see ResponseCache.persistable);
+        callers whose prompt holds personal data the detector cannot see, such
+        as a CRM profile, pass ``False``.
+        """
+        return persist is not False and self.cache.persistable(messages)
+
+    async def complete(self, messages: List[Dict[str, str]], model: Optional[str] = None,
+                       max_tokens: int = 1000, temperature: float = 0.7,
+                       timeout: Optional[float] = None, cache: Optional[bool] = None,
+                       persist: Optional[bool] = None) -> LLMCompletion:
+        """Get a chat completion; raises asyncio.TimeoutError when ``timeout`` passes"""
+        model = model or DEFAULT_MODEL
+        timeout = timeout or self.timeout
+        keys = self._cache_keys(model, temperature, max_tokens, messages, cache)
+        persist = self._persist(messages, persist)
+        if keys:
+            cached = await self.cache.get(keys, disk=persist)
+            if cached is not None:
+                return cached.model_copy(update={"cached": True})
+
+        request = {"model": model, "messages": messages, "max_tokens": max_tokens, "temperature": temperature}
+        # Cacheable requests coalesce on the normalized prompt, others only when identical
+        flight_key = keys[1] if keys else cache_keys(model, temperature, max_tokens, messages)[0]
+        # Each caller keeps its own timeout; the shared call is bounded by the first caller's
+        return await asyncio.wait_for(
+            self.flights.do(flight_key, lambda: self._complete_uncached(request, timeout, keys, persist)),
+            timeout
+        )
+
+    async def _complete_uncached(self, request: Dict[str, Any], timeout: float,
+                                 keys: Optional[tuple], persist: bool = False) -> LLMCompletion:
+        response = await asyncio.wait_for(self._create(request, timeout), timeout)
+        completion = LLMCompletion(
+            content=response.choices[0].message.content or "",
+            model=request["model"],
+            usage=response.usage.model_dump() if response.usage else None
+        )
+        if keys and completion.content:
+            await self.cache.set(keys, completion, persist=persist)
+        return completion
+
+    def stream(self, messages: List[Dict[str, str]], model: Optional[str] = None,
+               max_tokens: int = 1000, temperature: float = 0.7,
+               timeout: Optional[float] = None, cache: Optional[bool] = None,
+               persist: Optional[bool] = None) -> "LLMStream":
+        """Stream a chat completion token by token (see LLMStream)"""
+        model = model or DEFAULT_MODEL
+        request = {
+            "model": model, "messages": messages, "max_tokens": max_tokens, "temperature": temperature,
+            "stream": True, "stream_options": {"include_usage": True}
+        }
+        keys = self._cache_keys(model, temperature, max_tokens, messages, cache)
+        return LLMStream(self, request, timeout or self.timeout, keys, self._persist(messages, persist))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "cache": self.cache.stats(),
+            "coalescing": self.flights.stats()
+        }
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+class LLMStream:
+    """Async iterator over the text deltas of a streamed completion.
+
+    The gateway slot is held until the stream ends, and is released (with the
+    response closed) however it ends: exhausted, timed out, or cancelled.
+    ``timeout`` bounds the first token once a slot is free, and then every
+    gap between chunks.
+    Once exhausted, ``completion`` holds the assembled reply and its usage.
+    A cached reply is yielded as a single chunk.
+    """
+
+    def __init__(self, gateway: LLMGateway, request: Dict[str, Any], timeout: float,
+                 cache_keys: Optional[tuple] = None, persist: bool = False):
+        self.gateway = gateway
+        self.request = request
+        self.timeout = timeout
+        self.cache_keys = cache_keys
+        self.persist = persist
+        self.completion: Optional[LLMCompletion] = None
+
+    async def __aiter__(self):
+        if self.cache_keys:
+            cached = await self.gateway.cache.get(self.cache_keys, disk=self.persist)
+            if cached is not None:
+                self.completion = cached.model_copy(update={"cached": True})
+                yield cached.content
+                return
+
+        # The slot is taken outside the timed section, so a timeout can never
+        # fire between acquiring it and the finally that gives it back
+        await self.gateway._semaphore.acquire()
+        self.gateway.in_flight += 1
+        response = None
+        parts = []
+        usage = None
+        try:
+            response = await asyncio.wait_for(
+                self.gateway.client.chat.completions.create(**self.request, timeout=self.timeout), self.timeout
+            )
+            chunks = response.__aiter__()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), self.timeout)
+                except StopAsyncIteration:
+                    break
+                if chunk.usage:
+                    usage = chunk.usage.model_dump()
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+            self.completion = LLMCompletion(content="".join(parts), model=self.request["model"], usage=usage)
+            if self.cache_keys and self.completion.content:
+                await self.gateway.cache.set(self.cache_keys, self.completion, persist=self.persist)
+        finally:
+            self.gateway.in_flight -= 1
+            self.gateway._semaphore.release()
+            if response is not None and hasattr(response, "close"):
+                await response.close()
+
+# Shared gateway instance
+llm_gateway = LLMGateway()
@@ -0,0 +1,8 @@
+from pydantic import BaseModel
+from typing import Optional, Dict, Any
+
+class LLMCompletion(BaseModel):
+    content: str
+    model: str
+    usage: Optional[Dict[str, Any]] = None
+    cached: bool = False
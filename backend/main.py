@@ -1,13 +1,24 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 import uvicorn
 import logging
 
-from database import connect_to_mongo, close_mongo_connection
+from database import connect_to_mongo, close_mongo_connection, get_database
 from crm.routes import router as crm_router
 from analytics.routes import router as analytics_router
 from conversations.routes import router as conversation_router
+from jobs import router as jobs_router
+from agent.routes import router as agent_router
+from conversations.archiver import ConversationArchiver, ARCHIVE_INTERVAL_SECONDS
+from conversations.events import event_broker
+from conversations.retention import RetentionManager, RETENTION_INTERVAL_SECONDS
+from conversations.crud import ConversationCRUD
+from crm.crud import UserCRUD, ConversationCRUD as CRMConversationCRUD
+from crm.counters import CRMCounters
+from crm.extraction import extraction_pool
+from llm.gateway import llm_gateway
 
 import os
 from dotenv import load_dotenv
@@ -23,9 +34,26 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting up CRM System...")
     await connect_to_mongo()
+    await UserCRUD(get_database()).create_indexes()
+    await CRMConversationCRUD(get_database()).create_indexes()
+    await CRMCounters(get_database()).create_indexes()
+    await event_broker.start()
+    extraction_pool.start()
+    background_tasks = []
+    if ARCHIVE_INTERVAL_SECONDS > 0:
+        archiver = ConversationArchiver(get_database())
+        background_tasks.append(asyncio.create_task(archiver.run_periodically()))
+    if RETENTION_INTERVAL_SECONDS > 0:
+        retention = RetentionManager(ConversationCRUD(get_database()))
+        background_tasks.append(asyncio.create_task(retention.run_periodically()))
     yield
     # Shutdown
     logger.info("Shutting down CRM System...")
+    for task in background_tasks:
+        task.cancel()
+    await event_broker.stop()
+    extraction_pool.shutdown()
+    await llm_gateway.close()
     await close_mongo_connection()
 
 # Create FastAPI app
@@ -54,6 +82,12 @@ app.include_router(analytics_router, prefix="/api/analytics", tags=["analytics"]
 # Include Conversation routes
 app.include_router(conversation_router)
 
+# Include background job routes
+app.include_router(jobs_router)
+
+# Include agent routes
+app.include_router(agent_router)
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
@@ -0,0 +1,91 @@
+import asyncio
+import uuid
+from datetime import datetime
+
+from mongomock_motor import AsyncMongoMockClient
+
+from conversations.crud import ConversationCRUD
+from conversations.models import ConversationSessionCreate, MessageCreate, MessageSender
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def closed_session(crud, messages=3):
+    session = await crud.create_session(ConversationSessionCreate(title="Lease"))
+    for index in range(messages):
+        await crud.add_message(session.session_id, MessageCreate(content=f"message {index}", sender=MessageSender.USER))
+    await crud.close_session(session.session_id)
+    return session.session_id
+
+
+async def new_crud():
+    crud = ConversationCRUD(AsyncMongoMockClient()["test"])
+    await crud.create_indexes()
+    return crud
+
+
+def test_archived_messages_stay_readable_and_restore_on_reopen():
+    async def scenario():
+        crud = await new_crud()
+        session_id = await closed_session(crud)
+
+        assert await crud.archiver.run_once() == {"sessions_archived": 1, "messages_archived": 3}
+        assert await crud.messages_collection.count_documents({"session_id": session_id}) == 0
+        assert [message.content for message in await crud.get_messages(session_id)] == [
+            "message 0", "message 1", "message 2"
+        ]
+
+        await crud.reopen_session(session_id)
+        assert await crud.messages_collection.count_documents({"session_id": session_id}) == 3
+        assert await crud.archiver.archives_collection.count_documents({}) == 0
+        assert not (await crud.sessions_collection.find_one({"_id": session_id}))["archived"]
+
+    run(scenario())
+
+
+def test_writing_to_an_archived_session_restores_it_first():
+    async def scenario():
+        crud = await new_crud()
+        session_id = await closed_session(crud, messages=2)
+        await crud.archiver.run_once()
+
+        await crud.add_message(session_id, MessageCreate(content="follow-up", sender=MessageSender.USER))
+        assert await crud.messages_collection.count_documents({"session_id": session_id}) == 3
+        assert (await crud.get_session(session_id)).message_count == 3
+
+    run(scenario())
+
+
+def test_archive_backs_out_when_a_message_lands_mid_archive():
+    async def scenario():
+        crud = await new_crud()
+        session_id = await closed_session(crud, messages=2)
+        archives = crud.archiver.archives_collection
+        replace_one = archives.replace_one
+
+        async def replace_then_write(*args, **kwargs):
+            # A message inserted before its session update is applied
+            await crud.messages_collection.insert_one({
+                "_id": str(uuid.uuid4()), "session_id": session_id, "sender": "user",
+                "content": "late", "timestamp": datetime.utcnow(), "metadata": {}
+            })
+            return await replace_one(*args, **kwargs)
+
+        archives.replace_one = replace_then_write
+        assert await crud.archiver.archive_session(session_id) is None
+        assert await archives.count_documents({}) == 0
+        assert await crud.messages_collection.count_documents({"session_id": session_id}) == 3
+        assert not (await crud.sessions_collection.find_one({"_id": session_id}))["archived"]
+
+    run(scenario())
+
+
+def test_run_once_skips_active_sessions():
+    async def scenario():
+        crud = await new_crud()
+        await crud.create_session(ConversationSessionCreate(title="Active"))
+        assert await crud.archiver.run_once() == {"sessions_archived": 0, "messages_archived": 0}
+
+    run(scenario())
@@ -0,0 +1,78 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+from mongomock_motor import AsyncMongoMockClient
+
+from conversations.crud import ConversationCRUD
+from conversations.models import ConversationSessionCreate, MessageCreate, MessageSender
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def insert_legacy_session(db, user_id, senders, created_at):
+    """Store a session and its messages the way they existed before rollups"""
+    session_id = str(uuid.uuid4())
+    await db["conversations_sessions"].insert_one({
+        "_id": session_id, "user_id": user_id, "status": "active", "category": "general",
+        "message_count": len(senders), "created_at": created_at, "updated_at": created_at, "tags": []
+    })
+    await db["conversations_messages"].insert_many([
+        {
+            "_id": str(uuid.uuid4()), "session_id": session_id, "sender": sender, "content": "hi",
+            "timestamp": created_at + timedelta(seconds=index), "metadata": {}
+        }
+        for index, sender in enumerate(senders)
+    ])
+    return session_id
+
+
+def test_rollups_are_seeded_once_from_existing_data():
+    async def scenario():
+        db = AsyncMongoMockClient()["test"]
+        created_at = datetime.utcnow() - timedelta(days=1)
+        await insert_legacy_session(db, "u1", ["user", "assistant", "user"], created_at)
+        await insert_legacy_session(db, "u2", ["user"], created_at)
+
+        crud = ConversationCRUD(db)
+        await crud.create_indexes()
+        stats = await crud.rollups.get_stats(days=7, user="u1")
+        totals = stats["totals"]
+        assert totals["sessions"] == 2
+        assert totals["messages"] == 4
+        assert totals["by_status"] == {"active": 2}
+        assert totals["by_sender"] == {"user": 3, "assistant": 1}
+        assert stats["user"]["messages"] == 3
+        assert sum(day.get("messages", 0) for day in stats["daily"]) == 4
+
+        # A second start does not count the same data again
+        assert not await crud.rollups.seed(crud.sessions_collection, crud.messages_collection)
+        assert (await crud.rollups.get_stats())["totals"]["sessions"] == 2
+
+    run(scenario())
+
+
+def test_live_updates_follow_writes():
+    async def scenario():
+        crud = ConversationCRUD(AsyncMongoMockClient()["test"])
+        await crud.create_indexes()
+        session = await crud.create_session(ConversationSessionCreate(user_id="u1"))
+        await crud.add_turn(session.session_id, [
+            MessageCreate(content="hello", sender=MessageSender.USER),
+            MessageCreate(content="hi there", sender=MessageSender.ASSISTANT),
+        ])
+        await crud.close_session(session.session_id)
+
+        totals = (await crud.rollups.get_stats())["totals"]
+        assert totals["sessions"] == 1
+        assert totals["messages"] == 2
+        assert totals["by_status"] == {"active": 0, "closed": 1}
+
+        await crud.delete_session(session.session_id)
+        totals = (await crud.rollups.get_stats())["totals"]
+        assert totals["sessions"] == 0
+        assert totals["messages"] == 0
+
+    run(scenario())
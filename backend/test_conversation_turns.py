@@ -0,0 +1,66 @@
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+
+from conversations.crud import ConversationCRUD
+from conversations.models import ConversationSessionCreate, MessageCreate, MessageSender
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def new_crud():
+    crud = ConversationCRUD(AsyncMongoMockClient()["test"])
+    await crud.create_indexes()
+    return crud
+
+
+def turn(turn_id, question="any offices on Broadway?", answer="Yes, two."):
+    return [
+        MessageCreate(content=question, sender=MessageSender.USER, idempotency_key=f"{turn_id}:user"),
+        MessageCreate(content=answer, sender=MessageSender.ASSISTANT, idempotency_key=f"{turn_id}:assistant"),
+    ]
+
+
+def test_retried_session_create_returns_the_same_session():
+    async def scenario():
+        crud = await new_crud()
+        first = await crud.create_session(ConversationSessionCreate(title="Lease"), idempotency_key="turn-1")
+        again = await crud.create_session(ConversationSessionCreate(title="Lease"), idempotency_key="turn-1")
+        assert again.session_id == first.session_id
+        assert await crud.sessions_collection.count_documents({}) == 1
+
+    run(scenario())
+
+
+def test_retried_turn_is_stored_and_counted_once():
+    async def scenario():
+        crud = await new_crud()
+        session = await crud.create_session(ConversationSessionCreate())
+        first = await crud.add_turn(session.session_id, turn("turn-1"))
+        # A retry may carry a different reply; the stored one wins
+        retried = await crud.add_turn(session.session_id, turn("turn-1", answer="Yes, three."))
+
+        assert [message.message_id for message in retried] == [message.message_id for message in first]
+        assert retried[1].content == "Yes, two."
+        stored = await crud.get_session(session.session_id)
+        assert stored.message_count == 2
+        assert await crud.messages_collection.count_documents({"session_id": session.session_id}) == 2
+
+    run(scenario())
+
+
+def test_partially_stored_turn_only_adds_the_missing_message():
+    async def scenario():
+        crud = await new_crud()
+        session = await crud.create_session(ConversationSessionCreate())
+        user_message, assistant_message = turn("turn-1")
+        await crud.add_message(session.session_id, user_message)
+        await crud.add_turn(session.session_id, [user_message, assistant_message])
+
+        stored = await crud.get_session(session.session_id)
+        assert stored.message_count == 2
+        assert await crud.get_message_by_key(session.session_id, "turn-1:assistant") is not None
+
+    run(scenario())
@@ -0,0 +1,56 @@
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+
+from crm.crud import ConversationCRUD
+from crm.models import ConversationCreate
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def messages(count, start=0):
+    return [{"role": "user", "content": f"message {index}"} for index in range(start, start + count)]
+
+
+async def new_crud(bucket_size=3):
+    crud = ConversationCRUD(AsyncMongoMockClient()["test"], bucket_size=bucket_size)
+    await crud.create_indexes()
+    return crud
+
+
+def test_appends_fill_buckets_in_order():
+    async def scenario():
+        crud = await new_crud()
+        conversation = await crud.create_conversation(ConversationCreate(messages=messages(2)))
+        conversation_id = str(conversation.id)
+        for message in messages(5, start=2):
+            assert await crud.add_message_to_conversation(conversation_id, message)
+
+        latest = await crud.get_message_bucket(conversation_id)
+        assert (latest["bucket"], latest["bucket_count"], latest["message_count"]) == (2, 3, 7)
+        assert [message["content"] for message in latest["messages"]] == ["message 6"]
+        stored = [message["content"] async for message in crud.iter_messages(conversation_id)]
+        assert stored == [f"message {index}" for index in range(7)]
+
+    run(scenario())
+
+
+def test_legacy_inline_messages_move_to_buckets_on_first_append():
+    async def scenario():
+        crud = await new_crud()
+        result = await crud.collection.insert_one({"user_id": None, "messages": messages(4)})
+        conversation_id = str(result.inserted_id)
+
+        # Readable before the migration
+        assert (await crud.get_message_bucket(conversation_id, bucket=0))["message_count"] == 4
+
+        assert await crud.add_message_to_conversation(conversation_id, messages(1, start=4)[0])
+        header = await crud.collection.find_one({"_id": result.inserted_id})
+        assert "messages" not in header
+        assert (header["message_count"], header["bucket_count"]) == (5, 2)
+        stored = [message["content"] async for message in crud.iter_messages(conversation_id)]
+        assert stored == [f"message {index}" for index in range(5)]
+
+    run(scenario())
@@ -0,0 +1,67 @@
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+
+import crm.dedup as dedup
+from crm.dedup import DuplicateDetector, blocking_keys, email_parts, phone_digits, soundex
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_soundex():
+    assert soundex("Robert") == "R163"
+    assert soundex("Rupert") == "R163"
+    assert soundex("Tymczak") == "T522"
+
+
+def test_normalizers():
+    assert email_parts("Jane.Doe+crm@Example.com") == ("janedoe", "example.com")
+    assert phone_digits("+1 (212) 555-0100") == "2125550100"
+    assert phone_digits("12") is None
+
+
+def test_free_mail_domains_do_not_block_together():
+    keys = blocking_keys({"name": "Jane Doe", "email": "jane.doe@gmail.com"})
+    assert "local:janedoe" in keys
+    assert not any(key.startswith("domain:") for key in keys)
+
+
+async def insert_users(db, users):
+    result = await db.users.insert_many(users)
+    return [{**user, "_id": user_id} for user, user_id in zip(users, result.inserted_ids)]
+
+
+def test_near_duplicates_are_suggested():
+    async def scenario():
+        db = AsyncMongoMockClient()["test"]
+        detector = DuplicateDetector(db, min_score=0.5)
+        users = await insert_users(db, [
+            {"name": "Jane Doe", "email": "jane.doe@acme.com", "phone": "212-555-0100", "company": "Acme Inc"},
+            {"name": "Jane Doe", "email": "janedoe@acme.com", "phone": "(212) 555 0100", "company": "ACME"},
+            {"name": "Bob Stone", "email": "bob@initech.com", "phone": None, "company": "Initech"},
+        ])
+        await detector.index_users(users)
+
+        suggestions = await db.user_merge_suggestions.find({}).to_list(length=None)
+        assert len(suggestions) == 1
+        assert set(suggestions[0]["user_ids"]) == {users[0]["_id"], users[1]["_id"]}
+        assert {"local", "phone", "name"} <= set(suggestions[0]["reasons"])
+
+    run(scenario())
+
+
+def test_oversized_blocks_are_skipped(monkeypatch):
+    async def scenario():
+        monkeypatch.setattr(dedup, "DEDUP_MAX_BLOCK_SIZE", 2)
+        db = AsyncMongoMockClient()["test"]
+        detector = DuplicateDetector(db, min_score=0.0)
+        users = await insert_users(db, [
+            {"name": f"Person {index}", "email": f"person{index}@bigcorp.com", "company": "Big Corp"}
+            for index in range(4)
+        ])
+        await detector.index_users(users)
+        assert await db.user_merge_suggestions.count_documents({}) == 0
+
+    run(scenario())
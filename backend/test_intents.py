@@ -0,0 +1,115 @@
+import pytest
+
+from agent.intents import route_message, APPROXIMATE_MARGIN
+
+
+def bounds(number_range):
+    return (number_range.min, number_range.max) if number_range else None
+
+
+def test_plain_message_needs_no_retrieval():
+    plan = route_message("hello there, how are you?")
+    assert not plan.needs_retrieval
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("offices under $2M a year", (None, 2_000_000)),
+    ("rent over $750k", (750_000, None)),
+    ("between $1.5M and $2M", (1_500_000, 2_000_000)),
+    ("$1-2M annual rent", (1_000_000, 2_000_000)),
+    ("anything from $900,000 to $1,100,000", (900_000, 1_100_000)),
+    ("over $1M and under $2M", (1_000_000, 2_000_000)),
+])
+def test_rent_ranges(text, expected):
+    plan = route_message(text)
+    assert plan.property_search
+    assert bounds(plan.rent_range) == expected
+
+
+def test_monthly_rent_is_annualized():
+    assert bounds(route_message("rent over $100k per month").rent_range) == (1_200_000, None)
+    assert bounds(route_message("$50k monthly").rent_range) == pytest.approx(
+        (600_000 * (1 - APPROXIMATE_MARGIN), 600_000 * (1 + APPROXIMATE_MARGIN))
+    )
+
+
+def test_single_amount_is_approximate():
+    low, high = bounds(route_message("around $1.2M").rent_range)
+    assert low == pytest.approx(1_200_000 * (1 - APPROXIMATE_MARGIN))
+    assert high == pytest.approx(1_200_000 * (1 + APPROXIMATE_MARGIN))
+
+
+def test_bound_word_must_precede_the_amount():
+    # "under" bounds "$2M" only when nothing else sits between them
+    assert bounds(route_message("under budget, about $2M").rent_range) == pytest.approx(
+        (2_000_000 * (1 - APPROXIMATE_MARGIN), 2_000_000 * (1 + APPROXIMATE_MARGIN))
+    )
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("10,000-15,000 sq ft", (10_000, 15_000)),
+    ("at least 12k sf", (12_000, None)),
+    ("no more than 20,000 square feet", (None, 20_000)),
+])
+def test_size_ranges(text, expected):
+    plan = route_message(text)
+    assert plan.rent_range is None
+    assert bounds(plan.size_range) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("$70-$90 per sq ft", (70, 90)),
+    ("under $85/sf", (None, 85)),
+])
+def test_rent_per_square_foot(text, expected):
+    plan = route_message(text)
+    assert plan.rent_range is None
+    assert bounds(plan.rent_per_sf_range) == expected
+
+
+def test_addresses():
+    plan = route_message("what is the rent at 36 West 36th Street or 1412 Broadway?")
+    assert plan.property_search
+    assert plan.addresses == ["36 West 36th Street", "1412 Broadway"]
+
+
+def test_associate_names():
+    plan = route_message("show properties handled by Jack Sparrow")
+    assert plan.associate_lookup
+    assert plan.associates == ["Jack Sparrow"]
+
+
+def test_associate_keyword_without_a_name_searches_properties():
+    plan = route_message("which brokers are active?")
+    assert plan.property_search
+    assert not plan.associate_lookup
+
+
+@pytest.mark.parametrize("text, flags", [
+    ("give me a market overview", {"market_summary"}),
+    ("what's in my account?", {"crm_lookup"}),
+    ("any luxury listings", {"property_search"}),
+    ("Market TRENDS for suites", {"market_summary", "property_search"}),
+])
+def test_keywords(text, flags):
+    plan = route_message(text)
+    for flag in ("property_search", "market_summary", "associate_lookup", "crm_lookup"):
+        assert getattr(plan, flag) == (flag in flags), flag
+
+
+def test_market_location():
+    plan = route_message("market summary for Broadway")
+    assert plan.market_summary
+    assert plan.locations == ["Broadway"]
+
+
+def test_emails():
+    plan = route_message("email me at jane.doe@example.com")
+    assert plan.crm_lookup
+    assert plan.emails == ["jane.doe@example.com"]
+
+
+def test_numbers_inside_words_are_not_amounts():
+    plan = route_message("ticket A12k3 and version v2.5M")
+    assert plan.rent_range is None
+    assert plan.size_range is None
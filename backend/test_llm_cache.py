@@ -0,0 +1,64 @@
+import asyncio
+
+from llm.cache import ResponseCache, cache_keys
+from llm.models import LLMCompletion
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def prompt(system, user):
+    return [{"role": "system", "content": system}, {"role": "user", "content": user}]
+
+
+def keys_for(messages):
+    return cache_keys("model", 0.0, 100, messages)
+
+
+def test_normalized_prompts_share_an_entry():
+    async def scenario():
+        cache = ResponseCache(maxsize=10)
+        await cache.set(keys_for(prompt("Be brief.", "What is  a cap rate?")), LLMCompletion(content="answer", model="model"))
+        cached = await cache.get(keys_for(prompt("Be brief.", "what is a cap rate")))
+        assert cached.content == "answer"
+        assert cache.stats()["hits"] == 1
+
+    run(scenario())
+
+
+def test_personal_user_messages_bypass_the_cache():
+    cache = ResponseCache(maxsize=10)
+    assert not cache.cacheable(0.0, prompt("Be brief.", "my name is Jane, reach me at jane@example.com"))
+    assert cache.cacheable(0.0, prompt("Client: jane@example.com", "any offices on Broadway?"))
+
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    async def scenario():
+        path = str(tmp_path / "cache.sqlite3")
+        messages = prompt("Be brief.", "any offices on Broadway?")
+        first = ResponseCache(maxsize=10, path=path)
+        assert first.persistable(messages)
+        await first.set(keys_for(messages), LLMCompletion(content="yes", model="model"))
+
+        second = ResponseCache(maxsize=10, path=path)
+        cached = await second.get(keys_for(messages))
+        assert cached.content == "yes"
+        assert second.stats()["disk_hits"] == 1
+
+    run(scenario())
+
+
+def test_personal_system_prompts_stay_in_memory(tmp_path):
+    async def scenario():
+        path = str(tmp_path / "cache.sqlite3")
+        messages = prompt("Client profile: jane@example.com", "any offices on Broadway?")
+        first = ResponseCache(maxsize=10, path=path)
+        assert not first.persistable(messages)
+        await first.set(keys_for(messages), LLMCompletion(content="yes", model="model"), persist=False)
+        assert (await first.get(keys_for(messages), disk=False)).content == "yes"
+
+        second = ResponseCache(maxsize=10, path=path)
+        assert await second.get(keys_for(messages)) is None
+
+    run(scenario())
@@ -0,0 +1,109 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from llm.cache import ResponseCache
+from llm.gateway import LLMGateway
+
+MESSAGES = [{"role": "user", "content": "any offices on Broadway?"}]
+
+
+class FakeStream:
+    def __init__(self, deltas, gap=0.0):
+        self.deltas = deltas
+        self.gap = gap
+        self.closed = False
+
+    async def __aiter__(self):
+        for delta in self.deltas:
+            await asyncio.sleep(self.gap)
+            yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))])
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeClient:
+    def __init__(self, stream=None, delay=0.0):
+        self.stream = stream
+        self.delay = delay
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, stream=False, **request):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if stream:
+            return self.stream
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content="reply"))], usage=None
+        )
+
+
+def gateway_with(client, **options):
+    gateway = LLMGateway(api_key="test", cache=ResponseCache(maxsize=10), **options)
+    gateway._client = client
+    return gateway
+
+
+def test_identical_concurrent_requests_share_one_call():
+    async def scenario():
+        client = FakeClient(delay=0.05)
+        gateway = gateway_with(client)
+        completions = await asyncio.gather(*(gateway.complete(MESSAGES, temperature=0.0) for _ in range(5)))
+        assert client.calls == 1
+        assert {completion.content for completion in completions} == {"reply"}
+        again = await gateway.complete(MESSAGES, temperature=0.0)
+        assert again.cached and client.calls == 1
+
+    asyncio.run(scenario())
+
+
+def test_stream_assembles_and_caches_the_reply():
+    async def scenario():
+        stream = FakeStream(["Yes", ", two."])
+        gateway = gateway_with(FakeClient(stream=stream))
+        llm_stream = gateway.stream(MESSAGES, temperature=0.0)
+        assert [token async for token in llm_stream] == ["Yes", ", two."]
+        assert llm_stream.completion.content == "Yes, two."
+        assert stream.closed
+        replay = gateway.stream(MESSAGES, temperature=0.0)
+        assert [token async for token in replay] == ["Yes, two."]
+        assert replay.completion.cached
+
+    asyncio.run(scenario())
+
+
+def test_stream_timeout_releases_the_slot_and_closes_the_response():
+    async def scenario():
+        stream = FakeStream(["a", "b"], gap=0.2)
+        gateway = gateway_with(FakeClient(stream=stream), max_concurrency=1)
+        with pytest.raises(asyncio.TimeoutError):
+            async for _ in gateway.stream(MESSAGES, timeout=0.05):
+                pass
+        assert stream.closed
+        assert gateway.in_flight == 0
+        assert not gateway._semaphore.locked()
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_stream_releases_the_slot():
+    async def scenario():
+        gateway = gateway_with(FakeClient(stream=FakeStream(["a"]), delay=1.0), max_concurrency=1)
+
+        async def consume():
+            async for _ in gateway.stream(MESSAGES):
+                pass
+
+        task = asyncio.create_task(consume())
+        await asyncio.sleep(0.05)
+        assert gateway._semaphore.locked()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert gateway.in_flight == 0
+        assert not gateway._semaphore.locked()
+
+    asyncio.run(scenario())
@@ -0,0 +1,35 @@
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+
+from conversations.cache import SessionCache
+from conversations.crud import ConversationCRUD
+from conversations.models import ConversationSession, ConversationSessionCreate, ConversationSessionUpdate
+
+
+def test_least_recently_used_session_is_evicted():
+    cache = SessionCache(maxsize=2, ttl=60)
+    for session_id in ("a", "b"):
+        cache.set(ConversationSession(session_id=session_id))
+    cache.get("a")
+    cache.set(ConversationSession(session_id="c"))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_expired_sessions_are_misses():
+    cache = SessionCache(maxsize=2, ttl=-1)
+    cache.set(ConversationSession(session_id="a"))
+    assert cache.get("a") is None
+
+
+def test_writes_invalidate_the_cached_session():
+    async def scenario():
+        crud = ConversationCRUD(AsyncMongoMockClient()["test"])
+        session = await crud.create_session(ConversationSessionCreate(title="Before"))
+        await crud.get_session(session.session_id)
+        await crud.update_session(session.session_id, ConversationSessionUpdate(title="After"))
+        assert (await crud.get_session(session.session_id)).title == "After"
+
+    asyncio.run(scenario())
@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_result():
+    async def scenario():
+        flights = SingleFlight()
+        calls = 0
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return calls
+
+        results = await asyncio.gather(*(flights.do("key", work) for _ in range(5)))
+        assert results == [1] * 5
+        assert flights.stats() == {"in_flight": 0, "calls": 5, "shared": 4}
+        # Finished calls are not reused
+        assert await flights.do("key", work) == 2
+
+    asyncio.run(scenario())
+
+
+def test_errors_reach_every_waiter():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(*(flights.do("key", fail) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+
+    asyncio.run(scenario())
+
+
+def test_a_timed_out_waiter_does_not_cancel_the_call():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def slow():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        patient = asyncio.ensure_future(flights.do("key", slow))
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(flights.do("key", slow), 0.01)
+        assert await patient == "done"
+
+    asyncio.run(scenario())
@@ -0,0 +1,93 @@
+import asyncio
+
+from bson import ObjectId
+from mongomock_motor import AsyncMongoMockClient
+
+from crm.crud import UserCRUD
+from crm.models import UserCreate
+from crm.search import query_terms, most_selective_term, decode_cursor, encode_cursor
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def seeded_crud(users):
+    crud = UserCRUD(AsyncMongoMockClient()["test"])
+    for name, email, company in users:
+        await crud.create_user(UserCreate(name=name, email=email, company=company))
+    return crud
+
+
+def test_most_selective_term_is_the_longest_prefix():
+    assert most_selective_term(query_terms("jo smithson")) == "smithson"
+
+
+def test_bad_cursor_reads_the_first_page():
+    assert decode_cursor("not-a-cursor") is None
+    assert decode_cursor(None) is None
+
+
+def test_search_ranks_whole_words_within_the_window():
+    async def scenario():
+        crud = await seeded_crud([
+            ("Annabel Lee", "annabel@example.com", "Lee Corp"),
+            ("Ann Smith", "ann@example.com", "Acme"),
+            ("Bob Stone", "bob@example.com", "Annex Ltd"),
+        ])
+        users, next_cursor = await crud.search_users("ann", limit=10)
+        assert next_cursor is None
+        assert [user.name for user in users] == ["Ann Smith", "Annabel Lee", "Bob Stone"]
+
+    run(scenario())
+
+
+def test_search_requires_every_term():
+    async def scenario():
+        crud = await seeded_crud([
+            ("Jane Doe", "jane@example.com", "Acme"),
+            ("Jane Roe", "jroe@example.com", "Initech"),
+        ])
+        users, _ = await crud.search_users("jane acme")
+        assert [user.name for user in users] == ["Jane Doe"]
+
+    run(scenario())
+
+
+def test_keyset_cursor_pages_through_every_match_once():
+    async def scenario():
+        names = [f"Sam {letter}" for letter in "edcbaihgfj"]
+        crud = await seeded_crud([(name, f"sam{index}@example.com", None) for index, name in enumerate(names)])
+        seen, cursor = [], None
+        while True:
+            users, cursor = await crud.search_users("sam", limit=3, cursor=cursor)
+            seen.extend(user.name for user in users)
+            if not cursor:
+                break
+        assert sorted(seen) == sorted(names)
+        assert len(seen) == len(names)
+
+    run(scenario())
+
+
+def test_exact_email_leads_the_first_page_only():
+    async def scenario():
+        crud = await seeded_crud(
+            [(f"Zed {index}", f"zed4.{index}@example.com", None) for index in range(4)]
+            + [("Zed Zulu", "zed4@example.com", None)]
+        )
+        users, cursor = await crud.search_users("zed4@example.com", limit=2)
+        assert users[0].email == "zed4@example.com"
+        emails = [user.email for user in users]
+        while cursor:
+            users, cursor = await crud.search_users("zed4@example.com", limit=2, cursor=cursor)
+            emails.extend(user.email for user in users)
+        assert emails.count("zed4@example.com") == 1
+        assert len(emails) == 5
+
+    run(scenario())
+
+
+def test_cursor_round_trip():
+    position = ("ann smith", ObjectId())
+    assert decode_cursor(encode_cursor(*position)) == position
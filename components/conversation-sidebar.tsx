@@ -28,6 +28,8 @@ interface ConversationSession {
   created_at: string
   updated_at: string
   message_count: number
+  last_message_preview?: string | null
+  last_message_sender?: 'user' | 'assistant' | null
 }
 
 interface ConversationSidebarProps {
@@ -121,6 +123,12 @@ export function ConversationSidebar({
                       <h4 className="font-medium text-sm truncate">
                         {session.title}
                       </h4>
+                      {session.last_message_preview && (
+                        <p className="text-xs text-muted-foreground truncate mt-0.5">
+                          {session.last_message_sender === 'assistant' ? 'AI: ' : 'You: '}
+                          {session.last_message_preview}
+                        </p>
+                      )}
                       <div className="flex items-center gap-2 mt-1">
                         <div className="flex items-center gap-1 text-xs text-muted-foreground">
                           <Calendar className="h-3 w-3" />
@@ -1,6 +1,6 @@
 "use client"
 
-import { useState, useCallback, useEffect } from 'react'
+import { useState, useCallback, useEffect, useRef } from 'react'
 import { Message } from 'ai'
 
 interface ConversationSession {
@@ -23,6 +23,9 @@ interface UseConversationChatOptions {
   onSessionChange?: (sessionId: string) => void
 }
 
+// Attempts per send; every attempt carries the same turn ID
+const SEND_ATTEMPTS = 3
+
 export function useConversationChat({ sessionId, onSessionChange }: UseConversationChatOptions = {}) {
   const [messages, setMessages] = useState<Message[]>([])
   const [input, setInput] = useState('')
@@ -30,6 +33,8 @@ export function useConversationChat({ sessionId, onSessionChange }: UseConversat
   const [currentSessionId, setCurrentSessionId] = useState<string | null>(sessionId || null)
   const [sessions, setSessions] = useState<ConversationSession[]>([])
   const [error, setError] = useState<string | null>(null)
+  // The last turn sent, so a failed one can be retried with its turn ID
+  const lastTurn = useRef<{ message: string, turnId: string } | null>(null)
 
   // Load conversation sessions
   const loadSessions = useCallback(async () => {
@@ -102,10 +107,14 @@ export function useConversationChat({ sessionId, onSessionChange }: UseConversat
     onSessionChange?.(sessionId)
   }, [loadMessages, onSessionChange])
 
-  // Send a message
-  const sendMessage = useCallback(async (message: string) => {
+  // Send a message; a retry passes the turn ID of the original send so the
+  // backend stores the turn only once
+  const sendMessage = useCallback(async (message: string, retryTurnId?: string) => {
     if (!message.trim() || isLoading) return
 
+    const turnId = retryTurnId || crypto.randomUUID()
+    lastTurn.current = { message, turnId }
+
     setIsLoading(true)
     setError(null)
 
@@ -119,28 +128,39 @@ export function useConversationChat({ sessionId, onSessionChange }: UseConversat
         }
       }
 
-      // Add user message to UI immediately
-      const userMessage: Message = {
-        id: `user-${Date.now()}`,
-        role: 'user',
-        content: message,
+      // Add user message to UI immediately (a retried turn is already shown)
+      if (!retryTurnId) {
+        const userMessage: Message = {
+          id: `user-${turnId}`,
+          role: 'user',
+          content: message,
+        }
+        setMessages(prev => [...prev, userMessage])
+        setInput('')
       }
-      setMessages(prev => [...prev, userMessage])
-      setInput('')
 
       // Send to enhanced chat API
-      const response = await fetch('/api/chat/enhanced', {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-          message,
-          sessionId,
-        }),
-      })
+      let response: Response | null = null
+      for (let attempt = 1; attempt <= SEND_ATTEMPTS; attempt++) {
+        try {
+          response = await fetch('/api/chat/enhanced', {
+            method: 'POST',
+            headers: {
+              'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({
+              message,
+              sessionId,
+              turnId,
+            }),
+          })
+          if (response.ok || response.status < 500) break
+        } catch (error) {
+          if (attempt === SEND_ATTEMPTS) throw error
+        }
+      }
 
-      if (!response.ok) {
+      if (!response || !response.ok) {
         throw new Error('Failed to send message')
       }
 
@@ -157,11 +177,11 @@ export function useConversationChat({ sessionId, onSessionChange }: UseConversat
 
       // Add assistant message to UI
       const assistantMessage: Message = {
-        id: `assistant-${Date.now()}`,
+        id: `assistant-${turnId}`,
         role: 'assistant',
         content: '',
       }
-      setMessages(prev => [...prev, assistantMessage])
+      setMessages(prev => [...prev.filter(msg => msg.id !== assistantMessage.id), assistantMessage])
 
       // Stream the response
       const decoder = new TextDecoder()
@@ -192,6 +212,8 @@ export function useConversationChat({ sessionId, onSessionChange }: UseConversat
         }
       }
 
+      lastTurn.current = null
+
       // Refresh sessions to update message counts
       await loadSessions()
 
@@ -203,6 +225,13 @@ export function useConversationChat({ sessionId, onSessionChange }: UseConversat
     }
   }, [currentSessionId, createNewSession, isLoading, loadSessions])
 
+  // Retry the last turn if it failed, reusing its turn ID
+  const retryLastMessage = useCallback(async () => {
+    if (lastTurn.current) {
+      await sendMessage(lastTurn.current.message, lastTurn.current.turnId)
+    }
+  }, [sendMessage])
+
   // Handle input change
   const handleInputChange = useCallback((e: React.ChangeEvent<HTMLInputElement>) => {
     setInput(e.target.value)
@@ -238,6 +267,7 @@ export function useConversationChat({ sessionId, onSessionChange }: UseConversat
     handleInputChange,
     handleSubmit,
     sendMessage,
+    retryLastMessage,
     createNewSession,
     switchToSession,
     loadSessions,
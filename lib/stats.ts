@@ -1,11 +1,35 @@
-export async function getStats() {
-  // Simulate API call to get dashboard stats
-  await new Promise((resolve) => setTimeout(resolve, 100))
+const BACKEND_URL = process.env.BACKEND_URL || 'http://localhost:8000'
 
-  return {
-    conversations: 1247,
-    users: 89,
-    documents: 156,
-    successRate: 94.2,
+export interface DashboardStats {
+  conversations: number
+  users: number
+  newUsersToday: number
+  activeUsersToday: number
+  messages: number
+}
+
+// Read the dashboard totals from the backend's incrementally maintained counters
+export async function getStats(): Promise<DashboardStats> {
+  try {
+    const response = await fetch(`${BACKEND_URL}/api/crm/stats?days=1`, {
+      next: { revalidate: 30 },
+    })
+    if (!response.ok) {
+      throw new Error(`Stats request failed: ${response.status}`)
+    }
+    const { summary } = await response.json()
+
+    return {
+      conversations: summary.conversations,
+      users: summary.users,
+      newUsersToday: summary.new_users_today,
+      // CRM users active today, counted once each; adding the chat rollup's
+      // active users would count people who use both twice
+      activeUsersToday: summary.active_users_today,
+      messages: summary.messages,
+    }
+  } catch (error) {
+    console.error('Error fetching dashboard stats:', error)
+    return { conversations: 0, users: 0, newUsersToday: 0, activeUsersToday: 0, messages: 0 }
   }
 }